@@ -0,0 +1,38 @@
+"""Alert pipeline stages and latency summaries"""
+import metrics
+
+# Pipeline stages as (name, start timestamp key, end timestamp key)
+ALERT_STAGES = (
+    ('block_to_seen', 'block_timestamp', 'block_seen_at'),
+    ('seen_to_persisted', 'block_seen_at', 'tx_persisted_at'),
+    ('persisted_to_enqueued', 'tx_persisted_at', 'alert_enqueued_at'),
+    ('enqueued_to_accepted', 'alert_enqueued_at', 'email_accepted_at'),
+    ('total', 'block_timestamp', 'email_accepted_at')
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+def stage_durations(timings):
+    """Yield (stage, seconds) for every stage with both timestamps recorded"""
+    for stage, start_key, end_key in ALERT_STAGES:
+        start, end = timings.get(start_key), timings.get(end_key)
+        if start is not None and end is not None:
+            yield stage, max(end - start, 0)
+
+
+def summarize(rows):
+    """Percentile latency per stage for a list of email_alerts timing rows"""
+    durations = {stage: [] for stage, _, _ in ALERT_STAGES}
+    for row in rows:
+        for stage, seconds in stage_durations(row):
+            durations[stage].append(seconds)
+    
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {'count': len(values)}
+        for q in PERCENTILES:
+            value = metrics.percentile(values, q)
+            summary[stage][f"p{q}"] = round(value, 3) if value is not None else None
+    return summary
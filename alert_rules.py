@@ -0,0 +1,138 @@
+"""In-memory alert rule index.
+
+Rules are grouped by watched address. For each address the ETH and USD
+thresholds are kept in sorted arrays, so every rule triggered by a value
+is the prefix found with a single bisect; direction and transaction type
+filters are only checked on that prefix.
+"""
+from bisect import bisect_right
+
+DIRECTIONS = ('both', 'incoming', 'outgoing')
+TX_TYPES = ('Transfer', 'Contract Call', 'Contract Creation', 'Token Transfer')
+
+
+class AlertRule:
+    """One user's alert settings for one watched wallet"""
+    
+    __slots__ = ('user_id', 'email', 'wallet_id', 'wallet_name', 'address',
+                 'threshold', 'usd_threshold', 'direction', 'tx_types',
+                 'email_alerts', 'webhook_url', 'webhook_secret')
+    
+    def __init__(self, user_id, email, wallet_id, wallet_name, address, threshold,
+                 usd_threshold=None, direction='both', tx_types=None,
+                 email_alerts=True, webhook_url=None, webhook_secret=None):
+        self.user_id = user_id
+        self.email = email
+        self.wallet_id = wallet_id
+        self.wallet_name = wallet_name
+        self.address = address.lower()
+        self.threshold = threshold
+        self.usd_threshold = usd_threshold
+        self.direction = direction or 'both'
+        self.tx_types = frozenset(tx_types) if tx_types else None
+        self.email_alerts = bool(email_alerts)
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+    
+    @classmethod
+    def from_row(cls, row):
+        tx_types = row.get('tx_types')
+        return cls(
+            user_id=row['user_id'],
+            email=row['email'],
+            wallet_id=row['wallet_id'],
+            wallet_name=row['wallet_name'],
+            address=row['wallet_address'],
+            threshold=row['large_tx_threshold'],
+            usd_threshold=row.get('usd_threshold'),
+            direction=row.get('direction'),
+            tx_types=tx_types.split(',') if tx_types else None,
+            email_alerts=row.get('email_alerts', 1),
+            webhook_url=row.get('webhook_url'),
+            webhook_secret=row.get('webhook_secret')
+        )
+    
+    def accepts(self, direction, tx_type):
+        if self.direction != 'both' and self.direction != direction:
+            return False
+        return self.tx_types is None or tx_type in self.tx_types
+
+
+class _SortedRules:
+    """Rules for one address ordered by threshold"""
+    
+    __slots__ = ('thresholds', 'rules')
+    
+    def __init__(self, pairs):
+        pairs.sort(key=lambda pair: pair[0])
+        self.thresholds = [threshold for threshold, _ in pairs]
+        self.rules = [rule for _, rule in pairs]
+    
+    def triggered(self, value):
+        """Rules whose threshold is at or below value"""
+        return self.rules[:bisect_right(self.thresholds, value)]
+
+
+class RuleIndex:
+    """Alert rules indexed by address with sorted thresholds.
+    
+    A rule with a USD threshold is evaluated in USD only; otherwise its
+    ETH ``large_tx_threshold`` applies.
+    """
+    
+    def __init__(self, rules=()):
+        eth, usd = {}, {}
+        for rule in rules:
+            if rule.usd_threshold is not None:
+                usd.setdefault(rule.address, []).append((rule.usd_threshold, rule))
+            else:
+                eth.setdefault(rule.address, []).append((rule.threshold, rule))
+        self._eth = {address: _SortedRules(pairs) for address, pairs in eth.items()}
+        self._usd = {address: _SortedRules(pairs) for address, pairs in usd.items()}
+        self.size = sum(len(r.rules) for r in self._eth.values()) + sum(len(r.rules) for r in self._usd.values())
+    
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(AlertRule.from_row(row) for row in rows)
+    
+    def __len__(self):
+        return self.size
+    
+    def __contains__(self, address):
+        return address in self._eth or address in self._usd
+    
+    def match(self, address, direction, tx_type, value_eth, value_usd=None):
+        """Rules on one address triggered by a transaction"""
+        matched = []
+        by_eth = self._eth.get(address)
+        if by_eth is not None and value_eth is not None:
+            matched.extend(r for r in by_eth.triggered(value_eth) if r.accepts(direction, tx_type))
+        by_usd = self._usd.get(address)
+        if by_usd is not None and value_usd is not None:
+            matched.extend(r for r in by_usd.triggered(value_usd) if r.accepts(direction, tx_type))
+        return matched
+    
+    def evaluate(self, transactions):
+        """Evaluate every transaction of a block in one pass.
+        
+        ``transactions`` are tx_data dicts as built by the monitor. Token
+        transfers carry their ETH equivalent in ``value_eth`` (None when the
+        token has no price), so ETH thresholds only see comparable values.
+        Returns a list of (rule, tx_data, direction) for each alert to send.
+        """
+        alerts = []
+        for tx_data in transactions:
+            value_eth = tx_data['value_eth'] if 'value_eth' in tx_data else float(tx_data['value'])
+            value_usd = tx_data.get('value_usd')
+            tx_type = tx_data.get('type')
+            
+            from_addr = tx_data['from'].lower() if tx_data['from'] else None
+            to_addr = tx_data['to'].lower() if tx_data['to'] else None
+            
+            if from_addr:
+                for rule in self.match(from_addr, 'outgoing', tx_type, value_eth, value_usd):
+                    alerts.append((rule, tx_data, 'outgoing'))
+            if to_addr:
+                for rule in self.match(to_addr, 'incoming', tx_type, value_eth, value_usd):
+                    alerts.append((rule, tx_data, 'incoming'))
+        return alerts
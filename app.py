@@ -1,23 +1,182 @@
 import os
-from flask import Flask, jsonify, request
+import csv
+import secrets
+import io
+import json
+import re
+import time
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from datetime import timedelta
-from database import Database
+from database import ACTIVITY_ROLLUPS, TRANSACTION_COLUMNS, Database, address_bytes, create_database
 from email_service import EmailService
+from events import TransactionHub
+from cache import LRUCache
+from search_index import SearchIndex
+from snapshot import TRANSACTION_JSON_KEYS, SNAPSHOT_READS, SnapshotReader, public_stats, with_labels
+from alert_rules import DIRECTIONS, TX_TYPES
+import alert_latency
 import config
+import metrics
+import profiling
+import serialization
+import threading
 import traceback
+from collections import OrderedDict
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = config.JWT_SECRET
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
+app.config['JWT_TOKEN_LOCATION'] = ['headers']
+# EventSource can't set headers, so only the SSE route also takes ?jwt=
+# (tokens in URLs end up in access logs)
+STREAM_TOKEN_LOCATIONS = ['headers', 'query_string']
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 # Initialize JWT
 jwt = JWTManager(app)
 
-db = Database()
+db = create_database()
 email_service = EmailService()
+transaction_hub = TransactionHub(db)
+user_contexts = LRUCache(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+wallet_search_indexes = LRUCache(maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+# The monitor's snapshot of the public feed, mapped by each worker (see snapshot.py)
+feed_snapshot = SnapshotReader(config.SNAPSHOT_PATH) if config.SNAPSHOT_PATH else None
+
+def load_user_context(user_id):
+    """Load a user's record and wallets from the database"""
+    user = db.get_user_by_id(user_id)
+    if not user:
+        return None
+    wallets = db.get_user_wallets(user_id)
+    return {
+        'user': user,
+        'wallets': wallets,
+        'wallet_map': {w['wallet_address'].lower(): w['wallet_name'] for w in wallets}
+    }
+
+def get_user_context(user_id):
+    """Get a user's record and wallet map, cached per worker"""
+    return user_contexts.get_or_load(user_id, load_user_context)
+
+def invalidate_user_context(user_id):
+    """Drop a user's cached context after changing their wallets"""
+    user_contexts.invalidate(user_id)
+    wallet_search_indexes.invalidate(user_id)
+
+def transactions_response(limit, user_id=None, wallet_map=None):
+    """Labelled recent transactions as JSON, streamed for large limits"""
+    batches = db.iter_recent_transactions(limit, user_id=user_id, batch_size=config.JSON_CHUNK_ROWS)
+    # Each phase is timed per batch, as the body is produced
+    labelled = profiling.timed_iter(([with_labels(row, wallet_map) for row in rows] for rows in batches), 'labels')
+    body = profiling.timed_iter(serialization.iter_json_array(labelled, TRANSACTION_JSON_KEYS), 'serialization')
+    if limit <= config.JSON_STREAM_MIN_ROWS:
+        body = b''.join(body)
+    return Response(body, mimetype='application/json')
+
+# Search: known whale labels, plus the most recently seen transaction
+# addresses, plus the signed-in user's own wallet names
+label_index = SearchIndex()
+label_index.add_many((address, label, 'whale') for address, label in config.WHALE_LABELS.items())
+address_index = SearchIndex()
+address_index_state = {'last_id': None, 'refreshed_at': None, 'refreshing': False}
+address_index_lock = threading.Lock()
+# Up to SEARCH_MAX_ADDRESSES addresses, least recently seen first
+recent_addresses = OrderedDict()
+
+def refresh_address_index():
+    """Start a background refresh of the address index when one is due"""
+    with address_index_lock:
+        refreshed_at = address_index_state['refreshed_at']
+        if address_index_state['refreshing'] or (
+                refreshed_at is not None and time.time() - refreshed_at < config.SEARCH_REFRESH_INTERVAL):
+            return
+        address_index_state['refreshing'] = True
+    # Searches keep using the index as it is until the refresh is done
+    threading.Thread(target=update_address_index, name='address-index', daemon=True).start()
+
+def update_address_index():
+    """Index addresses from transactions stored since the last update, dropping the least recently seen"""
+    global address_index
+    try:
+        last_id = address_index_state['last_id']
+        first_build = last_id is None
+        if first_build:
+            # Each transaction has at most two addresses, so this is enough to fill the index
+            last_id = max(db.get_latest_transaction_id() - config.SEARCH_MAX_ADDRESSES, 0)
+        added = []
+        for rows in db.iter_transaction_addresses(last_id):
+            for _, from_addr, to_addr in rows:
+                for address in (from_addr, to_addr):
+                    if not address:
+                        continue
+                    if address in recent_addresses:
+                        recent_addresses.move_to_end(address)
+                    else:
+                        recent_addresses[address] = None
+                        added.append(address)
+            last_id = rows[-1][0]
+            time.sleep(0)  # let other greenlets run between batches
+        evicted = []
+        while len(recent_addresses) > config.SEARCH_MAX_ADDRESSES:
+            evicted.append(recent_addresses.popitem(last=False)[0])
+        
+        if first_build:
+            # Built aside and swapped in, so searches don't wait on the full build
+            index = SearchIndex()
+            index.add_many((address, None, 'address') for address in recent_addresses)
+            address_index = index
+        else:
+            address_index.remove_many(evicted)
+            address_index.add_many((address, None, 'address') for address in added
+                                   if address in recent_addresses)
+        address_index_state['last_id'] = last_id
+    except Exception as e:
+        print(f"❌ Address index refresh failed: {e}")
+    finally:
+        with address_index_lock:
+            address_index_state['refreshed_at'] = time.time()
+            address_index_state['refreshing'] = False
+
+def wallet_search_index(user_id, context):
+    """The user's wallets as a search index, built once per cached context"""
+    cached = wallet_search_indexes.get(user_id)
+    if cached is not None and cached[0] is context:
+        return cached[1]
+    index = SearchIndex()
+    index.add_many((w['wallet_address'], w['wallet_name'], 'wallet') for w in context['wallets'])
+    wallet_search_indexes.set(user_id, (context, index))
+    return index
+
+ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]{40}')
+
+def is_valid_address(address):
+    """Check that a string is a 0x-prefixed 20-byte hex address"""
+    return isinstance(address, str) and ADDRESS_PATTERN.fullmatch(address) is not None
+
+HTTP_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'API request latency', ['endpoint', 'method', 'status'])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+if config.PROFILE_REQUESTS:
+    profiling.install(app, Database)
 
 # Error handler
 @app.errorhandler(Exception)
@@ -32,6 +191,23 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'Whale monitor API is running'}), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this worker (admin; scrape with an X-Admin-Token header)"""
+    if not profiling.is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/admin/profile', methods=['POST'])
+def profile_process():
+    """Sample all threads for N seconds and return folded stacks (admin)"""
+    if not profiling.is_admin_request():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), 60)
+    sampler = profiling.sample_process(seconds)
+    return Response(sampler.folded(), mimetype='text/plain')
+
 # ==================== AUTH ROUTES ====================
 
 @app.route('/api/auth/signup', methods=['POST'])
@@ -113,14 +289,16 @@ def get_current_user():
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)  # Convert string back to int
-        user = db.get_user_by_id(user_id)
+        context = get_user_context(user_id)
         
-        if not user:
+        if not context:
             return jsonify({'error': 'User not found'}), 404
         
+        user = context['user']
         return jsonify({
             'id': user['id'],
-            'email': user['email']
+            'email': user['email'],
+            'api_key': user['api_key']
         }), 200
     except Exception as e:
         traceback.print_exc()
@@ -141,48 +319,104 @@ def get_public_whales():
     
     return jsonify(whales), 200
 
+@app.route('/api/search', methods=['GET'])
+@jwt_required(optional=True)
+def search():
+    """Autocomplete over wallet names (when signed in), whale labels and known addresses"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', config.SEARCH_RESULTS, type=int), config.SEARCH_MAX_RESULTS))
+    if not query:
+        return jsonify([]), 200
+    
+    indexes = [label_index]
+    user_id_str = get_jwt_identity()
+    if user_id_str:
+        user_id = int(user_id_str)
+        context = get_user_context(user_id)
+        if context:
+            indexes.insert(0, wallet_search_index(user_id, context))
+    # Only address-like queries can match the address index
+    if query.lower().startswith('0x'):
+        refresh_address_index()
+        indexes.append(address_index)
+    
+    results = []
+    seen = set()
+    for index in indexes:
+        for entry in index.search(query, limit - len(results)):
+            if entry.address not in seen:
+                seen.add(entry.address)
+                results.append(entry.to_dict())
+        if len(results) == limit:
+            break
+    
+    return jsonify(results), 200
+
 @app.route('/api/transactions', methods=['GET'])
 def get_public_transactions():
     """Get recent transactions (public)"""
     limit = request.args.get('limit', 50, type=int)
-    transactions = db.get_recent_transactions(limit)
-    
-    # Add wallet labels
-    for tx in transactions:
-        tx['from_label'] = config.get_whale_label(tx['from_address'])
-        tx['to_label'] = config.get_whale_label(tx['to_address']) if tx['to_address'] else None
-    
-    return jsonify(transactions), 200
+    snapshot = feed_snapshot.current() if feed_snapshot else None
+    if snapshot is not None and snapshot.covers(limit):
+        SNAPSHOT_READS.inc(source='snapshot')
+        return Response(snapshot.transactions(limit), mimetype='application/json')
+    SNAPSHOT_READS.inc(source='database')
+    return transactions_response(limit)
 
+def stream_response(events):
+    """Wrap an SSE generator in a streaming response"""
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/transactions/stream', methods=['GET'])
+def stream_public_transactions():
+    """Stream new transactions as Server-Sent Events (public)"""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return stream_response(transaction_hub.subscribe(last_event_id=last_event_id))
 
 @app.route('/api/stats', methods=['GET'])
 def get_public_stats():
     """Get overall statistics (public)"""
-    transactions = db.get_recent_transactions(100)
-    
-    total_volume = sum(float(tx['value']) for tx in transactions)
-    large_txs = sum(1 for tx in transactions if tx['is_large'])
-    
-    gas_history = db.get_gas_history(10)
-    avg_gas = sum(g['gas_price'] for g in gas_history) / len(gas_history) if gas_history else 0
-    
-    whale_count = len(config.WHALE_LABELS)
-    
-    return jsonify({
-        'totalVolume': round(total_volume, 2),
-        'avgGasPrice': int(avg_gas),
-        'largeTransactions': large_txs,
-        'activeWhales': whale_count
-    }), 200
+    snapshot = feed_snapshot.current() if feed_snapshot else None
+    if snapshot is not None:
+        SNAPSHOT_READS.inc(source='snapshot')
+        return Response(snapshot.stats(), mimetype='application/json')
+    SNAPSHOT_READS.inc(source='database')
+    return jsonify(public_stats(db)), 200
 
 @app.route('/api/gas-history', methods=['GET'])
 def get_gas_history():
-    """Get gas price history (public)"""
+    """Get gas price history with per-block fee statistics in gwei (public)"""
     limit = request.args.get('limit', 100, type=int)
     gas_data = db.get_gas_history(limit)
     
     return jsonify(gas_data), 200
 
+@app.route('/api/alerts/latency', methods=['GET'])
+def get_alert_latency():
+    """Get p50/p95/p99 alert latency per pipeline stage over recent windows (public)"""
+    windows = request.args.get('windows', '3600,86400,604800')
+    try:
+        windows = [int(w) for w in windows.split(',') if w]
+    except ValueError:
+        return jsonify({'error': 'windows must be a comma-separated list of seconds'}), 400
+    
+    now = time.time()
+    rows = db.get_alert_timings(now - max(windows)) if windows else []
+    
+    report = {}
+    for window in windows:
+        recent = [row for row in rows if row['alert_enqueued_at'] >= now - window]
+        report[str(window)] = {
+            'alerts': len(recent),
+            'delivered': sum(1 for row in recent if row['email_sent']),
+            'stages': alert_latency.summarize(recent)
+        }
+    
+    return jsonify(report), 200
+
 # ==================== USER ROUTES ====================
 
 @app.route('/api/user/wallets', methods=['GET'])
@@ -192,7 +426,8 @@ def get_user_wallets():
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
-        wallets = db.get_user_wallets(user_id)
+        context = get_user_context(user_id)
+        wallets = context['wallets'] if context else []
         
         formatted_wallets = []
         for wallet in wallets:
@@ -202,7 +437,11 @@ def get_user_wallets():
                 'label': wallet['wallet_name'],
                 'shortAddress': f"{wallet['wallet_address'][:6]}...{wallet['wallet_address'][-4:]}",
                 'threshold': wallet['large_tx_threshold'],
-                'email_alerts': wallet['email_alerts']
+                'usd_threshold': wallet['usd_threshold'],
+                'direction': wallet['direction'] or 'both',
+                'tx_types': wallet['tx_types'].split(',') if wallet['tx_types'] else None,
+                'email_alerts': wallet['email_alerts'],
+                'webhook_url': wallet['webhook_url']
             })
         
         return jsonify(formatted_wallets), 200
@@ -226,10 +465,11 @@ def add_user_wallet():
         if not wallet_address or not wallet_name:
             return jsonify({'error': 'Wallet address and name required'}), 400
         
-        if not wallet_address.startswith('0x') or len(wallet_address) != 42:
+        if not is_valid_address(wallet_address):
             return jsonify({'error': 'Invalid Ethereum address'}), 400
         
         wallet_id = db.add_user_wallet(user_id, wallet_address, wallet_name, threshold)
+        invalidate_user_context(user_id)
         
         if not wallet_id:
             return jsonify({'error': 'Wallet already being tracked'}), 409
@@ -242,6 +482,126 @@ def add_user_wallet():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def read_import_rows(stream, import_format):
+    """Yield (line, row dict or None, error) from a CSV or NDJSON body"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    
+    if import_format == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, 'Invalid JSON'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'Expected a JSON object'
+                continue
+            yield line_number, row, None
+        return
+    
+    reader = csv.reader(text)
+    header = None
+    for row in reader:
+        if not row or not any(field.strip() for field in row):
+            continue
+        if header is None:
+            # A header row is optional; without one columns are address, name, threshold
+            if not row[0].strip().lower().startswith('0x'):
+                header = [field.strip().lower() for field in row]
+                continue
+            header = ['wallet_address', 'wallet_name', 'threshold']
+        yield reader.line_num, dict(zip(header, (field.strip() for field in row))), None
+
+def validate_import_row(row):
+    """Normalize one import row to (address, name, threshold) or raise ValueError"""
+    address = row.get('wallet_address') or row.get('address')
+    if not is_valid_address(address):
+        raise ValueError('Invalid Ethereum address')
+    # Convert here too, so a row the database can't store is rejected on its own
+    try:
+        address_bytes(address)
+    except ValueError:
+        raise ValueError('Invalid Ethereum address')
+    
+    name = row.get('wallet_name') or row.get('name') or f"{address[:6]}...{address[-4:]}"
+    threshold = row.get('threshold')
+    try:
+        threshold = 100.0 if threshold in (None, '') else float(threshold)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid threshold')
+    if threshold < 0:
+        raise ValueError('Threshold must not be negative')
+    
+    return address.lower(), str(name), threshold
+
+@app.route('/api/user/wallets/import', methods=['POST'])
+@jwt_required()
+def import_user_wallets():
+    """Bulk import wallets from a CSV or NDJSON request body"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        import_format = request.args.get('format')
+        if not import_format:
+            import_format = 'ndjson' if 'json' in (request.mimetype or '') else 'csv'
+        if import_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        results = []
+        chunk = []
+        counts = {'added': 0, 'duplicate': 0, 'invalid': 0}
+        truncated = False
+        
+        def flush():
+            statuses = db.add_user_wallets(user_id, [wallet for _, wallet in chunk])
+            for (result, _), status in zip(chunk, statuses):
+                result['status'] = status
+                counts[status] += 1
+            chunk.clear()
+        
+        try:
+            for line_number, row, error in read_import_rows(request.stream, import_format):
+                if len(results) >= config.MAX_IMPORT_ROWS:
+                    truncated = True
+                    break
+                
+                result = {'line': line_number}
+                results.append(result)
+                
+                if row is not None:
+                    result['wallet_address'] = row.get('wallet_address') or row.get('address')
+                    try:
+                        wallet = validate_import_row(row)
+                    except ValueError as e:
+                        error = str(e)
+                
+                if error:
+                    result['status'] = 'invalid'
+                    result['error'] = error
+                    counts['invalid'] += 1
+                    continue
+                
+                chunk.append((result, wallet))
+                if len(chunk) >= config.IMPORT_CHUNK_SIZE:
+                    flush()
+            
+            if chunk:
+                flush()
+        finally:
+            # One reload of the monitor's tracked set per import, not per row. It
+            # also runs when a later chunk fails, since earlier ones are committed.
+            if counts['added']:
+                db.bump_tracked_wallets_version()
+                invalidate_user_context(user_id)
+        
+        return jsonify({**counts, 'truncated': truncated, 'results': results}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/user/wallets/<int:wallet_id>', methods=['DELETE'])
 @jwt_required()
 def delete_user_wallet(wallet_id):
@@ -251,6 +611,7 @@ def delete_user_wallet(wallet_id):
         user_id = int(user_id_str)
         
         deleted = db.delete_user_wallet(user_id, wallet_id)
+        invalidate_user_context(user_id)
         
         if not deleted:
             return jsonify({'error': 'Wallet not found'}), 404
@@ -275,6 +636,7 @@ def update_wallet_threshold(wallet_id):
             return jsonify({'error': 'Valid threshold required'}), 400
         
         updated = db.update_wallet_threshold(user_id, wallet_id, threshold)
+        invalidate_user_context(user_id)
         
         if not updated:
             return jsonify({'error': 'Wallet not found'}), 404
@@ -284,6 +646,142 @@ def update_wallet_threshold(wallet_id):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/user/wallets/<int:wallet_id>/rules', methods=['PUT'])
+@jwt_required()
+def update_wallet_rules(wallet_id):
+    """Update USD threshold, direction and transaction type filters"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        data = request.get_json()
+        
+        usd_threshold = data.get('usd_threshold')
+        direction = data.get('direction', 'both')
+        tx_types = data.get('tx_types')
+        
+        if usd_threshold is not None and (not isinstance(usd_threshold, (int, float)) or usd_threshold < 0):
+            return jsonify({'error': 'usd_threshold must be a non-negative number'}), 400
+        
+        if direction not in DIRECTIONS:
+            return jsonify({'error': f"direction must be one of {', '.join(DIRECTIONS)}"}), 400
+        
+        if tx_types is not None and (not isinstance(tx_types, list) or any(t not in TX_TYPES for t in tx_types)):
+            return jsonify({'error': f"tx_types must be a list of {', '.join(TX_TYPES)}"}), 400
+        
+        updated = db.update_wallet_rules(user_id, wallet_id, usd_threshold, direction, tx_types)
+        invalidate_user_context(user_id)
+        
+        if not updated:
+            return jsonify({'error': 'Wallet not found'}), 404
+        
+        return jsonify({'message': 'Alert rules updated successfully'}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/user/wallets/<int:wallet_id>/webhook', methods=['PUT'])
+@jwt_required()
+def update_wallet_webhook(wallet_id):
+    """Set or clear the wallet's webhook; returns the signing secret"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        data = request.get_json()
+        
+        url = data.get('url')
+        if url is not None:
+            if not isinstance(url, str):
+                return jsonify({'error': 'url must be a string or null'}), 400
+            # Imported here: webhook delivery (and requests) is the monitor's job
+            from webhook_service import UnsafeWebhookURL, check_webhook_url
+            try:
+                check_webhook_url(url)
+            except UnsafeWebhookURL as e:
+                return jsonify({'error': str(e)}), 400
+            except OSError:
+                return jsonify({'error': 'url host could not be resolved'}), 400
+        
+        # A new secret is issued whenever the webhook is set, unless one is supplied
+        secret = (data.get('secret') or secrets.token_hex(32)) if url else None
+        
+        updated = db.update_wallet_webhook(user_id, wallet_id, url, secret)
+        invalidate_user_context(user_id)
+        
+        if not updated:
+            return jsonify({'error': 'Wallet not found'}), 404
+        
+        return jsonify({'message': 'Webhook updated successfully', 'url': url, 'secret': secret}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+ACTIVITY_RANGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+# Longest range served from hourly buckets
+MAX_HOURLY_RANGE = 90 * 86400
+
+def parse_activity_range(value):
+    """Seconds in a range such as '24h', '30d', '12w', '6m' or '2y'"""
+    if len(value) < 2 or value[-1] not in ACTIVITY_RANGE_UNITS or not value[:-1].isdigit():
+        return None
+    seconds = int(value[:-1]) * ACTIVITY_RANGE_UNITS[value[-1]]
+    return seconds if 0 < seconds <= 20 * 365 * 86400 else None
+
+@app.route('/api/user/wallets/<int:wallet_id>/activity', methods=['GET'])
+@jwt_required()
+def get_wallet_activity(wallet_id):
+    """Hourly or daily transaction counts and volumes for a wallet, from the rollups"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        context = get_user_context(user_id)
+        wallet = next((w for w in context['wallets'] if w['id'] == wallet_id), None) if context else None
+        if not wallet:
+            return jsonify({'error': 'Wallet not found'}), 404
+        
+        range_param = request.args.get('range', '30d')
+        seconds = parse_activity_range(range_param)
+        if seconds is None:
+            return jsonify({'error': 'range must look like 24h, 30d, 12w, 6m or 2y'}), 400
+        
+        interval = request.args.get('interval', 'hour' if seconds <= 2 * 86400 else 'day')
+        if interval not in ('hour', 'day'):
+            return jsonify({'error': 'interval must be hour or day'}), 400
+        if interval == 'hour' and seconds > MAX_HOURLY_RANGE:
+            return jsonify({'error': 'hourly activity is limited to 90 days'}), 400
+        
+        # Start at the bucket holding the range's first second
+        bucket_seconds = ACTIVITY_ROLLUPS[interval][1]
+        since = (int(time.time()) - seconds) // bucket_seconds * bucket_seconds
+        buckets = db.get_wallet_activity(wallet['wallet_address'], interval, since)
+        totals = {key: sum(b[key] for b in buckets) for key in ('in_count', 'out_count', 'eth_in', 'eth_out', 'usd_in', 'usd_out')}
+        
+        return jsonify({
+            'wallet_id': wallet_id,
+            'address': wallet['wallet_address'],
+            'range': range_param,
+            'interval': interval,
+            'since': since,
+            'buckets': buckets,
+            'totals': totals
+        }), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/user/webhooks/dead-letters', methods=['GET'])
+@jwt_required()
+def get_webhook_dead_letters():
+    """Get webhook alerts that could not be delivered"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        return jsonify(db.get_webhook_dead_letters(user_id, limit)), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/user/transactions', methods=['GET'])
 @jwt_required()
 def get_user_transactions():
@@ -293,26 +791,66 @@ def get_user_transactions():
         user_id = int(user_id_str)
         limit = request.args.get('limit', 50, type=int)
         
-        transactions = db.get_recent_transactions(limit, user_id=user_id)
+        # Get user's wallet names (labels prefer them over default labels)
+        context = get_user_context(user_id)
+        wallet_map = context['wallet_map'] if context else {}
         
-        # Get user's wallet names
-        user_wallets = db.get_user_wallets(user_id)
-        wallet_map = {w['wallet_address'].lower(): w['wallet_name'] for w in user_wallets}
-        
-        # Add wallet labels (prioritize user's custom names)
-        for tx in transactions:
-            from_addr = tx['from_address'].lower()
-            to_addr = tx['to_address'].lower() if tx['to_address'] else None
-            
-            # Check user's wallets first, then fall back to default labels
-            tx['from_label'] = wallet_map.get(from_addr) or config.get_whale_label(tx['from_address'])
-            tx['to_label'] = wallet_map.get(to_addr) or config.get_whale_label(tx['to_address']) if tx['to_address'] else None
-        
-        return jsonify(transactions), 200
+        return transactions_response(limit, user_id=user_id, wallet_map=wallet_map)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def get_api_key_user():
+    """User owning the X-API-Key header, if it is valid"""
+    # Never from the query string, which ends up in access and proxy logs
+    api_key = request.headers.get('X-API-Key')
+    return db.get_user_by_api_key(api_key) if api_key else None
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', serialization.iter_ndjson),
+    'csv': ('text/csv', serialization.iter_csv)
+}
+
+@app.route('/api/export/transactions', methods=['GET'])
+def export_transactions():
+    """Stream all of the API key owner's transactions as NDJSON or CSV"""
+    user = get_api_key_user()
+    if not user:
+        return jsonify({'error': 'Valid API key required'}), 401
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    since = request.args.get('since', type=int)
+    until = request.args.get('until', type=int)
+    if since is not None and until is not None and since > until:
+        return jsonify({'error': 'since must not be after until'}), 400
+    
+    mimetype, encode = EXPORT_FORMATS[export_format]
+    batches = db.iter_user_transactions(user['id'], since=since, until=until,
+                                        batch_size=config.EXPORT_BATCH_ROWS)
+    return Response(encode(batches, TRANSACTION_COLUMNS), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=transactions.{export_format}'
+    })
+
+@app.route('/api/user/transactions/stream', methods=['GET'])
+@jwt_required(locations=STREAM_TOKEN_LOCATIONS)
+def stream_user_transactions():
+    """Stream new transactions for user's wallets as Server-Sent Events"""
+    user_id_str = get_jwt_identity()
+    user_id = int(user_id_str)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    
+    context = get_user_context(user_id)
+    wallet_map = context['wallet_map'] if context else {}
+    
+    return stream_response(transaction_hub.subscribe(
+        addresses=set(wallet_map),
+        wallet_map=wallet_map,
+        last_event_id=last_event_id
+    ))
+
 @app.route('/api/user/stats', methods=['GET'])
 @jwt_required()
 def get_user_stats():
@@ -322,9 +860,10 @@ def get_user_stats():
         user_id = int(user_id_str)
         
         transactions = db.get_recent_transactions(100, user_id=user_id)
-        wallets = db.get_user_wallets(user_id)
+        context = get_user_context(user_id)
+        wallets = context['wallets'] if context else []
         
-        total_volume = sum(float(tx['value']) for tx in transactions)
+        total_volume = sum(float(tx['value']) for tx in transactions if not tx['token_symbol'])
         large_txs = sum(1 for tx in transactions if tx['is_large'])
         
         gas_history = db.get_gas_history(10)
@@ -0,0 +1,1216 @@
+"""Throughput benchmarks for the monitor pipeline.
+
+Drives ``WhaleMonitor`` against a deterministic synthetic chain served by
+an in-process fake Web3 provider, so runs are repeatable and need no
+network. Results are printed (or written) as JSON so they can be diffed
+between commits:
+
+    python benchmark.py --blocks 50 --txs-per-block 200 --hit-rate 0.05
+    python benchmark.py --suite rescan --blocks 50
+    python benchmark.py --suite mempool --blocks 50 --pending-batch 2000
+    python benchmark.py --suite rpc --rpc-requests 1000 --stall-rate 0.05
+    python benchmark.py --suite cache --blocks 50 --rpc-latency-ms 20
+    python benchmark.py --suite replay --blocks 50 --poll-ms 200
+    python benchmark.py --suite search --search-entries 500000
+    python benchmark.py --suite gas --blocks 50 --txs-per-block 500
+    python benchmark.py --suite matcher --txs-per-block 500 --matcher-watchlist 1000000
+    python benchmark.py --suite insert --output bench_output.txt
+    python benchmark.py --suite startup --startup-runs 10
+    python benchmark.py --suite serialize --rows 10000
+    python benchmark.py --suite webhooks --subscribers 1000
+
+With a postgres:// DATABASE_URL (or --database-url) every suite runs
+against the Postgres backend instead, each in a throwaway database
+created on that server and dropped afterwards:
+
+    DATABASE_URL=postgresql://localhost/postgres python benchmark.py --suite monitor
+"""
+import argparse
+import contextlib
+import hmac
+import inspect
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from web3.providers.base import BaseProvider
+from alert_rules import RuleIndex
+from block_matcher import BlockMatcher
+from database import Database
+from gas_stats import GAS_STATS_COLUMNS, block_fee_stats
+from mempool import MempoolWatcher
+from metrics import percentile
+from monitor import WhaleMonitor
+from rpc import MultiProvider
+from rpc_cache import CachingProvider
+from rpc_replay import RecordingProvider, ReplayProvider
+from search_index import SearchIndex
+import config
+from webhook_service import WebhookService, sign
+
+GENESIS_TIMESTAMP = 1700000000
+WRITE_PREFIXES = ('insert_', 'log_', 'add_', 'update_', 'delete_', 'create_', 'mark_', 'bump_', 'rebuild_')
+
+
+def random_address(rng):
+    return '0x%040x' % rng.getrandbits(160)
+
+
+def random_hash(rng):
+    return '0x%064x' % rng.getrandbits(256)
+
+
+class SyntheticChain:
+    """Deterministic generator of full blocks in JSON-RPC wire format"""
+    
+    def __init__(self, txs_per_block=200, hit_rate=0.05, watchlist_size=100, seed=1, start_block=1):
+        self.txs_per_block = txs_per_block
+        self.hit_rate = hit_rate
+        self.seed = seed
+        self.start_block = start_block
+        self.head = start_block
+        
+        rng = random.Random(seed)
+        self.watchlist = [random_address(rng) for _ in range(watchlist_size)]
+        self.blocks = {}
+        self.transactions = {}
+    
+    def block(self, number):
+        """Get (and memoize) the block with the given number"""
+        if number not in self.blocks:
+            self.blocks[number] = self._generate_block(number)
+        return self.blocks[number]
+    
+    def _generate_block(self, number):
+        rng = random.Random(f"{self.seed}:{number}")
+        block_hash = random_hash(rng)
+        base_fee = rng.randint(5, 80) * 10**9
+        
+        transactions = []
+        for index in range(self.txs_per_block):
+            sender = random_address(rng)
+            recipient = random_address(rng)
+            if self.watchlist and rng.random() < self.hit_rate:
+                if rng.random() < 0.5:
+                    sender = rng.choice(self.watchlist)
+                else:
+                    recipient = rng.choice(self.watchlist)
+            
+            priority_fee = rng.randint(0, 5) * 10**9
+            tx = {
+                'blockHash': block_hash,
+                'blockNumber': hex(number),
+                'from': sender,
+                'to': recipient,
+                'gas': hex(21000),
+                'gasPrice': hex(base_fee + priority_fee),
+                'maxFeePerGas': hex(base_fee * 2 + priority_fee),
+                'maxPriorityFeePerGas': hex(priority_fee),
+                'hash': random_hash(rng),
+                'input': '0x' if rng.random() < 0.7 else '0xa9059cbb' + '00' * 64,
+                'nonce': hex(rng.randint(0, 5000)),
+                'transactionIndex': hex(index),
+                'value': hex(rng.randint(0, 500) * 10**18 + rng.getrandbits(60)),
+                'type': '0x2',
+                'chainId': '0x1',
+                'v': '0x0',
+                'r': random_hash(rng),
+                's': random_hash(rng),
+                'accessList': []
+            }
+            self.transactions[tx['hash']] = tx
+            transactions.append(tx)
+        
+        return {
+            'number': hex(number),
+            'hash': block_hash,
+            'parentHash': random_hash(random.Random(f"{self.seed}:{number - 1}")),
+            'nonce': '0x0000000000000000',
+            'sha3Uncles': '0x' + '00' * 32,
+            'logsBloom': '0x' + '00' * 256,
+            'transactionsRoot': '0x' + '00' * 32,
+            'stateRoot': '0x' + '00' * 32,
+            'receiptsRoot': '0x' + '00' * 32,
+            'miner': random_address(rng),
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'size': hex(1000 + 120 * len(transactions)),
+            'gasLimit': hex(30000000),
+            'gasUsed': hex(21000 * len(transactions)),
+            'timestamp': hex(GENESIS_TIMESTAMP + 12 * number),
+            'baseFeePerGas': hex(base_fee),
+            'transactions': transactions,
+            'uncles': []
+        }
+
+
+class FakeProvider(BaseProvider):
+    """Web3 provider answering JSON-RPC calls from a SyntheticChain"""
+    
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+        self.calls = {}
+        # Transactions handed out by the next eth_getFilterChanges
+        self.pending = []
+        self.full_pending = True
+    
+    @property
+    def call_count(self):
+        return sum(self.calls.values())
+    
+    def is_connected(self, show_traceback=False):
+        return True
+    
+    def make_request(self, method, params):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        return {'jsonrpc': '2.0', 'id': 1, 'result': self._result(method, params)}
+    
+    def _result(self, method, params):
+        if method == 'web3_clientVersion':
+            return 'FakeProvider/benchmark'
+        if method == 'eth_chainId':
+            return '0x1'
+        if method == 'eth_blockNumber':
+            return hex(self.chain.head)
+        if method == 'eth_getBlockByNumber':
+            block = self.chain.block(int(params[0], 16))
+            if params[1]:
+                return block
+            return dict(block, transactions=[tx['hash'] for tx in block['transactions']])
+        if method == 'eth_getTransactionByHash':
+            return self.chain.transactions.get(params[0])
+        if method == 'eth_getLogs':
+            return []
+        if method == 'eth_newPendingTransactionFilter':
+            self.full_pending = bool(params and params[0])
+            return '0x1'
+        if method == 'eth_getFilterChanges':
+            pending, self.pending = self.pending, []
+            return pending if self.full_pending else [tx['hash'] for tx in pending]
+        raise NotImplementedError(f"FakeProvider does not implement {method}")
+
+
+class SlowProvider(BaseProvider):
+    """Delegate to another provider with simulated latency, stalls and outages"""
+    
+    def __init__(self, provider, latency=0.005, stall_rate=0.0, stall_seconds=0.2, seed=1):
+        super().__init__()
+        self.provider = provider
+        self.latency = latency
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.down = False
+        self.rng = random.Random(seed)
+    
+    def is_connected(self, show_traceback=False):
+        return True
+    
+    def make_request(self, method, params):
+        if self.down:
+            time.sleep(self.latency)
+            raise ConnectionError('provider unavailable')
+        stalled = self.rng.random() < self.stall_rate
+        time.sleep(self.stall_seconds if stalled else self.latency * (0.8 + 0.4 * self.rng.random()))
+        return self.provider.make_request(method, params)
+
+
+class CountingMixin:
+    """Count a Database's read and write method calls"""
+    
+    def __init__(self, *args, **kwargs):
+        self.reads = 0
+        self.writes = 0
+        super().__init__(*args, **kwargs)
+    
+    def __getattribute__(self, name):
+        attr = super().__getattribute__(name)
+        if name.startswith('_') or name == 'init_db' or not inspect.ismethod(attr):
+            return attr
+        
+        def counted(*args, **kwargs):
+            if name.startswith(WRITE_PREFIXES):
+                self.writes += 1
+            else:
+                self.reads += 1
+            return attr(*args, **kwargs)
+        return counted
+    
+    def reset_counts(self):
+        self.reads = 0
+        self.writes = 0
+
+
+class CountingDatabase(CountingMixin, Database):
+    """SQLite Database that counts read and write method calls"""
+
+
+# Postgres server the suites run against (--database-url), or None for
+# SQLite files; each db_path a suite uses maps to its own database there
+POSTGRES_SERVER_URL = None
+_postgres_databases = {}
+
+
+def database_url(db_path):
+    """The storage URL for a suite's db_path: the path, or a new Postgres database"""
+    if POSTGRES_SERVER_URL is None:
+        return db_path
+    if db_path not in _postgres_databases:
+        import psycopg
+        name = f"bench_{os.getpid()}_{len(_postgres_databases)}"
+        with psycopg.connect(POSTGRES_SERVER_URL, autocommit=True) as conn:
+            conn.execute(f'CREATE DATABASE {name}')
+        _postgres_databases[db_path] = urlsplit(POSTGRES_SERVER_URL)._replace(path=f'/{name}').geturl()
+    return _postgres_databases[db_path]
+
+
+def drop_postgres_databases():
+    import psycopg
+    with psycopg.connect(POSTGRES_SERVER_URL, autocommit=True) as conn:
+        for url in _postgres_databases.values():
+            conn.execute(f'DROP DATABASE IF EXISTS {urlsplit(url).path[1:]} WITH (FORCE)')
+    _postgres_databases.clear()
+
+
+def open_database(db_path, counting=False):
+    """A suite's Database on the backend being benchmarked"""
+    url = database_url(db_path)
+    if POSTGRES_SERVER_URL is None:
+        return CountingDatabase(url) if counting else Database(url)
+    from postgres_db import PostgresDatabase
+    if counting:
+        return type('CountingPostgresDatabase', (CountingMixin, PostgresDatabase), {})(url)
+    return PostgresDatabase(url)
+
+
+class NullEmailService:
+    """Email service that records alerts instead of sending them"""
+    
+    def __init__(self):
+        self.sent = 0
+        self.alerts = []  # (tx hash, wallet, direction, pending)
+    
+    def send_alert_email(self, **kwargs):
+        self.sent += 1
+        self.alerts.append((kwargs['tx_hash'].removeprefix('0x'), kwargs['wallet_address'],
+                            kwargs['direction'], kwargs.get('pending', False)))
+        return True
+    
+    def send_welcome_email(self, to_email, user_name=None):
+        return True
+
+
+def seed_watchlist(db, addresses, threshold=100.0, chunk_size=500):
+    """Register the watchlist under a single benchmark user"""
+    user = db.create_user('benchmark@example.com', 'benchmark')
+    wallets = [(address, f"Whale {i}", threshold) for i, address in enumerate(addresses)]
+    for start in range(0, len(wallets), chunk_size):
+        db.add_user_wallets(user['id'], wallets[start:start + chunk_size])
+    db.bump_tracked_wallets_version()
+
+
+def build_chain(args):
+    return SyntheticChain(
+        txs_per_block=args.txs_per_block,
+        hit_rate=args.hit_rate,
+        watchlist_size=args.watchlist_size,
+        seed=args.seed
+    )
+
+
+def build_monitor(args, db_path, chain=None, wrap=None):
+    """Monitor over a fake provider for the chain; wrap(provider) may layer on another"""
+    chain = chain or build_chain(args)
+    db = open_database(db_path, counting=True)
+    seed_watchlist(db, chain.watchlist, threshold=args.threshold)
+    
+    provider = FakeProvider(chain)
+    monitor = WhaleMonitor(None, provider=wrap(provider) if wrap else provider, db=db,
+                           email_service=NullEmailService(), eth_price_usd=2000.0)
+    return monitor, chain, provider, db
+
+
+def bench_monitor(args, db_path):
+    """Run monitor_block over a range of synthetic blocks"""
+    monitor, chain, provider, db = build_monitor(args, db_path)
+    
+    # Generate blocks up front so the timing covers the pipeline only
+    block_numbers = range(chain.start_block, chain.start_block + args.blocks)
+    for number in block_numbers:
+        chain.block(number)
+    chain.head = block_numbers[-1]
+    
+    provider.calls.clear()
+    db.reset_counts()
+    whale_txs = 0
+    
+    start = time.perf_counter()
+    for number in block_numbers:
+        whale_txs += len(monitor.monitor_block(number))
+    whale_txs += len(monitor.process_token_transfers())
+    elapsed = time.perf_counter() - start
+    
+    total_txs = args.blocks * args.txs_per_block
+    return {
+        'blocks': args.blocks,
+        'transactions': total_txs,
+        'whale_transactions': whale_txs,
+        'alerts': monitor.email_service.sent,
+        'seconds': round(elapsed, 4),
+        'blocks_per_sec': round(args.blocks / elapsed, 2),
+        'txs_per_sec': round(total_txs / elapsed, 2),
+        'rpc_calls_per_block': round(provider.call_count / args.blocks, 2),
+        'rpc_calls_by_method': dict(provider.calls),
+        'db_writes_per_block': round(db.writes / args.blocks, 2),
+        'db_reads_per_block': round(db.reads / args.blocks, 2)
+    }
+
+
+def bench_rescan(args, db_path):
+    """Process a block range, rescan it, then rescan it again after a restart"""
+    monitor, chain, provider, db = build_monitor(args, db_path)
+    block_numbers = range(chain.start_block, chain.start_block + args.blocks)
+    for number in block_numbers:
+        chain.block(number)
+    chain.head = block_numbers[-1]
+    
+    def scan(monitor):
+        provider.calls.clear()
+        db.reset_counts()
+        start = time.perf_counter()
+        whale_txs = sum(len(monitor.monitor_block(number)) for number in block_numbers)
+        elapsed = time.perf_counter() - start
+        return {
+            'seconds': round(elapsed, 4),
+            'whale_transactions': whale_txs,
+            'rpc_calls': provider.call_count,
+            'db_writes': db.writes,
+            'db_reads': db.reads
+        }
+    
+    results = {'first_pass': scan(monitor), 'rescan': scan(monitor)}
+    # A fresh monitor has empty caches and relies on the processed_blocks table
+    restarted = WhaleMonitor(None, provider=provider, db=db,
+                             email_service=NullEmailService(), eth_price_usd=2000.0)
+    results['rescan_after_restart'] = scan(restarted)
+    results['alerts'] = monitor.email_service.sent + restarted.email_service.sent
+    return results
+
+
+def bench_mempool(args, db_path):
+    """Match pending transactions, then mine them and check alerts aren't repeated"""
+    monitor, chain, provider, db = build_monitor(args, db_path)
+    watcher = MempoolWatcher(monitor, full_transactions=True)
+    block_numbers = range(chain.start_block, chain.start_block + args.blocks)
+    pending = [dict(tx, blockHash=None, blockNumber=None, transactionIndex=None)
+               for number in block_numbers for tx in chain.block(number)['transactions']]
+    chain.head = block_numbers[-1]
+    
+    matched = 0
+    start = time.perf_counter()
+    for offset in range(0, len(pending), args.pending_batch):
+        provider.pending = pending[offset:offset + args.pending_batch]
+        matched += len(watcher.poll())
+    pending_elapsed = time.perf_counter() - start
+    provisional_emails = monitor.email_service.sent
+    
+    start = time.perf_counter()
+    for number in block_numbers:
+        monitor.monitor_block(number)
+    mined_elapsed = time.perf_counter() - start
+    
+    alerts = monitor.email_service.alerts
+    keys = [alert[:3] for alert in alerts]
+    return {
+        'pending_transactions': len(pending),
+        'pending_matched': matched,
+        'pending_seconds': round(pending_elapsed, 4),
+        'pending_txs_per_sec': round(len(pending) / pending_elapsed, 2),
+        'provisional_emails': provisional_emails,
+        'mined_seconds': round(mined_elapsed, 4),
+        'emails_after_mining': monitor.email_service.sent - provisional_emails,
+        'duplicate_emails': len(keys) - len(set(keys)),
+        'alerts_logged': len(db.get_alert_timings(0))
+    }
+
+
+def bench_rpc(args, db_path):
+    """Request latency from one stalling provider vs hedging to a second, then failover"""
+    chain = SyntheticChain(txs_per_block=10, seed=args.seed)
+    
+    def providers():
+        primary = SlowProvider(FakeProvider(chain), latency=0.004, stall_rate=args.stall_rate, seed=1)
+        secondary = SlowProvider(FakeProvider(chain), latency=0.008, stall_rate=args.stall_rate, seed=2)
+        return primary, secondary
+    
+    def run(provider):
+        latencies, errors = [], 0
+        for i in range(args.rpc_requests):
+            start = time.perf_counter()
+            try:
+                provider.make_request('eth_getBlockByNumber', [hex(1 + i % 20), False])
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return {
+            'requests': args.rpc_requests,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'seconds': round(sum(latencies), 4)
+        }
+    
+    primary, _ = providers()
+    results = {'single': run(primary)}
+    
+    primary, secondary = providers()
+    multi = MultiProvider([primary, secondary], names=['primary', 'secondary'])
+    results['hedged'] = run(multi)
+    results['hedged']['providers'] = multi.stats()
+    
+    # The healthiest provider goes down mid-run
+    primary, secondary = providers()
+    multi = MultiProvider([primary, secondary], names=['primary', 'secondary'])
+    run(multi)
+    multi.ranked()[0].provider.down = True
+    results['failover'] = run(multi)
+    results['failover']['providers'] = multi.stats()
+    return results
+
+
+def bench_cache(args, db_path):
+    """Scan a finalized range twice with fresh databases: cold and warm RPC cache"""
+    chain = build_chain(args)
+    block_numbers = range(chain.start_block, chain.start_block + args.blocks)
+    for number in block_numbers:
+        chain.block(number)
+    chain.head = block_numbers[-1] + config.RPC_CACHE_CONFIRMATIONS
+    cache_path = f"{db_path}.rpc_cache"
+    
+    results = {}
+    for name in ('cold', 'warm'):
+        caches = []
+        
+        def wrap(provider):
+            caches.append(CachingProvider(SlowProvider(provider, latency=args.rpc_latency_ms / 1000), cache_path))
+            return caches[0]
+        
+        monitor, _, provider, db = build_monitor(args, f"{db_path}.{name}", chain=chain, wrap=wrap)
+        provider.calls.clear()
+        start = time.perf_counter()
+        whale_txs = sum(len(monitor.monitor_block(number)) for number in block_numbers)
+        whale_txs += len(monitor.process_token_transfers())
+        elapsed = time.perf_counter() - start
+        
+        results[name] = {
+            'seconds': round(elapsed, 4),
+            'blocks_per_sec': round(args.blocks / elapsed, 2),
+            'whale_transactions': whale_txs,
+            'provider_calls': provider.call_count,
+            'cache_bytes': caches[0].size,
+            'cache_bytes_per_block': round(caches[0].size / args.blocks)
+        }
+        caches[0].close()
+    return results
+
+
+def follow_chain(monitor, final_head, poll_interval=0.0, advance=None):
+    """Process blocks as the head moves, like start_monitoring but stopping at final_head"""
+    whale_txs = 0
+    while monitor.last_block < final_head:
+        if advance:
+            advance()
+        head = monitor.w3.eth.block_number
+        for number in range(monitor.last_block + 1, head + 1):
+            whale_txs += len(monitor.monitor_block(number))
+            monitor.last_block = number
+        whale_txs += len(monitor.process_token_transfers())
+        time.sleep(poll_interval)
+    return whale_txs
+
+
+def bench_replay(args, db_path):
+    """Record a bursty run against the fake node, then replay it at max and 1x speed"""
+    chain = build_chain(args)
+    final_head = chain.start_block + args.blocks - 1
+    # Usually one new block per poll, sometimes none or a burst of several
+    rng = random.Random(args.seed)
+    heads = []
+    head = chain.start_block - 1
+    while head < final_head:
+        head = min(head + rng.choice((0, 1, 1, 1, 2, 4)), final_head)
+        heads.append(head)
+    poll_interval = args.poll_ms / 1000
+    capture = f"{db_path}.capture.ndjson.gz"
+    
+    recorders = []
+    
+    def record(provider):
+        recorders.append(RecordingProvider(SlowProvider(provider, latency=args.rpc_latency_ms / 1000), capture))
+        return recorders[0]
+    
+    monitor, _, provider, _ = build_monitor(args, f"{db_path}.record", chain=chain, wrap=record)
+    monitor.last_block = chain.start_block - 1
+    polls = iter(heads)
+    
+    def advance():
+        chain.head = next(polls)
+    
+    start = time.perf_counter()
+    whale_txs = follow_chain(monitor, final_head, poll_interval, advance)
+    recorders[0].close()
+    results = {'record': {
+        'seconds': round(time.perf_counter() - start, 4),
+        'polls': len(heads),
+        'whale_transactions': whale_txs,
+        'requests': provider.call_count,
+        'capture_bytes': os.path.getsize(capture)
+    }}
+    
+    for name, speed in (('replay_max', None), ('replay_1x', 1.0)):
+        replay = ReplayProvider(capture, speed)
+        monitor, _, _, _ = build_monitor(args, f"{db_path}.{name}", chain=chain, wrap=lambda _: replay)
+        monitor.last_block = chain.start_block - 1
+        start = time.perf_counter()
+        whale_txs = follow_chain(monitor, final_head, poll_interval / speed if speed else 0)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'seconds': round(elapsed, 4),
+            'blocks_per_sec': round(args.blocks / elapsed, 2),
+            'whale_transactions': whale_txs,
+            'requests_not_in_capture': replay.misses
+        }
+    return results
+
+
+LABEL_WORDS = ('binance', 'kraken', 'coinbase', 'bitfinex', 'gemini', 'okx', 'hot', 'cold',
+               'wallet', 'deposit', 'treasury', 'fund', 'whale', 'bridge', 'vault', 'team')
+
+
+def bench_search(args, db_path):
+    """Build a prefix index over many addresses and labels and time autocomplete queries"""
+    rng = random.Random(args.seed)
+    addresses = [random_address(rng) for _ in range(args.search_entries)]
+    labels = [(random_address(rng), f"{rng.choice(LABEL_WORDS).title()} {rng.choice(LABEL_WORDS).title()} {i}",
+               'whale') for i in range(args.search_entries // 100)]
+    
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add_many(labels)
+    index.add_many((address, None, 'address') for address in addresses)
+    build_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(1000):
+        index.add(random_address(rng))
+    incremental_us = (time.perf_counter() - start) / 1000 * 1e6
+    
+    queries = ([rng.choice(addresses)[:rng.randint(3, 12)] for _ in range(500)] +
+               [rng.choice(LABEL_WORDS)[:rng.randint(1, 5)] for _ in range(500)] +
+               [f"{rng.choice(LABEL_WORDS)} {rng.choice(LABEL_WORDS)[:2]}" for _ in range(500)])
+    timings = []
+    results = 0
+    for query in queries:
+        start = time.perf_counter()
+        results += len(index.search(query, 10))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'entries': len(index),
+        'keys': len(index._keys),
+        'build_seconds': round(build_seconds, 4),
+        'incremental_add_us': round(incremental_us, 2),
+        'queries': len(queries),
+        'avg_results': round(results / len(queries), 2),
+        'query_p50_us': round(percentile(timings, 50) * 1e6, 2),
+        'query_p99_us': round(percentile(timings, 99) * 1e6, 2),
+        'query_max_us': round(timings[-1] * 1e6, 2)
+    }
+
+
+def bench_gas(args, db_path):
+    """Time per-block fee statistics against the rest of monitor_block"""
+    monitor, chain, provider, db = build_monitor(args, db_path)
+    block_numbers = range(chain.start_block, chain.start_block + args.blocks)
+    for number in block_numbers:
+        chain.block(number)
+    chain.head = block_numbers[-1]
+    blocks = [monitor.rpc('eth_getBlockByNumber', [hex(number), True]) for number in block_numbers]
+    block_fee_stats(blocks[0])  # import numpy outside the timing
+    
+    timings = []
+    for block in blocks:
+        start = time.perf_counter()
+        block_fee_stats(block)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    
+    start = time.perf_counter()
+    for number in block_numbers:
+        monitor.monitor_block(number)
+    block_seconds = (time.perf_counter() - start) / args.blocks
+    
+    stats = db.get_gas_history(1)[0]
+    return {
+        'blocks': args.blocks,
+        'txs_per_block': args.txs_per_block,
+        'stats_p50_us': round(percentile(timings, 50) * 1e6, 2),
+        'stats_p99_us': round(percentile(timings, 99) * 1e6, 2),
+        'monitor_block_ms': round(block_seconds * 1000, 3),
+        'share_of_block': f"{statistics.mean(timings) / block_seconds:.2%}",
+        'last_row': {key: stats[key] for key in GAS_STATS_COLUMNS}
+    }
+
+
+def bench_matcher(args, db_path):
+    """Match blocks against a large watchlist: packed arrays vs per-transaction set lookups"""
+    chain = SyntheticChain(txs_per_block=args.txs_per_block, hit_rate=args.hit_rate,
+                           watchlist_size=args.matcher_watchlist, seed=args.seed)
+    blocks = [chain.block(number)['transactions'] for number in range(1, args.blocks + 1)]
+    
+    tracemalloc.start()
+    tracked = set(chain.watchlist)
+    set_bytes = tracemalloc.get_traced_memory()[0]
+    matcher = BlockMatcher(tracked)
+    matcher_bytes = tracemalloc.get_traced_memory()[0] - set_bytes
+    peaks = []
+    for transactions in blocks:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        matcher.match(transactions)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    
+    def scan(match):
+        timings = []
+        hits = 0
+        for transactions in blocks:
+            start = time.perf_counter()
+            hits += len(match(transactions))
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return hits, {
+            'hits': hits,
+            'block_p50_us': round(percentile(timings, 50) * 1e6, 2),
+            'block_p99_us': round(percentile(timings, 99) * 1e6, 2)
+        }
+    
+    def set_match(transactions):
+        return [index for index, tx in enumerate(transactions)
+                if tx['from'].lower() in tracked or (tx['to'] and tx['to'].lower() in tracked)]
+    
+    matcher_hits, matcher_result = scan(matcher.match)
+    set_hits, set_result = scan(set_match)
+    assert matcher_hits == set_hits
+    return {
+        'blocks': args.blocks,
+        'txs_per_block': args.txs_per_block,
+        'watchlist': len(matcher),
+        'packed': dict(matcher_result, watchlist_mb=round(matcher_bytes / 1e6, 1),
+                       peak_kb_per_block=round(max(peaks) / 1e3, 1)),
+        'set': dict(set_result, watchlist_mb=round(set_bytes / 1e6, 1))
+    }
+
+
+def bench_process_transaction(args, db_path):
+    """Run process_transaction over watched transactions only"""
+    monitor, chain, provider, db = build_monitor(args, db_path)
+    watched = set(chain.watchlist)
+    hashes = []
+    number = chain.start_block
+    while len(hashes) < args.transactions:
+        block = chain.block(number)
+        hashes.extend(tx['hash'] for tx in block['transactions']
+                      if tx['from'] in watched or tx['to'] in watched)
+        number += 1
+    hashes = [bytes.fromhex(h[2:]) for h in hashes[:args.transactions]]
+    
+    provider.calls.clear()
+    db.reset_counts()
+    
+    start = time.perf_counter()
+    for tx_hash in hashes:
+        monitor.process_transaction(tx_hash)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'transactions': len(hashes),
+        'seconds': round(elapsed, 4),
+        'txs_per_sec': round(len(hashes) / elapsed, 2),
+        'rpc_calls_per_tx': round(provider.call_count / len(hashes), 2),
+        'db_writes_per_tx': round(db.writes / len(hashes), 2),
+        'db_reads_per_tx': round(db.reads / len(hashes), 2)
+    }
+
+
+def bench_insert(args, db_path):
+    """Measure the Database.insert_transaction path"""
+    db = open_database(db_path)
+    rng = random.Random(args.seed)
+    rows = [{
+        'hash': random_hash(rng),
+        'from': random_address(rng),
+        'to': random_address(rng),
+        'value': str(rng.randint(1, 1000)),
+        'value_usd': None,
+        'gasPrice': '20',
+        'blockNumber': i,
+        'timestamp': GENESIS_TIMESTAMP + i,
+        'type': 'Transfer'
+    } for i in range(args.transactions)]
+    
+    start = time.perf_counter()
+    for row in rows:
+        db.insert_transaction(row)
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for row in rows[:min(len(rows), 500)]:
+        db.insert_transaction(row)
+    duplicate_elapsed = time.perf_counter() - start
+    
+    return {
+        'transactions': len(rows),
+        'seconds': round(elapsed, 4),
+        'inserts_per_sec': round(len(rows) / elapsed, 2),
+        'duplicate_inserts_per_sec': round(min(len(rows), 500) / duplicate_elapsed, 2)
+    }
+
+
+def measure(func):
+    """Run func once, returning (result, seconds, peak traced bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_serialize(args, db_path):
+    """Compare dict rows + jsonify with the streamed tuple encoder for /api/transactions"""
+    import config
+    config.DATABASE_URL = database_url(db_path)
+    import app as api
+    from flask import jsonify
+    
+    db = api.db
+    rng = random.Random(args.seed)
+    watched = [address for address in config.WHALE_LABELS][:5]
+    for i in range(args.rows):
+        db.insert_transaction({
+            'hash': random_hash(rng),
+            'from': rng.choice(watched) if i % 3 == 0 else random_address(rng),
+            'to': random_address(rng),
+            'value': str(rng.randint(1, 1000)),
+            'value_usd': rng.random() * 1e6,
+            'gasPrice': '20',
+            'blockNumber': i,
+            'timestamp': GENESIS_TIMESTAMP + i,
+            'type': 'Transfer'
+        })
+    
+    def dict_rows():
+        with api.app.test_request_context():
+            transactions = db.get_recent_transactions(args.rows)
+            for tx in transactions:
+                tx['from_label'] = config.get_whale_label(tx['from_address'])
+                tx['to_label'] = config.get_whale_label(tx['to_address']) if tx['to_address'] else None
+            return len(jsonify(transactions).get_data())
+    
+    def streamed_tuples():
+        client = api.app.test_client()
+        response = client.get(f'/api/transactions?limit={args.rows}', buffered=False)
+        # Count bytes as a client would receive them, without keeping the body
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+    
+    results = {'rows': args.rows, 'orjson': api.serialization.orjson is not None}
+    for name, func in (('dict_rows_jsonify', dict_rows), ('streamed_tuples', streamed_tuples)):
+        func()  # warm up caches and imports
+        size, seconds, peak = measure(func)
+        results[name] = {
+            'seconds': round(seconds, 4),
+            'peak_memory_mb': round(peak / 2 ** 20, 2),
+            'response_bytes': size
+        }
+    return results
+
+
+def bench_snapshot(args, db_path):
+    """Time public feed and stats requests served from the snapshot against the database"""
+    import config
+    config.DATABASE_URL = database_url(db_path)
+    import app as api
+    from snapshot import SnapshotReader, SnapshotWriter
+    
+    db = api.db = open_database(db_path, counting=True)
+    rng = random.Random(args.seed)
+    for i in range(args.rows):
+        db.insert_transaction({
+            'hash': random_hash(rng),
+            'from': random_address(rng),
+            'to': random_address(rng),
+            'value': str(rng.randint(1, 1000)),
+            'value_usd': rng.random() * 1e6,
+            'gasPrice': '20',
+            'blockNumber': i,
+            'timestamp': GENESIS_TIMESTAMP + i,
+            'type': 'Transfer',
+            'isLarge': i % 10 == 0
+        })
+        if i % 100 == 0:
+            db.insert_gas_price(rng.uniform(10, 50), GENESIS_TIMESTAMP + i)
+    
+    snapshot_path = db_path + '.snapshot'
+    writer = SnapshotWriter(snapshot_path)
+    publish_timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        writer.publish(db)
+        publish_timings.append(time.perf_counter() - start)
+    publish_timings.sort()
+    
+    client = api.app.test_client()
+    urls = {'transactions_50': '/api/transactions?limit=50', 'stats': '/api/stats'}
+    results = {
+        'rows': args.rows,
+        'snapshot_rows': writer.rows,
+        'snapshot_bytes': os.path.getsize(snapshot_path),
+        'publish_p50_ms': round(percentile(publish_timings, 50) * 1e3, 3)
+    }
+    for source, reader in (('database', None), ('snapshot', SnapshotReader(snapshot_path))):
+        api.feed_snapshot = reader
+        for name, url in urls.items():
+            bodies = {client.get(url).get_data() for _ in range(3)}  # warm up
+            db.reset_counts()
+            timings = []
+            for _ in range(500):
+                start = time.perf_counter()
+                client.get(url).get_data()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results[f'{source}_{name}'] = {
+                'p50_us': round(percentile(timings, 50) * 1e6, 1),
+                'p99_us': round(percentile(timings, 99) * 1e6, 1),
+                'db_calls_per_request': db.reads / len(timings),
+                'response_bytes': len(bodies.pop())
+            }
+    return results
+
+
+class WebhookReceiver:
+    """Keep-alive HTTP stand-in for customer webhook endpoints.
+    
+    Runs in its own process, like a remote endpoint, and waits ``delay``
+    seconds per request to stand in for network and handler time.
+    """
+    
+    def __init__(self, secret=None, status=200, delay=0.0):
+        self.secret = secret
+        self.status = status
+        self.delay = delay
+        context = multiprocessing.get_context('fork')
+        self._received = context.Value('i', 0)
+        self._bad_signatures = context.Value('i', 0)
+        self._ports = context.Queue()
+        self._process = context.Process(target=self._serve, daemon=True)
+        self.port = None
+    
+    @property
+    def received(self):
+        return self._received.value
+    
+    @property
+    def bad_signatures(self):
+        return self._bad_signatures.value
+    
+    def _serve(self):
+        receiver = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if receiver.secret:
+                    expected = 'sha256=' + sign(receiver.secret, self.headers['X-Whale-Timestamp'], body)
+                    if not hmac.compare_digest(self.headers.get('X-Whale-Signature', ''), expected):
+                        with receiver._bad_signatures.get_lock():
+                            receiver._bad_signatures.value += 1
+                with receiver._received.get_lock():
+                    receiver._received.value += 1
+                time.sleep(receiver.delay)
+                self.send_response(receiver.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        self._ports.put(server.server_address[1])
+        server.serve_forever()
+    
+    def start(self):
+        self._process.start()
+        self.port = self._ports.get(timeout=10)
+        return self
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/hook"
+    
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+
+def bench_webhooks(args, db_path):
+    """Deliver one hot-address alert to many webhook subscribers"""
+    # The stand-in endpoints listen on plain http on loopback
+    config.WEBHOOK_ALLOW_HTTP = config.WEBHOOK_ALLOW_PRIVATE = True
+    db = open_database(db_path)
+    secret = 'bench-secret'
+    receiver = WebhookReceiver(secret=secret, delay=args.webhook_latency_ms / 1000).start()
+    rng = random.Random(args.seed)
+    hot_address = random_address(rng)
+    
+    for i in range(args.subscribers):
+        user = db.create_user(f"subscriber{i}@bench.local", 'password')
+        wallet_id = db.add_user_wallet(user['id'], hot_address, f"Hot {i}", 1.0)
+        db.update_wallet_webhook(user['id'], wallet_id, receiver.url, secret)
+    
+    rules = RuleIndex.from_rows(db.get_alert_rules())
+    tx_data = {
+        'id': 1, 'hash': random_hash(rng), 'from': hot_address, 'to': random_address(rng),
+        'value': '5000', 'value_usd': None, 'type': 'Transfer', 'blockNumber': 1
+    }
+    alerts = rules.evaluate([tx_data])
+    
+    results = {'subscribers': args.subscribers, 'endpoint_latency_ms': args.webhook_latency_ms}
+    for concurrency in sorted({1, args.webhook_concurrency}):
+        service = WebhookService(concurrency=concurrency, retries=0)
+        latencies = []
+        start = time.perf_counter()
+        futures = [service.deliver(rule, tx_data, direction) for rule, tx_data, direction in alerts]
+        for future in futures:
+            future.add_done_callback(lambda _: latencies.append(time.perf_counter() - start))
+        wait(futures)
+        elapsed = time.perf_counter() - start
+        service.close()
+        
+        latencies.sort()
+        results[f"concurrency_{concurrency}"] = {
+            'delivered': sum(1 for f in futures if f.result()),
+            'seconds': round(elapsed, 4),
+            'deliveries_per_sec': round(len(futures) / elapsed, 2),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+        }
+    results['received'] = receiver.received
+    results['bad_signatures'] = receiver.bad_signatures
+    receiver.stop()
+    
+    # A failing endpoint: every delivery is retried, then dead-lettered
+    failing = WebhookReceiver(status=503).start()
+    for rule, _, _ in alerts[:10]:
+        rule.webhook_url = failing.url
+    service = WebhookService(db=db, concurrency=args.webhook_concurrency, retries=2, backoff=0.01)
+    wait([service.deliver(rule, tx_data, direction) for rule, tx_data, direction in alerts[:10]])
+    service.close()
+    failing.stop()
+    results['failing_endpoint'] = {
+        'attempts': failing.received,
+        'dead_letters': sum(len(db.get_webhook_dead_letters(rule.user_id)) for rule, _, _ in alerts[:10])
+    }
+    return results
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter, as a gunicorn worker would after fork+import
+STARTUP_PROBE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/api/health')
+responded = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_response': responded - start}))
+'''
+
+
+def import_report(db_path, limit=10):
+    """Modules imported directly by app.py, slowest (cumulative) first"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=REPO_DIR, env=dict(os.environ, DATABASE_URL=database_url(db_path)),
+                            capture_output=True, text=True)
+    modules, pending = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Children are listed before their parent
+        if depth == 1:
+            pending.append({'module': name.strip(), 'cumulative_ms': round(int(cumulative_us) / 1000, 2),
+                            'self_ms': round(int(self_us) / 1000, 2)})
+        elif depth == 0:
+            if name.strip() == 'app':
+                modules = pending
+            pending = []
+    modules.sort(key=lambda m: m['cumulative_ms'], reverse=True)
+    return modules[:limit]
+
+
+def bench_startup(args, db_path):
+    """Time fresh API workers from interpreter start to their first response"""
+    open_database(db_path).close()  # an existing database, as on every deploy after the first
+    results = {}
+    for mode, init_schema in (('schema_per_worker', 'true'), ('schema_once', 'false')):
+        env = dict(os.environ, DATABASE_URL=database_url(db_path), INIT_SCHEMA=init_schema)
+        runs = []
+        for _ in range(args.startup_runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=REPO_DIR, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            wall = time.perf_counter() - start
+            probe = json.loads(output.strip().splitlines()[-1])
+            runs.append((wall, probe['import'], probe['first_response']))
+        results[mode] = {
+            'runs': len(runs),
+            'process_to_first_response_ms': round(statistics.median(r[0] for r in runs) * 1000, 1),
+            'import_ms': round(statistics.median(r[1] for r in runs) * 1000, 1),
+            'import_to_first_response_ms': round(statistics.median(r[2] for r in runs) * 1000, 1)
+        }
+    results['slowest_imports'] = import_report(db_path)
+    return results
+
+
+SUITES = {
+    'monitor': bench_monitor,
+    'rescan': bench_rescan,
+    'mempool': bench_mempool,
+    'rpc': bench_rpc,
+    'cache': bench_cache,
+    'replay': bench_replay,
+    'search': bench_search,
+    'gas': bench_gas,
+    'matcher': bench_matcher,
+    'process': bench_process_transaction,
+    'insert': bench_insert,
+    'startup': bench_startup,
+    'serialize': bench_serialize,
+    'snapshot': bench_snapshot,
+    'webhooks': bench_webhooks
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Whale monitor throughput benchmarks')
+    parser.add_argument('--suite', choices=['all'] + list(SUITES), default='all')
+    parser.add_argument('--blocks', type=int, default=20)
+    parser.add_argument('--txs-per-block', type=int, default=200)
+    parser.add_argument('--hit-rate', type=float, default=0.05,
+                        help='fraction of transactions touching a watched address')
+    parser.add_argument('--watchlist-size', type=int, default=100)
+    parser.add_argument('--transactions', type=int, default=1000,
+                        help='transaction count for the process and insert suites')
+    parser.add_argument('--threshold', type=float, default=100.0,
+                        help='alert threshold (ETH) for every watched wallet')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--pending-batch', type=int, default=1000,
+                        help='pending transactions returned per filter poll in the mempool suite')
+    parser.add_argument('--rpc-requests', type=int, default=500,
+                        help='requests sent per configuration in the rpc suite')
+    parser.add_argument('--rpc-latency-ms', type=float, default=1.0,
+                        help='simulated provider round trip in the cache suite')
+    parser.add_argument('--poll-ms', type=float, default=50.0,
+                        help='pause between head polls in the replay suite')
+    parser.add_argument('--stall-rate', type=float, default=0.03,
+                        help='fraction of rpc suite requests a provider stalls on')
+    parser.add_argument('--search-entries', type=int, default=100000,
+                        help='addresses indexed by the search suite')
+    parser.add_argument('--matcher-watchlist', type=int, default=1000000,
+                        help='tracked addresses in the matcher suite')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='transactions returned by one response in the serialize suite')
+    parser.add_argument('--subscribers', type=int, default=1000,
+                        help='webhook subscribers to one hot address in the webhooks suite')
+    parser.add_argument('--webhook-concurrency', type=int, default=32)
+    parser.add_argument('--webhook-latency-ms', type=float, default=20.0,
+                        help='time the stand-in endpoint takes to answer each webhook')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='fresh interpreters started per mode in the startup suite')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', ''),
+                        help='postgres:// server to run the suites against (default: $DATABASE_URL); '
+                             'anything else runs them on SQLite files')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global POSTGRES_SERVER_URL
+    args = parse_args(argv)
+    suites = list(SUITES) if args.suite == 'all' else [args.suite]
+    if args.database_url.startswith(('postgres://', 'postgresql://')):
+        POSTGRES_SERVER_URL = args.database_url
+    
+    results = {}
+    # The monitor logs every transaction; keep that out of the JSON report
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        try:
+            for name in suites:
+                results[name] = SUITES[name](args, os.path.join(tmp, f"{name}.db"))
+        finally:
+            if POSTGRES_SERVER_URL is not None:
+                drop_postgres_databases()
+    
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'backend': 'sqlite' if POSTGRES_SERVER_URL is None else 'postgres',
+        'timestamp': int(time.time()),
+        'params': {k: v for k, v in vars(args).items() if k not in ('suite', 'output', 'database_url')},
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
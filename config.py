@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,7 +7,34 @@ load_dotenv()
 # Web3 Configuration
 INFURA_URL = os.getenv('INFURA_URL')
 ALCHEMY_URL = os.getenv('ALCHEMY_URL')
-RPC_URL = INFURA_URL or ALCHEMY_URL
+# Every provider the monitor may use: comma-separated RPC_URLS, else each of
+# RPC_URL, INFURA_URL and ALCHEMY_URL that is set (RPC_URL is then the first
+# of them). With several, requests go to the healthiest one, are hedged to a
+# second one when slower than the first's p95 (RPC_HEDGE_DELAY seconds until
+# RPC_HEDGE_MIN_SAMPLES are known) and fail over on errors. After
+# RPC_MAX_FAILURES consecutive failures a provider sits out RPC_COOLDOWN s.
+RPC_URLS = [url.strip() for url in os.getenv('RPC_URLS', '').split(',') if url.strip()] \
+    or list(dict.fromkeys(url for url in (os.getenv('RPC_URL'), INFURA_URL, ALCHEMY_URL) if url))
+RPC_URL = RPC_URLS[0] if RPC_URLS else None
+RPC_HEDGE_DELAY = float(os.getenv('RPC_HEDGE_DELAY', 0.5))
+RPC_HEDGE_MIN_SAMPLES = int(os.getenv('RPC_HEDGE_MIN_SAMPLES', 20))
+RPC_LATENCY_WINDOW = int(os.getenv('RPC_LATENCY_WINDOW', 200))
+RPC_MAX_FAILURES = int(os.getenv('RPC_MAX_FAILURES', 3))
+RPC_COOLDOWN = float(os.getenv('RPC_COOLDOWN', 30))
+# On-disk cache of block/transaction/receipt/log responses at least
+# RPC_CACHE_CONFIRMATIONS deep (empty path disables), evicting the oldest
+# blocks past RPC_CACHE_MAX_BYTES of compressed data
+RPC_CACHE_PATH = os.getenv('RPC_CACHE_PATH', '')
+RPC_CACHE_MAX_BYTES = int(os.getenv('RPC_CACHE_MAX_BYTES', 2 * 1024**3))
+RPC_CACHE_CONFIRMATIONS = int(os.getenv('RPC_CACHE_CONFIRMATIONS', 64))
+# Capture all RPC traffic to a gzip NDJSON file, or run the monitor offline
+# from such a capture at RPC_REPLAY_SPEED times real time (0 = no waiting)
+RPC_RECORD_PATH = os.getenv('RPC_RECORD_PATH', '')
+RPC_REPLAY_PATH = os.getenv('RPC_REPLAY_PATH', '')
+RPC_REPLAY_SPEED = float(os.getenv('RPC_REPLAY_SPEED', 1))
+
+# Seconds between chain head polls in the monitor loop
+MONITOR_POLL_INTERVAL = float(os.getenv('MONITOR_POLL_INTERVAL', 12))
 
 # Email Configuration (SMTP)
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -26,6 +54,82 @@ HIGH_GAS_THRESHOLD = 100  # Gwei
 API_HOST = '0.0.0.0'
 API_PORT = 5000
 
+# Storage: a SQLite file path (optionally sqlite:///path) or a postgres:// URL.
+# Postgres connections come from a per-process pool; statements are prepared
+# server-side after PG_PREPARE_THRESHOLD executions (empty disables, e.g.
+# behind pgbouncer in transaction mode).
+DATABASE_URL = os.getenv('DATABASE_URL', 'whale_monitor.db')
+PG_POOL_MIN_SIZE = int(os.getenv('PG_POOL_MIN_SIZE', 1))
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', 10))
+PG_PREPARE_THRESHOLD = os.getenv('PG_PREPARE_THRESHOLD', '1')
+PG_PREPARE_THRESHOLD = int(PG_PREPARE_THRESHOLD) if PG_PREPARE_THRESHOLD else None
+
+# Create/migrate tables when a Database is opened. Set false where the schema
+# is set up once instead (gunicorn.conf.py does this in the master process).
+INIT_SCHEMA = os.getenv('INIT_SCHEMA', 'true').lower() in ('1', 'true', 'yes')
+
+# Transaction lists longer than this are streamed in chunks of
+# JSON_CHUNK_ROWS instead of being encoded in one piece
+JSON_STREAM_MIN_ROWS = int(os.getenv('JSON_STREAM_MIN_ROWS', 1000))
+JSON_CHUNK_ROWS = int(os.getenv('JSON_CHUNK_ROWS', 500))
+
+# Public feed snapshot: after each block the monitor writes the latest
+# SNAPSHOT_ROWS transactions and the stats to SNAPSHOT_PATH, and API workers
+# serve /api/transactions (up to that limit) and /api/stats from it. A
+# snapshot older than SNAPSHOT_MAX_AGE seconds is ignored (0 never expires it);
+# an empty path turns it off. It defaults to the temp directory so it stays out
+# of the checkout; the monitor and the API must share the path to use it.
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'whale_monitor_feed_snapshot.bin'))
+SNAPSHOT_ROWS = int(os.getenv('SNAPSHOT_ROWS', 500))
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', 300))
+
+# Rows fetched and sent per chunk by the API-key transaction export
+EXPORT_BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', 1000))
+
+# Webhook alert delivery (monitor process): concurrent requests over a
+# keep-alive pool, per-request timeout, retries with exponential backoff
+WEBHOOK_CONCURRENCY = int(os.getenv('WEBHOOK_CONCURRENCY', 32))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 5))
+WEBHOOK_RETRIES = int(os.getenv('WEBHOOK_RETRIES', 3))
+WEBHOOK_BACKOFF = float(os.getenv('WEBHOOK_BACKOFF', 0.5))
+# Webhook URLs must be https and resolve only to public addresses, checked
+# when saved and again on every delivery. The flags relax this for local
+# development and tests.
+WEBHOOK_ALLOW_HTTP = os.getenv('WEBHOOK_ALLOW_HTTP', 'false').lower() in ('1', 'true', 'yes')
+WEBHOOK_ALLOW_PRIVATE = os.getenv('WEBHOOK_ALLOW_PRIVATE', 'false').lower() in ('1', 'true', 'yes')
+
+# Per-worker cache of user records and wallet maps for authenticated routes.
+# Wallet changes invalidate the user's entry on the worker that made them; the
+# short TTL bounds how long other workers can serve the old wallets.
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 5))
+
+# /api/search: results per query (at most SEARCH_MAX_RESULTS), how often each
+# worker adds addresses from newly stored transactions to its index (in the
+# background), and how many of the most recently seen addresses it keeps
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', 10))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+SEARCH_REFRESH_INTERVAL = float(os.getenv('SEARCH_REFRESH_INTERVAL', 30))
+SEARCH_MAX_ADDRESSES = int(os.getenv('SEARCH_MAX_ADDRESSES', 100000))
+
+# Bulk wallet import limits
+MAX_IMPORT_ROWS = int(os.getenv('MAX_IMPORT_ROWS', 100000))
+IMPORT_CHUNK_SIZE = 500  # rows per executemany transaction (under SQLite's variable limit)
+
+# Request profiling (opt-in). Slow requests/queries are logged when enabled.
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+PROFILE_OUTPUT_DIR = os.getenv('PROFILE_OUTPUT_DIR', 'profiles')
+
+# Token required by /api/admin/* and /api/metrics (unset disables them)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Port for the monitor process's Prometheus /metrics endpoint (0 disables it).
+# It has no auth, so it only listens on loopback unless a host is given.
+MONITOR_METRICS_PORT = int(os.getenv('MONITOR_METRICS_PORT', 9100))
+MONITOR_METRICS_HOST = os.getenv('MONITOR_METRICS_HOST', '127.0.0.1')
+
 # Whale labels - map addresses to names
 WHALE_LABELS = {
     '0x00000000219ab540356cBB839Cbe05303d7705Fa': 'Ethereum Foundation',
@@ -48,6 +152,37 @@ WHALE_LABELS = {
 }
 
 
+# ERC-20 tokens whose Transfer events are tracked. 'pegged' says how to value
+# an amount: 'USD' for stablecoins, 'ETH' for wrapped ether.
+TRACK_TOKEN_TRANSFERS = os.getenv('TRACK_TOKEN_TRANSFERS', 'true').lower() in ('1', 'true', 'yes')
+TRACKED_TOKENS = {
+    '0xdAC17F958D2ee523a2206206994597C13D831ec7': {'symbol': 'USDT', 'decimals': 6, 'pegged': 'USD'},
+    '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': {'symbol': 'USDC', 'decimals': 6, 'pegged': 'USD'},
+    '0x6B175474E89094C44Da98b954EedeAC495271d0F': {'symbol': 'DAI', 'decimals': 18, 'pegged': 'USD'},
+    '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2': {'symbol': 'WETH', 'decimals': 18, 'pegged': 'ETH'},
+}
+
+# Monitor dedup: transaction hashes and block hashes remembered in memory
+# so rescans after a restart or reorg skip work already done
+DEDUP_TX_CACHE_SIZE = int(os.getenv('DEDUP_TX_CACHE_SIZE', 100000))
+DEDUP_BLOCK_CACHE_SIZE = int(os.getenv('DEDUP_BLOCK_CACHE_SIZE', 1024))
+
+# Mempool mode: poll a pending-transaction filter and send provisional
+# alerts before inclusion. Alerts sent are remembered (up to the cache size,
+# for the TTL in seconds) so the mined transaction doesn't alert again.
+MEMPOOL_ENABLED = os.getenv('MEMPOOL_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+MEMPOOL_POLL_INTERVAL = float(os.getenv('MEMPOOL_POLL_INTERVAL', 1.0))
+# Ask the filter for full transactions (geth, Erigon); off fetches each hash
+MEMPOOL_FULL_TRANSACTIONS = os.getenv('MEMPOOL_FULL_TRANSACTIONS', 'true').lower() in ('1', 'true', 'yes')
+MEMPOOL_ALERT_CACHE_SIZE = int(os.getenv('MEMPOOL_ALERT_CACHE_SIZE', 50000))
+MEMPOOL_ALERT_TTL = float(os.getenv('MEMPOOL_ALERT_TTL', 3600))
+
+# Tracked addresses per eth_getLogs topic filter (providers cap filter size)
+LOGS_ADDRESS_CHUNK = int(os.getenv('LOGS_ADDRESS_CHUNK', 500))
+
+
+_WHALE_LABELS_LOWER = {address.lower(): label for address, label in WHALE_LABELS.items()}
+
 
 def get_whale_label(address):
     """Get label for a whale address"""
@@ -55,8 +190,8 @@ def get_whale_label(address):
         return 'Unknown'
     
     # Check case-insensitive
-    for whale_addr, label in WHALE_LABELS.items():
-        if whale_addr.lower() == address.lower():
-            return label
+    label = _WHALE_LABELS_LOWER.get(address.lower())
+    if label:
+        return label
     
     return f"{address[:6]}...{address[-4:]}"
\ No newline at end of file
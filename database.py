@@ -1,17 +1,140 @@
 import sqlite3
 from datetime import datetime
 import json
+import re
 import hashlib
 import secrets
+import time
+import config
+import metrics
+from gas_stats import GAS_STATS_COLUMNS, PRIORITY_PERCENTILES
 
+DB_QUERY_LATENCY = metrics.histogram(
+    'db_query_duration_seconds', 'Latency of Database method calls', ['method'])
+DB_QUERY_ERRORS = metrics.counter(
+    'db_query_errors_total', 'Database method calls that raised', ['method'])
+
+# Native ETH transfers use log_index -1; ERC-20 transfers use the Transfer
+# log's index, so one tx_hash can hold several token movements.
+TRANSACTIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tx_hash TEXT NOT NULL,
+        log_index INTEGER NOT NULL DEFAULT -1,
+        from_address BLOB NOT NULL,
+        to_address BLOB,
+        value TEXT NOT NULL,
+        value_usd REAL,
+        gas_price TEXT NOT NULL,
+        block_number INTEGER,
+        timestamp INTEGER,
+        tx_type TEXT,
+        is_large BOOLEAN,
+        alert_sent BOOLEAN DEFAULT 0,
+        token_address TEXT,
+        token_symbol TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(tx_hash, log_index)
+    )
+'''
+
+# Column order of the tuples yielded by iter_recent_transactions()
+TRANSACTION_COLUMNS = (
+    'id', 'tx_hash', 'log_index', 'from_address', 'to_address', 'value', 'value_usd',
+    'gas_price', 'block_number', 'timestamp', 'tx_type', 'is_large', 'alert_sent',
+    'token_address', 'token_symbol', 'created_at'
+)
+
+# Per-address activity rollups: interval -> (table, bucket seconds). Buckets
+# start at multiples of the interval (UTC). Each stored transaction adds
+# one incoming row for to_address and one outgoing row for from_address;
+# ETH volumes count native transfers only, USD volumes every priced row.
+ACTIVITY_ROLLUPS = {
+    'hour': ('wallet_activity_hourly', 3600),
+    'day': ('wallet_activity_daily', 86400)
+}
+ACTIVITY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        address BLOB NOT NULL,
+        bucket INTEGER NOT NULL,
+        in_count INTEGER NOT NULL DEFAULT 0,
+        out_count INTEGER NOT NULL DEFAULT 0,
+        eth_in REAL NOT NULL DEFAULT 0,
+        eth_out REAL NOT NULL DEFAULT 0,
+        usd_in REAL NOT NULL DEFAULT 0,
+        usd_out REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (address, bucket)
+    )
+'''
+ACTIVITY_COLUMNS = ('bucket', 'in_count', 'out_count', 'eth_in', 'eth_out', 'usd_in', 'usd_out')
+
+# Addresses are stored as their 20 bytes (BYTEA on Postgres), so lookups
+# and joins are exact whatever case the hex came in. Methods take 0x hex
+# of any case and return it lowercased.
+ADDRESS_COLUMNS = {
+    'transactions': ('from_address', 'to_address'),
+    'user_wallets': ('wallet_address',)
+}
+_FROM_ADDRESS = TRANSACTION_COLUMNS.index('from_address')
+_TO_ADDRESS = TRANSACTION_COLUMNS.index('to_address')
+
+
+def address_bytes(address):
+    """Stored form of a 0x-prefixed hex address (None stays None)"""
+    if address is None:
+        return None
+    value = bytes.fromhex(address[2:])
+    if len(value) != 20:
+        raise ValueError(f"Invalid address: {address}")
+    return value
+
+
+def address_hex(value):
+    """Lowercase 0x-prefixed hex of a stored address (None stays None)"""
+    return None if value is None else '0x' + bytes(value).hex()
+
+
+def _decode_addresses(row):
+    """Row as a dict, with its address columns as hex"""
+    row = dict(row)
+    for column in ('from_address', 'to_address', 'wallet_address'):
+        if column in row:
+            row[column] = address_hex(row[column])
+    return row
+
+
+def _decode_transaction(row):
+    """Tuple in TRANSACTION_COLUMNS order, with its addresses as hex"""
+    return (row[:_FROM_ADDRESS] + (address_hex(row[_FROM_ADDRESS]), address_hex(row[_TO_ADDRESS])) +
+            row[_TO_ADDRESS + 1:])
+
+
+@metrics.instrument_methods(DB_QUERY_LATENCY, DB_QUERY_ERRORS)
 class Database:
-    def __init__(self, db_name='whale_monitor.db'):
+    """SQLite storage, and the query layer shared by every backend.
+    
+    Queries are written in SQLite's dialect. Another backend subclasses
+    this and overrides the storage hooks: ``_connect()`` (a connection with
+    sqlite3's cursor/commit/close/row_factory API), ``IntegrityError`` and
+    ``_bulk_insert()``.
+    """
+    
+    # Swapped for a profiling subclass when request profiling is enabled
+    connection_factory = sqlite3.Connection
+    IntegrityError = sqlite3.IntegrityError
+    
+    def __init__(self, db_name='whale_monitor.db', init_schema=True):
         self.db_name = db_name
-        self.init_db()
+        if init_schema:
+            self.init_db()
+    
+    def _connect(self):
+        """Open a connection to the database file"""
+        return sqlite3.connect(self.db_name, factory=self.connection_factory)
     
     def init_db(self):
         """Initialize database tables"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Users table
@@ -31,7 +154,7 @@ class Database:
             CREATE TABLE IF NOT EXISTS user_wallets (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
-                wallet_address TEXT NOT NULL,
+                wallet_address BLOB NOT NULL,
                 wallet_name TEXT NOT NULL,
                 large_tx_threshold REAL DEFAULT 100.0,
                 email_alerts BOOLEAN DEFAULT 1,
@@ -42,23 +165,15 @@ class Database:
         ''')
         
         # Transactions table (updated)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tx_hash TEXT UNIQUE NOT NULL,
-                from_address TEXT NOT NULL,
-                to_address TEXT,
-                value TEXT NOT NULL,
-                value_usd REAL,
-                gas_price TEXT NOT NULL,
-                block_number INTEGER,
-                timestamp INTEGER,
-                tx_type TEXT,
-                is_large BOOLEAN,
-                alert_sent BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor.execute(TRANSACTIONS_TABLE.format(name='transactions'))
+        self._migrate_binary_addresses(cursor)
+        self._migrate_transactions_table(cursor)
+        
+        # Feed and alert joins look transactions up by address from the
+        # wallets (and wallets by address from the monitor)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_from ON transactions (from_address)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_to ON transactions (to_address)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_wallets_address ON user_wallets (wallet_address)')
         
         # Email alerts log
         cursor.execute('''
@@ -73,6 +188,49 @@ class Database:
             )
         ''')
         
+        # Richer alert rules: a USD threshold replaces the ETH one when set,
+        # direction is both/incoming/outgoing, tx_types is comma-separated
+        self._add_missing_columns(cursor, 'user_wallets', {
+            'usd_threshold': 'REAL',
+            'direction': "TEXT DEFAULT 'both'",
+            'tx_types': 'TEXT'
+        })
+        
+        # Webhook alert channel: payloads are signed with the wallet's secret
+        self._add_missing_columns(cursor, 'user_wallets', {
+            'webhook_url': 'TEXT',
+            'webhook_secret': 'TEXT'
+        })
+        
+        # Webhook deliveries that failed every retry
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_dead_letters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                wallet_id INTEGER,
+                transaction_id INTEGER,
+                url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Alert pipeline timestamps (unix seconds) for latency tracking
+        self._add_missing_columns(cursor, 'email_alerts', {
+            'block_timestamp': 'REAL',
+            'block_seen_at': 'REAL',
+            'tx_persisted_at': 'REAL',
+            'alert_enqueued_at': 'REAL',
+            'email_accepted_at': 'REAL'
+        })
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_alerts_enqueued
+            ON email_alerts (alert_enqueued_at)
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS gas_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -81,14 +239,234 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # Per-block fee distribution (gwei), see gas_stats.py
+        self._add_missing_columns(cursor, 'gas_history', {
+            'block_number': 'INTEGER',
+            'base_fee': 'REAL',
+            'gas_used_ratio': 'REAL',
+            'tx_count': 'INTEGER',
+            **{f'priority_fee_p{q}': 'REAL' for q in PRIORITY_PERCENTILES},
+            'min_gas_price': 'REAL',
+            'median_gas_price': 'REAL',
+            'max_gas_price': 'REAL'
+        })
+        
+        # Blocks the monitor has fully processed, by hash so reorged
+        # blocks at the same height are processed again
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS processed_blocks (
+                block_number INTEGER PRIMARY KEY,
+                block_hash TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )
+        ''')
+        
+        for table, _ in ACTIVITY_ROLLUPS.values():
+            cursor.execute(ACTIVITY_TABLE.format(name=table))
+        self._backfill_activity_rollups(cursor)
+        self._migrate_tx_hash_prefix(cursor)
+        
+        # Counters shared between the API and the monitor process
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
         
         conn.commit()
         conn.close()
     
+    def close(self):
+        """Release held connections (none for SQLite, which opens one per call)"""
+    
+    def _bump_tracked_wallets_version(self, cursor):
+        """Signal the monitor that tracked wallets or their alert rules changed"""
+        cursor.execute('''
+            INSERT INTO meta (key, value) VALUES ('tracked_wallets_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = meta.value + 1
+        ''')
+    
+    def _migrate_transactions_table(self, cursor):
+        """Rebuild pre-token transactions tables with the (tx_hash, log_index) key"""
+        cursor.execute('PRAGMA table_info(transactions)')
+        if 'log_index' in {row[1] for row in cursor.fetchall()}:
+            return
+        
+        columns = ('id, tx_hash, from_address, to_address, value, value_usd, gas_price, '
+                   'block_number, timestamp, tx_type, is_large, alert_sent, created_at')
+        cursor.execute(TRANSACTIONS_TABLE.format(name='transactions_new'))
+        cursor.execute(f'INSERT INTO transactions_new ({columns}) SELECT {columns} FROM transactions')
+        cursor.execute('DROP TABLE transactions')
+        cursor.execute('ALTER TABLE transactions_new RENAME TO transactions')
+    
+    def _migrate_tx_hash_prefix(self, cursor):
+        """Add the 0x prefix to tx hashes stored without one by older monitors"""
+        cursor.execute("SELECT 1 FROM transactions WHERE tx_hash NOT LIKE '0x%' LIMIT 1")
+        if not cursor.fetchone():
+            return
+        
+        # Transactions stored again with the prefix after an upgrade: keep the
+        # original row, moving anything that refers to the copy over to it
+        cursor.execute('''
+            SELECT copy.id, original.id FROM transactions original
+            JOIN transactions copy
+                ON copy.tx_hash = '0x' || original.tx_hash AND copy.log_index = original.log_index
+            WHERE original.tx_hash NOT LIKE '0x%'
+        ''')
+        duplicates = cursor.fetchall()
+        if duplicates:
+            for table in ('email_alerts', 'webhook_dead_letters'):
+                cursor.executemany(f'UPDATE {table} SET transaction_id = ? WHERE transaction_id = ?',
+                                   [(original, copy) for copy, original in duplicates])
+            cursor.executemany('DELETE FROM transactions WHERE id = ?', [(copy,) for copy, _ in duplicates])
+        cursor.execute("UPDATE transactions SET tx_hash = '0x' || tx_hash WHERE tx_hash NOT LIKE '0x%'")
+        if duplicates:
+            # The copies were counted in the rollups too
+            self._rebuild_activity_rollups(cursor)
+    
+    def _column_types(self, cursor, table):
+        """Declared type of each column of a table, upper-cased"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        return {row[1]: row[2].upper() for row in cursor.fetchall()}
+    
+    def _migrate_binary_addresses(self, cursor):
+        """Convert databases that stored addresses as hex TEXT to 20-byte BLOBs"""
+        for table, columns in ADDRESS_COLUMNS.items():
+            types = self._column_types(cursor, table)
+            text_columns = [column for column in columns if types.get(column) == 'TEXT']
+            if text_columns:
+                self._convert_address_columns(cursor, table, text_columns)
+        
+        # Rollups are derived data: drop them and let init_db rebuild them
+        # from the converted transactions
+        for table, _ in ACTIVITY_ROLLUPS.values():
+            if self._column_types(cursor, table).get('address') == 'TEXT':
+                cursor.execute(f'DROP TABLE {table}')
+    
+    def _convert_address_columns(self, cursor, table, columns, batch_size=5000):
+        """Change hex TEXT address columns of a table to BLOBs"""
+        # SQLite can't change a column's type: create a copy of the table
+        # from its own definition, move the rows over and swap it in
+        cursor.execute("SELECT type, sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL", (table,))
+        definitions = cursor.fetchall()
+        create = next(sql for kind, sql in definitions if kind == 'table')
+        for column in columns:
+            create = re.sub(rf'\b{column} TEXT\b', f'{column} BLOB', create)
+        cursor.execute(re.sub(rf'^CREATE TABLE "?{table}"?', f'CREATE TABLE {table}_new', create))
+        
+        cursor.execute(f'PRAGMA table_info({table})')
+        names = [row[1] for row in cursor.fetchall()]
+        positions = [names.index(column) for column in columns]
+        last_rowid = 0
+        while True:
+            cursor.execute(f'SELECT rowid, * FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                           (last_rowid, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            converted = []
+            for row in rows:
+                row = list(row[1:])
+                for position in positions:
+                    row[position] = address_bytes(row[position])
+                converted.append(row)
+            cursor.executemany(f"INSERT INTO {table}_new VALUES ({', '.join('?' * len(names))})", converted)
+        
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        for kind, sql in definitions:
+            if kind == 'index':
+                cursor.execute(sql)
+    
+    def _backfill_activity_rollups(self, cursor):
+        """Build the rollups from stored transactions when they are first created"""
+        cursor.execute(f"SELECT 1 FROM {ACTIVITY_ROLLUPS['day'][0]} LIMIT 1")
+        if cursor.fetchone():
+            return
+        cursor.execute('SELECT 1 FROM transactions LIMIT 1')
+        if cursor.fetchone():
+            self._rebuild_activity_rollups(cursor)
+    
+    def _rebuild_activity_rollups(self, cursor):
+        for table, seconds in ACTIVITY_ROLLUPS.values():
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'''
+                INSERT INTO {table} (address, {', '.join(ACTIVITY_COLUMNS)})
+                SELECT address, bucket, SUM(in_count), SUM(out_count),
+                       SUM(eth_in), SUM(eth_out), SUM(usd_in), SUM(usd_out)
+                FROM (
+                    SELECT to_address AS address, timestamp / {seconds} * {seconds} AS bucket,
+                           1 AS in_count, 0 AS out_count,
+                           CASE WHEN token_address IS NULL THEN CAST(value AS DOUBLE PRECISION) ELSE 0 END AS eth_in,
+                           0 AS eth_out, COALESCE(value_usd, 0) AS usd_in, 0 AS usd_out
+                    FROM transactions WHERE to_address IS NOT NULL
+                    UNION ALL
+                    SELECT from_address, timestamp / {seconds} * {seconds}, 0, 1, 0,
+                           CASE WHEN token_address IS NULL THEN CAST(value AS DOUBLE PRECISION) ELSE 0 END,
+                           0, COALESCE(value_usd, 0)
+                    FROM transactions
+                ) activity
+                GROUP BY address, bucket
+            ''')
+    
+    def rebuild_activity_rollups(self):
+        """Recompute every activity rollup from the transactions table"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._rebuild_activity_rollups(cursor)
+        conn.commit()
+        conn.close()
+    
+    def _update_activity_rollups(self, cursor, tx_data):
+        """Add a newly stored transaction to its addresses' rollups"""
+        eth = 0.0 if tx_data.get('token_address') else float(tx_data['value'])
+        usd = tx_data.get('value_usd') or 0.0
+        # (address, in_count, out_count, eth_in, eth_out, usd_in, usd_out)
+        rows = [(address_bytes(tx_data['from']), 0, 1, 0.0, eth, 0.0, usd)]
+        if tx_data['to']:
+            rows.append((address_bytes(tx_data['to']), 1, 0, eth, 0.0, usd, 0.0))
+        
+        for table, seconds in ACTIVITY_ROLLUPS.values():
+            bucket = tx_data['timestamp'] // seconds * seconds
+            cursor.executemany(f'''
+                INSERT INTO {table} (address, {', '.join(ACTIVITY_COLUMNS)})
+                VALUES (?, {bucket}, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(address, bucket) DO UPDATE SET
+                    in_count = {table}.in_count + excluded.in_count,
+                    out_count = {table}.out_count + excluded.out_count,
+                    eth_in = {table}.eth_in + excluded.eth_in,
+                    eth_out = {table}.eth_out + excluded.eth_out,
+                    usd_in = {table}.usd_in + excluded.usd_in,
+                    usd_out = {table}.usd_out + excluded.usd_out
+            ''', rows)
+    
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add columns that older databases were created without"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+    
+    def _streaming_cursor(self, conn):
+        """Cursor that reads rows from the server as they are fetched"""
+        # SQLite steps through the result lazily already
+        return conn.cursor()
+    
+    def _bulk_insert(self, cursor, table, columns, rows):
+        """Insert many rows, skipping ones that violate a unique constraint"""
+        placeholders = ', '.join('?' * len(columns))
+        cursor.executemany(f'''
+            INSERT OR IGNORE INTO {table} ({', '.join(columns)})
+            VALUES ({placeholders})
+        ''', rows)
+    
     # User management methods
     def create_user(self, email, password):
         """Create a new user"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         password_hash = hashlib.sha256(password.encode()).hexdigest()
@@ -103,13 +481,13 @@ class Database:
             user_id = cursor.lastrowid
             conn.close()
             return {'id': user_id, 'email': email, 'api_key': api_key}
-        except sqlite3.IntegrityError:
+        except self.IntegrityError:
             conn.close()
             return None
     
     def get_user_by_id(self, user_id):
         """Get user by ID"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -121,7 +499,7 @@ class Database:
     
     def verify_user(self, email, password):
         """Verify user credentials"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -139,7 +517,7 @@ class Database:
     
     def get_user_by_api_key(self, api_key):
         """Get user by API key"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -152,7 +530,7 @@ class Database:
     # Wallet management
     def add_user_wallet(self, user_id, wallet_address, wallet_name, threshold=100.0):
         """Add wallet to user's tracking list"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -160,18 +538,19 @@ class Database:
                 INSERT INTO user_wallets 
                 (user_id, wallet_address, wallet_name, large_tx_threshold)
                 VALUES (?, ?, ?, ?)
-            ''', (user_id, wallet_address.lower(), wallet_name, threshold))
-            conn.commit()
+            ''', (user_id, address_bytes(wallet_address), wallet_name, threshold))
             wallet_id = cursor.lastrowid
+            self._bump_tracked_wallets_version(cursor)
+            conn.commit()
             conn.close()
             return wallet_id
-        except sqlite3.IntegrityError:
+        except self.IntegrityError:
             conn.close()
             return None
     
     def get_user_wallets(self, user_id):
         """Get all wallets for a user"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -184,11 +563,68 @@ class Database:
         wallets = cursor.fetchall()
         conn.close()
         
-        return [dict(w) for w in wallets]
+        return [_decode_addresses(w) for w in wallets]
+    
+    def add_user_wallets(self, user_id, wallets):
+        """Add a chunk of wallets in one transaction.
+        
+        ``wallets`` is a list of (wallet_address, wallet_name, threshold)
+        tuples. Returns a parallel list of 'added' or 'duplicate'. The
+        tracked-wallets version is not bumped; call
+        bump_tracked_wallets_version() once the whole import is done.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        addresses = [address_bytes(w[0]) for w in wallets]
+        placeholders = ','.join('?' * len(addresses))
+        cursor.execute(f'''
+            SELECT wallet_address FROM user_wallets
+            WHERE user_id = ? AND wallet_address IN ({placeholders})
+        ''', (user_id, *addresses))
+        existing = {bytes(row[0]) for row in cursor.fetchall()}
+        
+        statuses = []
+        rows = []
+        for address, (_, wallet_name, threshold) in zip(addresses, wallets):
+            if address in existing:
+                statuses.append('duplicate')
+                continue
+            existing.add(address)
+            statuses.append('added')
+            rows.append((user_id, address, wallet_name, threshold))
+        
+        self._bulk_insert(cursor, 'user_wallets',
+                          ('user_id', 'wallet_address', 'wallet_name', 'large_tx_threshold'), rows)
+        
+        conn.commit()
+        conn.close()
+        return statuses
+    
+    def bump_tracked_wallets_version(self):
+        """Signal the monitor to reload its tracked wallet set"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        self._bump_tracked_wallets_version(cursor)
+        
+        conn.commit()
+        conn.close()
+    
+    def get_tracked_wallets_version(self):
+        """Get the counter bumped whenever the tracked wallet set changes"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT value FROM meta WHERE key = 'tracked_wallets_version'")
+        row = cursor.fetchone()
+        conn.close()
+        
+        return row[0] if row else 0
     
     def delete_user_wallet(self, user_id, wallet_id):
         """Remove wallet from tracking"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -197,13 +633,15 @@ class Database:
         ''', (wallet_id, user_id))
         
         deleted = cursor.rowcount > 0
+        if deleted:
+            self._bump_tracked_wallets_version(cursor)
         conn.commit()
         conn.close()
         return deleted
     
     def update_wallet_threshold(self, user_id, wallet_id, threshold):
         """Update alert threshold for wallet"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -213,13 +651,51 @@ class Database:
         ''', (threshold, wallet_id, user_id))
         
         updated = cursor.rowcount > 0
+        if updated:
+            self._bump_tracked_wallets_version(cursor)
+        conn.commit()
+        conn.close()
+        return updated
+    
+    def update_wallet_rules(self, user_id, wallet_id, usd_threshold=None, direction='both', tx_types=None):
+        """Update USD threshold, direction and transaction type filters for wallet"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE user_wallets
+            SET usd_threshold = ?, direction = ?, tx_types = ?
+            WHERE id = ? AND user_id = ?
+        ''', (usd_threshold, direction, ','.join(tx_types) if tx_types else None, wallet_id, user_id))
+        
+        updated = cursor.rowcount > 0
+        if updated:
+            self._bump_tracked_wallets_version(cursor)
+        conn.commit()
+        conn.close()
+        return updated
+    
+    def update_wallet_webhook(self, user_id, wallet_id, webhook_url, webhook_secret):
+        """Set or clear (None) the webhook URL and signing secret for wallet"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE user_wallets
+            SET webhook_url = ?, webhook_secret = ?
+            WHERE id = ? AND user_id = ?
+        ''', (webhook_url, webhook_secret, wallet_id, user_id))
+        
+        updated = cursor.rowcount > 0
+        if updated:
+            self._bump_tracked_wallets_version(cursor)
         conn.commit()
         conn.close()
         return updated
     
     def get_all_tracked_wallets(self):
         """Get all wallets being tracked by any user"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -227,11 +703,11 @@ class Database:
         wallets = cursor.fetchall()
         conn.close()
         
-        return [w['wallet_address'] for w in wallets]
+        return [address_hex(w['wallet_address']) for w in wallets]
     
     def get_users_tracking_wallet(self, wallet_address):
         """Get all users tracking a specific wallet"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -240,61 +716,149 @@ class Database:
             FROM users u
             JOIN user_wallets uw ON u.id = uw.user_id
             WHERE uw.wallet_address = ? AND uw.email_alerts = 1
-        ''', (wallet_address.lower(),))
+        ''', (address_bytes(wallet_address),))
         
         users = cursor.fetchall()
         conn.close()
         
         return [dict(u) for u in users]
     
+    def get_alert_rules(self):
+        """Get alert settings for every wallet with email or webhook alerts enabled"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT u.id AS user_id, u.email, uw.id AS wallet_id, uw.wallet_name,
+                   uw.wallet_address, uw.large_tx_threshold, uw.usd_threshold,
+                   uw.direction, uw.tx_types, uw.email_alerts,
+                   uw.webhook_url, uw.webhook_secret
+            FROM users u
+            JOIN user_wallets uw ON u.id = uw.user_id
+            WHERE uw.email_alerts = 1 OR uw.webhook_url IS NOT NULL
+        ''')
+        
+        rules = cursor.fetchall()
+        conn.close()
+        
+        return [_decode_addresses(r) for r in rules]
+    
     # Transaction methods (updated)
     def insert_transaction(self, tx_data):
         """Insert a new transaction"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
                 INSERT INTO transactions 
-                (tx_hash, from_address, to_address, value, value_usd, gas_price, 
-                 block_number, timestamp, tx_type, is_large)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                (tx_hash, log_index, from_address, to_address, value, value_usd, gas_price, 
+                 block_number, timestamp, tx_type, is_large, token_address, token_symbol)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 tx_data['hash'],
-                tx_data['from'],
-                tx_data['to'],
+                tx_data.get('log_index', -1),
+                address_bytes(tx_data['from']),
+                address_bytes(tx_data['to']),
                 tx_data['value'],
                 tx_data.get('value_usd'),
                 tx_data['gasPrice'],
                 tx_data['blockNumber'],
                 tx_data['timestamp'],
                 tx_data.get('type', 'Transfer'),
-                tx_data.get('isLarge', False)
+                tx_data.get('isLarge', False),
+                tx_data.get('token_address'),
+                tx_data.get('token_symbol')
             ))
-            conn.commit()
             tx_id = cursor.lastrowid
+            self._update_activity_rollups(cursor, tx_data)
+            conn.commit()
             conn.close()
             return tx_id
-        except sqlite3.IntegrityError:
+        except self.IntegrityError:
             conn.close()
             return None
     
-    def log_email_alert(self, user_id, transaction_id):
-        """Log that an email alert was sent"""
-        conn = sqlite3.connect(self.db_name)
+    def log_email_alert(self, user_id, transaction_id, email_sent=True, timings=None):
+        """Log an email alert along with its pipeline timestamps"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        timings = timings or {}
+        
+        cursor.execute('''
+            INSERT INTO email_alerts
+            (user_id, transaction_id, email_sent, sent_at, block_timestamp, block_seen_at,
+             tx_persisted_at, alert_enqueued_at, email_accepted_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            user_id,
+            transaction_id,
+            email_sent,
+            datetime.now() if email_sent else None,
+            timings.get('block_timestamp'),
+            timings.get('block_seen_at'),
+            timings.get('tx_persisted_at'),
+            timings.get('alert_enqueued_at'),
+            timings.get('email_accepted_at')
+        ))
+        
+        conn.commit()
+        conn.close()
+    
+    def log_webhook_dead_letter(self, user_id, wallet_id, transaction_id, url, payload, attempts, last_error):
+        """Keep a webhook payload that could not be delivered"""
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO email_alerts (user_id, transaction_id, email_sent, sent_at)
-            VALUES (?, ?, 1, ?)
-        ''', (user_id, transaction_id, datetime.now()))
+            INSERT INTO webhook_dead_letters
+            (user_id, wallet_id, transaction_id, url, payload, attempts, last_error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, wallet_id, transaction_id, url, payload, attempts, last_error))
         
         conn.commit()
         conn.close()
     
+    def get_webhook_dead_letters(self, user_id, limit=50):
+        """Get a user's most recent undelivered webhook payloads"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT * FROM webhook_dead_letters
+            WHERE user_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def get_alert_timings(self, since):
+        """Get pipeline timestamps for alerts enqueued since a unix time"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT email_sent, block_timestamp, block_seen_at, tx_persisted_at,
+                   alert_enqueued_at, email_accepted_at
+            FROM email_alerts
+            WHERE alert_enqueued_at >= ?
+        ''', (since,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
     def get_recent_transactions(self, limit=20, user_id=None):
         """Get recent transactions, optionally filtered by user's wallets"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -317,24 +881,182 @@ class Database:
         rows = cursor.fetchall()
         conn.close()
         
-        return [dict(row) for row in rows]
+        return [_decode_addresses(row) for row in rows]
     
-    def insert_gas_price(self, gas_price, timestamp):
-        """Insert gas price data"""
-        conn = sqlite3.connect(self.db_name)
+    def iter_recent_transactions(self, limit=20, user_id=None, batch_size=500):
+        """Yield recent transactions as lists of tuples in TRANSACTION_COLUMNS order.
+        
+        Rows are fetched batch_size at a time, so callers can encode and
+        send each batch before the next is read.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        columns = ', '.join(f't.{c}' for c in TRANSACTION_COLUMNS)
+        
+        try:
+            if user_id:
+                cursor.execute(f'''
+                    SELECT DISTINCT {columns} FROM transactions t
+                    JOIN user_wallets uw ON 
+                        (t.from_address = uw.wallet_address OR t.to_address = uw.wallet_address)
+                    WHERE uw.user_id = ?
+                    ORDER BY t.timestamp DESC 
+                    LIMIT ?
+                ''', (user_id, limit))
+            else:
+                cursor.execute(f'''
+                    SELECT {columns} FROM transactions t
+                    ORDER BY t.timestamp DESC 
+                    LIMIT ?
+                ''', (limit,))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [_decode_transaction(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def iter_user_transactions(self, user_id, since=None, until=None, batch_size=1000):
+        """Yield all of a user's transactions, oldest first, as batches of tuples.
+        
+        Tuples are in TRANSACTION_COLUMNS order; ``since``/``until`` bound
+        the unix timestamp (inclusive). Rows come off a streaming cursor,
+        so memory use does not grow with the size of the history.
+        """
+        conn = self._connect()
+        cursor = self._streaming_cursor(conn)
+        columns = ', '.join(f't.{c}' for c in TRANSACTION_COLUMNS)
+        
+        try:
+            cursor.execute(f'''
+                SELECT DISTINCT {columns} FROM transactions t
+                JOIN user_wallets uw ON 
+                    (t.from_address = uw.wallet_address OR t.to_address = uw.wallet_address)
+                WHERE uw.user_id = ? AND t.timestamp >= ? AND t.timestamp <= ?
+                ORDER BY t.timestamp, t.id
+            ''', (user_id, since if since is not None else 0, until if until is not None else 2 ** 62))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [_decode_transaction(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def iter_transaction_addresses(self, after_id=0, batch_size=5000):
+        """Yield (id, from_address, to_address) batches for transactions after after_id"""
+        conn = self._connect()
+        cursor = self._streaming_cursor(conn)
+        
+        try:
+            cursor.execute('''
+                SELECT id, from_address, to_address FROM transactions
+                WHERE id > ?
+                ORDER BY id
+            ''', (after_id,))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [(tx_id, address_hex(from_address), address_hex(to_address))
+                       for tx_id, from_address, to_address in rows]
+        finally:
+            conn.close()
+    
+    def get_latest_transaction_id(self):
+        """Get the id of the most recently stored transaction"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT MAX(id) FROM transactions')
+        latest_id = cursor.fetchone()[0]
+        conn.close()
+        
+        return latest_id or 0
+    
+    def get_transactions_since(self, last_id, limit=500):
+        """Get transactions stored after the given id, oldest first"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO gas_history (gas_price, timestamp)
-            VALUES (?, ?)
-        ''', (gas_price, timestamp))
+            SELECT * FROM transactions
+            WHERE id > ?
+            ORDER BY id ASC
+            LIMIT ?
+        ''', (last_id, limit))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [_decode_addresses(row) for row in rows]
+    
+    def get_wallet_activity(self, address, interval, since, until=None):
+        """Rollup rows for an address from since to until, oldest first"""
+        table, _ = ACTIVITY_ROLLUPS[interval]
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {', '.join(ACTIVITY_COLUMNS)} FROM {table}
+            WHERE address = ? AND bucket >= ? AND bucket <= ?
+            ORDER BY bucket
+        ''', (address_bytes(address), since, until if until is not None else 2**62))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(zip(ACTIVITY_COLUMNS, row)) for row in rows]
+    
+    def get_processed_block_hash(self, block_number):
+        """Hash of the block processed at this height, if any"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT block_hash FROM processed_blocks WHERE block_number = ?', (block_number,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return row[0] if row else None
+    
+    def mark_block_processed(self, block_number, block_hash):
+        """Record that every transaction of a block has been processed"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO processed_blocks (block_number, block_hash, processed_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(block_number) DO UPDATE
+            SET block_hash = excluded.block_hash, processed_at = excluded.processed_at
+        ''', (block_number, block_hash, time.time()))
+        
+        conn.commit()
+        conn.close()
+    
+    def insert_gas_price(self, gas_price, timestamp, stats=None):
+        """Insert gas price data, with the block's fee statistics if given"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        stats = stats or {}
+        columns = ('gas_price', 'timestamp') + GAS_STATS_COLUMNS
+        cursor.execute(f'''
+            INSERT INTO gas_history ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', (gas_price, timestamp) + tuple(stats.get(column) for column in GAS_STATS_COLUMNS))
         
         conn.commit()
         conn.close()
     
     def get_gas_history(self, limit=100):
         """Get gas price history"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -353,7 +1075,7 @@ class Database:
 
     def get_user_by_id(self, user_id):
         """Get user by ID"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -361,4 +1083,35 @@ class Database:
         user = cursor.fetchone()
         conn.close()
         
-        return dict(user) if user else None
\ No newline at end of file
+        return dict(user) if user else None
+
+
+def create_database(url=None, init_schema=None):
+    """Open the storage backend named by a DATABASE_URL.
+    
+    ``postgres://``/``postgresql://`` URLs use the pooled Postgres backend;
+    anything else is a SQLite file path, optionally prefixed ``sqlite:///``.
+    The schema is created unless ``init_schema`` (default
+    ``config.INIT_SCHEMA``) is false because it already ran at deploy time
+    or in the gunicorn master.
+    """
+    url = url or config.DATABASE_URL
+    if init_schema is None:
+        init_schema = config.INIT_SCHEMA
+    if url.startswith(('postgres://', 'postgresql://')):
+        from postgres_db import PostgresDatabase
+        return PostgresDatabase(url, init_schema=init_schema)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return Database(url, init_schema=init_schema)
+
+
+if __name__ == '__main__':
+    # Deploy step: python database.py [--rebuild-rollups]
+    import sys
+    database = create_database(init_schema=True)
+    if '--rebuild-rollups' in sys.argv:
+        database.rebuild_activity_rollups()
+        print("✅ Activity rollups rebuilt")
+    database.close()
+    print("✅ Database schema is up to date")
@@ -1,8 +1,11 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
+# smtplib, email.mime and requests are imported where used: API workers
+# rarely send mail, and loading them up front slows every worker's start
+import time
 import config
+import metrics
+
+SMTP_LATENCY = metrics.histogram('smtp_send_duration_seconds', 'Time to deliver a message over SMTP', ['kind'])
+EMAILS_SENT = metrics.counter('emails_sent_total', 'Emails handed to SMTP', ['kind', 'status'])
 
 class EmailService:
     def __init__(self):
@@ -12,10 +15,30 @@ class EmailService:
         self.smtp_password = config.SMTP_PASSWORD
         self.from_email = config.FROM_EMAIL
     
-    def send_alert_email(self, to_email, wallet_name, wallet_address, tx_hash, value_eth, value_usd, tx_type, direction):
-        """Send email alert for large transaction"""
+    def _send_message(self, msg, kind):
+        """Deliver a message over SMTP, recording latency and outcome"""
+        import smtplib
         
-        subject = f"🚨 Large Transaction Alert: {wallet_name}"
+        start = time.perf_counter()
+        try:
+            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                server.starttls()  # Upgrade to secure connection
+                server.login(self.smtp_user, self.smtp_password)
+                server.send_message(msg)
+        except Exception:
+            EMAILS_SENT.inc(kind=kind, status='failed')
+            raise
+        finally:
+            SMTP_LATENCY.observe(time.perf_counter() - start, kind=kind)
+        EMAILS_SENT.inc(kind=kind, status='sent')
+    
+    def send_alert_email(self, to_email, wallet_name, wallet_address, tx_hash, value_eth, value_usd, tx_type, direction, asset='ETH', pending=False):
+        """Send email alert for large transaction (pending: not yet mined)"""
+        
+        if pending:
+            subject = f"⏳ Pending Transaction Alert: {wallet_name}"
+        else:
+            subject = f"🚨 Large Transaction Alert: {wallet_name}"
         
         # Create beautiful HTML email
         html_body = f"""
@@ -138,7 +161,7 @@ class EmailService:
                 </div>
                 <div class="content">
                     <div class="alert-box">
-                        <h2>Large Transaction Detected!</h2>
+                        <h2>{"Pending Transaction Detected!" if pending else "Large Transaction Detected!"}</h2>
                         <p style="color: #4b5563; margin-bottom: 20px;">
                             A significant transaction has been detected on your monitored wallet.
                         </p>
@@ -171,7 +194,7 @@ class EmailService:
                     </div>
                     
                     <div class="amount">
-                        {value_eth} ETH
+                        {value_eth} {asset}
                     </div>
                     {f'<div class="usd-amount">≈ ${value_usd:,.2f} USD</div>' if value_usd else ''}
                     
@@ -203,13 +226,13 @@ class EmailService:
         text_body = f"""
 WHALE TRANSACTION ALERT
 
-A large transaction has been detected on your monitored wallet:
+A large {"pending (not yet mined) " if pending else ""}transaction has been detected on your monitored wallet:
 
 Wallet Name: {wallet_name}
 Wallet Address: {wallet_address}
 Transaction Type: {tx_type}
 Direction: {"Outgoing ➡️" if direction == "outgoing" else "Incoming ⬅️"}
-Amount: {value_eth} ETH {f"(≈ ${value_usd:,.2f} USD)" if value_usd else ""}
+Amount: {value_eth} {asset} {f"(≈ ${value_usd:,.2f} USD)" if value_usd else ""}
 
 View transaction: https://etherscan.io/tx/{tx_hash}
 
@@ -219,6 +242,9 @@ Real-time Ethereum Transaction Tracking
         """
         
         try:
+            from email.mime.multipart import MIMEMultipart
+            from email.mime.text import MIMEText
+            
             # Create message
             msg = MIMEMultipart('alternative')
             msg['Subject'] = subject
@@ -232,10 +258,7 @@ Real-time Ethereum Transaction Tracking
             msg.attach(part2)
             
             # Send email via Gmail SMTP
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Upgrade to secure connection
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._send_message(msg, 'alert')
             
             print(f"✅ Alert email sent to {to_email}")
             return True
@@ -415,6 +438,9 @@ Real-time Ethereum Transaction Tracking
         """
         
         try:
+            from email.mime.multipart import MIMEMultipart
+            from email.mime.text import MIMEText
+            
             msg = MIMEMultipart('alternative')
             msg['Subject'] = subject
             msg['From'] = self.from_email
@@ -425,10 +451,7 @@ Real-time Ethereum Transaction Tracking
             msg.attach(part1)
             msg.attach(part2)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._send_message(msg, 'welcome')
             
             print(f"✅ Welcome email sent to {to_email}")
             return True
@@ -441,6 +464,8 @@ Real-time Ethereum Transaction Tracking
 # Helper function to get ETH price in USD
 def get_eth_price_usd():
     """Get current ETH price from CoinGecko API (free, no API key needed)"""
+    import requests
+    
     try:
         response = requests.get(
             'https://api.coingecko.com/api/v3/simple/price?ids=ethereum&vs_currencies=usd',
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+import config
+import serialization
+
+
+def format_sse(data, event=None, event_id=None):
+    """Format a payload as a Server-Sent Events message"""
+    message = ''
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event:
+        message += f"event: {event}\n"
+    # Postgres rows carry datetimes, which the stdlib encoder rejects
+    message += f"data: {serialization.dumps(data).decode()}\n\n"
+    return message
+
+
+class TransactionHub:
+    """Fan out newly stored transactions to every connected stream.
+    
+    A single feeder thread polls the database for rows newer than the last
+    one it has seen and appends them to a shared, bounded backlog. Streams
+    don't hold their own queues: each one keeps a cursor into the backlog
+    and waits on one shared condition, so an idle client costs a parked
+    waiter and nothing else. Under gunicorn's gevent worker the condition
+    is cooperative, so thousands of idle streams share a single OS thread.
+    """
+    
+    def __init__(self, db, poll_interval=2.0, backlog=1000, heartbeat=15.0):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._events = deque(maxlen=backlog)  # (seq, tx)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._feeder = None
+        self._last_id = None
+    
+    def start(self):
+        """Start the feeder thread if it isn't running yet"""
+        with self._cond:
+            if self._feeder and self._feeder.is_alive():
+                return
+            self._last_id = self.db.get_latest_transaction_id()
+            self._feeder = threading.Thread(target=self._feed, name='transaction-hub', daemon=True)
+            self._feeder.start()
+    
+    def _feed(self):
+        """Poll for new transactions and publish them"""
+        while True:
+            try:
+                transactions = self.db.get_transactions_since(self._last_id)
+                if transactions:
+                    self._last_id = transactions[-1]['id']
+                    self.publish(transactions)
+            except Exception as e:
+                print(f"❌ Transaction hub poll failed: {e}")
+            time.sleep(self.poll_interval)
+    
+    def publish(self, transactions):
+        """Append transactions to the backlog and wake every stream"""
+        with self._cond:
+            for tx in transactions:
+                tx['from_label'] = config.get_whale_label(tx['from_address'])
+                tx['to_label'] = config.get_whale_label(tx['to_address']) if tx['to_address'] else None
+                self._seq += 1
+                self._events.append((self._seq, tx))
+            self._cond.notify_all()
+    
+    def _events_after(self, cursor):
+        """Get backlog entries newer than a cursor, oldest first"""
+        return [(seq, tx) for seq, tx in self._events if seq > cursor]
+    
+    def _cursor_for_last_event(self, last_event_id):
+        """Translate a client's Last-Event-ID (a transaction id) into a cursor"""
+        for seq, tx in self._events:
+            if tx['id'] > last_event_id:
+                return seq - 1
+        return self._seq
+    
+    def subscribe(self, addresses=None, wallet_map=None, last_event_id=None):
+        """Yield SSE messages for new transactions.
+        
+        When ``addresses`` is given only transactions touching one of them
+        are sent, and ``wallet_map`` names take priority over whale labels.
+        """
+        self.start()
+        wallet_map = wallet_map or {}
+        
+        with self._cond:
+            if last_event_id is not None:
+                cursor = self._cursor_for_last_event(last_event_id)
+            else:
+                cursor = self._seq
+        
+        yield 'retry: 5000\n\n'
+        
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > cursor, timeout=self.heartbeat)
+                events = self._events_after(cursor)
+                cursor = self._seq
+            
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            
+            for _, tx in events:
+                from_addr = tx['from_address'].lower()
+                to_addr = tx['to_address'].lower() if tx['to_address'] else None
+                
+                if addresses is not None and from_addr not in addresses and to_addr not in addresses:
+                    continue
+                
+                if wallet_map:
+                    tx = dict(tx)
+                    tx['from_label'] = wallet_map.get(from_addr) or tx['from_label']
+                    tx['to_label'] = (wallet_map.get(to_addr) or tx['to_label']) if to_addr else None
+                
+                yield format_sse(tx, event='transaction', event_id=tx['id'])
@@ -0,0 +1,16 @@
+"""Gunicorn settings (loaded automatically from the working directory).
+
+The schema is created and migrated once in the master before workers fork,
+so workers run no DDL: their ``create_database()`` skips ``init_db`` and the
+table-rebuilding migrations can't race each other on an upgrade.
+"""
+
+
+def on_starting(server):
+    import config
+    from database import create_database
+
+    create_database(init_schema=True).close()
+    # Workers are forked from this process and inherit the config module
+    config.INIT_SCHEMA = False
+    server.log.info("Database schema initialized in master")
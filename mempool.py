@@ -0,0 +1,116 @@
+"""Pending-transaction (mempool) monitoring.
+
+``MempoolWatcher`` polls a pending-transaction filter next to the block
+loop. Pending transactions stay raw JSON-RPC dicts: their ``from``/``to``
+strings are checked against the monitor's tracked set, and only the hits
+are converted and evaluated against the alert rules. Alerts for hits are
+sent as provisional (``pending`` in the tx data). The monitor remembers
+each (transaction, user, wallet, direction) it alerted on, and when the
+transaction is mined it is logged against the stored record instead of
+being alerted on again.
+
+Nodes that support it (geth, Erigon) return full transactions from
+``eth_newPendingTransactionFilter(true)``. Otherwise the filter returns
+hashes and each one is fetched, which is much slower.
+"""
+import threading
+import time
+import config
+import metrics
+
+PENDING_SEEN = metrics.counter('pending_transactions_total', 'Pending transactions received from the filter')
+PENDING_MATCHED = metrics.counter('pending_whale_transactions_total', 'Pending transactions touching a tracked wallet')
+PENDING_POLL_LATENCY = metrics.histogram('pending_poll_seconds', 'Time to fetch and match one batch of pending transactions')
+
+
+class MempoolWatcher:
+    """Poll pending transactions and send provisional alerts through a monitor"""
+    
+    def __init__(self, monitor, poll_interval=None, full_transactions=None):
+        self.monitor = monitor
+        self.provider = monitor.w3.provider
+        self.poll_interval = poll_interval or config.MEMPOOL_POLL_INTERVAL
+        self.full_transactions = (config.MEMPOOL_FULL_TRANSACTIONS if full_transactions is None
+                                  else full_transactions)
+        self.filter_id = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _request(self, method, params):
+        response = self.provider.make_request(method, params)
+        if 'error' in response:
+            raise RuntimeError(f"{method} failed: {response['error']}")
+        return response['result']
+    
+    def poll(self):
+        """Fetch pending transactions since the last poll and alert on tracked ones"""
+        start = time.perf_counter()
+        try:
+            if self.filter_id is None:
+                self.filter_id = self._request('eth_newPendingTransactionFilter',
+                                               [True] if self.full_transactions else [])
+            try:
+                entries = self._request('eth_getFilterChanges', [self.filter_id])
+            except RuntimeError:
+                # Filters expire when not polled for a while; create a new one next time
+                self.filter_id = None
+                raise
+            return self.process_pending(entries)
+        finally:
+            PENDING_POLL_LATENCY.observe(time.perf_counter() - start)
+    
+    def process_pending(self, entries):
+        """Match pending transactions (dicts or hashes) and send provisional alerts"""
+        monitor = self.monitor
+        if monitor.tracked_wallets_version is None:
+            monitor.refresh_tracked_wallets()
+        tracked = monitor.tracked_wallets
+        seen_at = time.time()
+        
+        hits = []
+        for tx in entries:
+            if isinstance(tx, str):
+                tx = self._request('eth_getTransactionByHash', [tx])
+                # Dropped, or mined since it was announced: the block loop alerts on it
+                if tx is None or tx.get('blockNumber') is not None:
+                    continue
+            recipient = tx.get('to')
+            if tx['from'].lower() in tracked or (recipient and recipient.lower() in tracked):
+                hits.append(self.to_tx_data(tx, seen_at))
+        
+        PENDING_SEEN.inc(len(entries))
+        if hits:
+            PENDING_MATCHED.inc(len(hits))
+            monitor.send_pending_alerts(hits)
+        return hits
+    
+    def to_tx_data(self, tx, seen_at):
+        """Convert a raw pending transaction into the monitor's tx_data layout"""
+        gas_price = tx.get('gasPrice') or tx.get('maxFeePerGas') or '0x0'
+        tx_data = self.monitor.to_tx_data(dict(tx, gasPrice=gas_price))
+        tx_data.update({
+            'timestamp': int(seen_at),
+            'pending': True,
+            'pending_seen_at': seen_at
+        })
+        return tx_data
+    
+    def run(self):
+        """Poll until stopped"""
+        print("⏳ Watching pending transactions...")
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"❌ Error polling pending transactions: {e}")
+            self._stop.wait(self.poll_interval)
+    
+    def start(self):
+        """Poll in a background thread"""
+        self._thread = threading.Thread(target=self.run, name='mempool', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
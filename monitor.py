@@ -1,16 +1,92 @@
 from web3 import Web3
 from datetime import datetime
+import signal
+import sys
+import threading
 import time
-from database import Database
+from database import create_database
 from email_service import EmailService, get_eth_price_usd
+from webhook_service import WebhookService
+from rpc import InstrumentedProvider, MultiProvider, build_provider
+from rpc_cache import CachingProvider
+from rpc_replay import RecordingProvider, ReplayProvider
+from alert_rules import RuleIndex
+from block_matcher import BlockMatcher
+from gas_stats import block_fee_stats
+from cache import LRUCache
+from tokens import TokenTransferTracker, format_units
+from mempool import MempoolWatcher
+from snapshot import SnapshotWriter
+import alert_latency
+import metrics
+import config
+
+BLOCK_LATENCY = metrics.histogram('block_processing_seconds', 'Time to scan one block')
+BLOCKS_PROCESSED = metrics.counter('blocks_processed_total', 'Blocks scanned', ['status'])
+TRANSACTIONS_SEEN = metrics.counter('transactions_seen_total', 'Transactions scanned in blocks')
+WHALE_TRANSACTIONS = metrics.counter('whale_transactions_total', 'Transactions touching a tracked wallet')
+ALERTS_SENT = metrics.counter('alerts_total', 'Transaction alerts attempted', ['status'])
+CHAIN_HEAD = metrics.gauge('chain_head_block', 'Latest block number reported by the node')
+LAST_BLOCK = metrics.gauge('last_processed_block', 'Last block the monitor finished scanning')
+CHAIN_LAG = metrics.gauge('chain_lag_blocks', 'Blocks between the chain head and last_block')
+ETH_PRICE = metrics.gauge('eth_price_usd', 'Last fetched ETH price in USD')
+TRACKED_WALLETS = metrics.gauge('tracked_wallets', 'Distinct wallet addresses being tracked')
+DUPLICATES_SKIPPED = metrics.counter(
+    'duplicates_skipped_total', 'Blocks and transactions skipped as already processed', ['kind'])
+PROVISIONAL_ALERTS = metrics.counter(
+    'provisional_alerts_total', 'Alerts sent for pending transactions, and those reconciled once mined', ['status'])
+TOKEN_TRANSFERS = metrics.counter('token_transfers_total', 'Tracked ERC-20 transfers found via eth_getLogs')
+TOKEN_BLOOM_HITS = metrics.counter('token_bloom_hits_total', 'Blocks whose logsBloom may hold a tracked token transfer')
+ALERT_STAGE_LATENCY = metrics.histogram(
+    'alert_stage_seconds', 'Time spent in each alert pipeline stage', ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300))
+
+
+def hash_key(tx_hash):
+    """Transaction hash as bytes, whether given as bytes or hex with or without 0x"""
+    if isinstance(tx_hash, str):
+        return bytes.fromhex(tx_hash[2:] if tx_hash.startswith('0x') else tx_hash)
+    return bytes(tx_hash)
 
 class WhaleMonitor:
-    def __init__(self, rpc_url):
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
-        self.db = Database()
-        self.email_service = EmailService()
+    def __init__(self, rpc_url, provider=None, db=None, email_service=None, eth_price_usd=None,
+                 webhook_service=None):
+        # rpc_url may be a list of URLs to spread requests over (see rpc.MultiProvider)
+        provider = provider or build_provider(rpc_url)
+        if config.RPC_CACHE_PATH:
+            provider = CachingProvider(provider, config.RPC_CACHE_PATH)
+        self.recorder = None
+        if config.RPC_RECORD_PATH:
+            provider = self.recorder = RecordingProvider(provider, config.RPC_RECORD_PATH)
+        self.w3 = Web3(InstrumentedProvider(provider))
+        self.db = db or create_database()
+        self.email_service = email_service or EmailService()
+        self.webhook_service = webhook_service or WebhookService(db=self.db)
         self.last_block = None
-        self.eth_price_usd = None
+        self.poll_interval = config.MONITOR_POLL_INTERVAL
+        self.eth_price_usd = eth_price_usd
+        self.tracked_wallets = set()
+        self.tracked_wallets_version = None
+        self.block_matcher = BlockMatcher()
+        self.alert_rules = RuleIndex()
+        self.feed_snapshot = SnapshotWriter(config.SNAPSHOT_PATH) if config.SNAPSHOT_PATH else None
+        self.token_tracker = TokenTransferTracker(self.w3) if config.TRACK_TOKEN_TRANSFERS else None
+        # block number -> (timestamp, seen_at) for blocks whose bloom matched
+        self.token_candidates = {}
+        # Recently processed tx hashes and block number -> hash, so rescans
+        # skip work already done (blocks are also marked in the database)
+        self.seen_transactions = LRUCache(maxsize=config.DEDUP_TX_CACHE_SIZE)
+        self.processed_blocks = LRUCache(maxsize=config.DEDUP_BLOCK_CACHE_SIZE)
+        # tx hash -> {(user_id, wallet_id, direction): (email_sent, timings) or None}
+        # for alerts already sent while the transaction was pending (None while
+        # the email is still being sent). The mempool thread and the block loop
+        # both use it, so it and mined_while_sending are guarded by the lock.
+        self.provisional_alerts = LRUCache(maxsize=config.MEMPOOL_ALERT_CACHE_SIZE,
+                                           ttl=config.MEMPOOL_ALERT_TTL)
+        # (tx hash, alert key) -> stored transaction id, for provisional alerts
+        # whose transaction was mined before their email finished sending
+        self.mined_while_sending = {}
+        self.provisional_lock = threading.Lock()
         
         if not self.w3.is_connected():
             raise Exception("Failed to connect to Ethereum node")
@@ -18,15 +94,29 @@ class WhaleMonitor:
         print(f"✅ Connected to Ethereum")
         
         # Fetch initial ETH price
-        self.update_eth_price()
+        if self.eth_price_usd is None:
+            self.update_eth_price()
     
     def update_eth_price(self):
         """Update ETH price in USD"""
         price = get_eth_price_usd()
         if price:
             self.eth_price_usd = price
+            ETH_PRICE.set(price)
             print(f"💰 ETH Price: ${price:,.2f}")
     
+    def refresh_tracked_wallets(self):
+        """Reload tracked wallets and alert rules if they changed since the last check"""
+        version = self.db.get_tracked_wallets_version()
+        if version != self.tracked_wallets_version:
+            self.tracked_wallets = set(self.db.get_all_tracked_wallets())
+            self.block_matcher.set_watchlist(self.tracked_wallets)
+            self.alert_rules = RuleIndex.from_rows(self.db.get_alert_rules())
+            self.tracked_wallets_version = version
+            TRACKED_WALLETS.set(len(self.tracked_wallets))
+            if self.token_tracker:
+                self.token_tracker.set_tracked(self.tracked_wallets)
+    
     def wei_to_eth(self, wei_value):
         """Convert Wei to ETH"""
         return self.w3.from_wei(wei_value, 'ether')
@@ -40,102 +130,214 @@ class WhaleMonitor:
         else:
             return "Transfer"
     
-    def check_and_send_alerts(self, tx_data, from_addr, to_addr):
+    def check_and_send_alerts(self, tx_data, from_addr=None, to_addr=None):
         """Check if any users need to be alerted about this transaction"""
+        self.send_block_alerts([tx_data])
+    
+    def send_block_alerts(self, whale_txs):
+        """Evaluate alert rules for a block's transactions in one pass and send alerts"""
+        alerts = self.reconcile_provisional_alerts(self.alert_rules.evaluate(whale_txs))
+        self.dispatch_alerts(alerts)
+    
+    def send_pending_alerts(self, pending_txs):
+        """Send provisional alerts for pending transactions, once per rule and direction"""
+        alerts = []
+        with self.provisional_lock:
+            for rule, tx_data, direction in self.alert_rules.evaluate(pending_txs):
+                key = hash_key(tx_data['hash'])
+                sent = self.provisional_alerts.get(key)
+                if sent is None:
+                    sent = {}
+                    self.provisional_alerts.set(key, sent)
+                alert_key = (rule.user_id, rule.wallet_id, direction)
+                if alert_key not in sent:
+                    sent[alert_key] = None
+                    alerts.append((rule, tx_data, direction))
+        
+        PROVISIONAL_ALERTS.inc(len(alerts), status='sent')
+        self.dispatch_alerts(alerts)
+    
+    def reconcile_provisional_alerts(self, alerts):
+        """Drop alerts already sent while pending, logging them against the mined record"""
+        if not len(self.provisional_alerts):
+            return alerts
+        
+        remaining = []
+        for rule, tx_data, direction in alerts:
+            # Provisional alerts are for ETH value only, never token transfers
+            if tx_data.get('token_address'):
+                remaining.append((rule, tx_data, direction))
+                continue
+            key = hash_key(tx_data['hash'])
+            alert_key = (rule.user_id, rule.wallet_id, direction)
+            with self.provisional_lock:
+                sent = self.provisional_alerts.get(key)
+                if not sent or alert_key not in sent:
+                    remaining.append((rule, tx_data, direction))
+                    continue
+                email = sent.pop(alert_key)
+                if email is None:
+                    # Still being sent; finish_provisional_alert logs it against this record
+                    self.mined_while_sending[(key, alert_key)] = tx_data.get('id')
+            
+            PROVISIONAL_ALERTS.inc(status='reconciled')
+            if email is not None:
+                email_sent, timings = email
+                self.record_alert(rule.user_id, tx_data.get('id'), email_sent, timings)
+        return remaining
+    
+    def finish_provisional_alert(self, rule, tx_data, direction, result):
+        """Keep a sent provisional alert for reconciliation, or log it if it was mined meanwhile"""
+        key = hash_key(tx_data['hash'])
+        alert_key = (rule.user_id, rule.wallet_id, direction)
+        with self.provisional_lock:
+            if (key, alert_key) not in self.mined_while_sending:
+                sent = self.provisional_alerts.get(key)
+                if sent is not None and alert_key in sent:
+                    sent[alert_key] = result
+                return
+            transaction_id = self.mined_while_sending.pop((key, alert_key))
+        email_sent, timings = result
+        self.record_alert(rule.user_id, transaction_id, email_sent, timings)
+    
+    def dispatch_alerts(self, alerts):
+        """Deliver (rule, tx_data, direction) alerts over each rule's channels"""
+        # Webhooks are queued first and delivered concurrently; email is sent inline
+        for rule, tx_data, direction in alerts:
+            if rule.webhook_url:
+                self.webhook_service.deliver(rule, tx_data, direction)
         
-        # Check users tracking the from address
-        users_from = self.db.get_users_tracking_wallet(from_addr)
-        for user in users_from:
-            if float(tx_data['value']) >= user['large_tx_threshold']:
-                # Send alert
-                self.send_transaction_alert(
-                    user_email=user['email'],
-                    wallet_name=user['wallet_name'],
-                    wallet_address=from_addr,
-                    tx_data=tx_data,
-                    direction='outgoing'
-                )
+        for rule, tx_data, direction in alerts:
+            if not rule.email_alerts:
+                continue
+            result = self.send_transaction_alert(
+                user_id=rule.user_id,
+                user_email=rule.email,
+                wallet_name=rule.wallet_name,
+                wallet_address=rule.address,
+                tx_data=tx_data,
+                direction=direction
+            )
+            if tx_data.get('pending'):
+                self.finish_provisional_alert(rule, tx_data, direction, result)
+    
+    def send_transaction_alert(self, user_id, user_email, wallet_name, wallet_address, tx_data, direction):
+        """Send email alert to user; returns (sent, timings)
         
-        # Check users tracking the to address
-        if to_addr:
-            users_to = self.db.get_users_tracking_wallet(to_addr)
-            for user in users_to:
-                if float(tx_data['value']) >= user['large_tx_threshold']:
-                    # Send alert
-                    self.send_transaction_alert(
-                        user_email=user['email'],
-                        wallet_name=user['wallet_name'],
-                        wallet_address=to_addr,
-                        tx_data=tx_data,
-                        direction='incoming'
-                    )
-    
-    def send_transaction_alert(self, user_email, wallet_name, wallet_address, tx_data, direction):
-        """Send email alert to user"""
+        Alerts for pending transactions are logged once the transaction is
+        mined and stored (see reconcile_provisional_alerts).
+        """
+        timings = {
+            'block_timestamp': tx_data.get('block_timestamp'),
+            'block_seen_at': tx_data.get('block_seen_at'),
+            'tx_persisted_at': tx_data.get('persisted_at'),
+            'alert_enqueued_at': time.time()
+        }
+        sent = False
         try:
-            value_eth = float(tx_data['value'])
-            value_usd = value_eth * self.eth_price_usd if self.eth_price_usd else None
+            amount = float(tx_data['value'])
+            if tx_data.get('token_symbol'):
+                value_usd = tx_data.get('value_usd')
+            else:
+                value_usd = amount * self.eth_price_usd if self.eth_price_usd else None
             
-            self.email_service.send_alert_email(
+            sent = self.email_service.send_alert_email(
                 to_email=user_email,
                 wallet_name=wallet_name,
                 wallet_address=wallet_address,
                 tx_hash=tx_data['hash'],
-                value_eth=f"{value_eth:.4f}",
+                value_eth=f"{amount:.4f}",
                 value_usd=value_usd,
                 tx_type=tx_data['type'],
-                direction=direction
+                direction=direction,
+                asset=tx_data.get('token_symbol') or 'ETH',
+                pending=tx_data.get('pending', False)
             )
             
-            print(f"📧 Alert sent to {user_email} for {wallet_name}")
+            if sent:
+                timings['email_accepted_at'] = time.time()
+                print(f"📧 Alert sent to {user_email} for {wallet_name}")
+            ALERTS_SENT.inc(status='sent' if sent else 'failed')
             
         except Exception as e:
             print(f"❌ Failed to send alert: {e}")
+            ALERTS_SENT.inc(status='failed')
+        
+        if not tx_data.get('pending'):
+            self.record_alert(user_id, tx_data.get('id'), sent, timings)
+        return sent, timings
     
-    def process_transaction(self, tx_hash):
-        """Process a single transaction"""
+    def record_alert(self, user_id, transaction_id, sent, timings):
+        """Log an alert and its per-stage latencies"""
+        for stage, seconds in alert_latency.stage_durations(timings):
+            ALERT_STAGE_LATENCY.observe(seconds, stage=stage)
+        
         try:
-            tx = self.w3.eth.get_transaction(tx_hash)
+            self.db.log_email_alert(user_id, transaction_id, email_sent=sent, timings=timings)
+        except Exception as e:
+            print(f"❌ Failed to log alert: {e}")
+    
+    def rpc(self, method, params):
+        """Raw JSON-RPC result, without web3's per-field formatting"""
+        response = self.w3.provider.make_request(method, params)
+        if 'error' in response:
+            raise RuntimeError(f"{method} failed: {response['error']}")
+        return response['result']
+    
+    def to_tx_data(self, tx, block_timestamp=None, block_seen_at=None):
+        """Convert a raw JSON-RPC transaction into the stored and alerted layout"""
+        value = int(tx['value'], 16)
+        return {
+            'hash': tx['hash'],
+            'from': Web3.to_checksum_address(tx['from']),
+            'to': Web3.to_checksum_address(tx['to']) if tx['to'] else None,
+            'value': format_units(value, 18),
+            'value_usd': value / 10**18 * self.eth_price_usd if self.eth_price_usd else None,
+            'gasPrice': format_units(int(tx['gasPrice'], 16), 9),
+            'blockNumber': int(tx['blockNumber'], 16) if tx.get('blockNumber') else None,
+            'timestamp': int(time.time()),
+            'type': self.get_transaction_type(tx),
+            'isLarge': False,  # Will be determined per user
+            'block_timestamp': block_timestamp,
+            'block_seen_at': block_seen_at
+        }
+    
+    def store_transaction(self, tx_data, send_alerts=True):
+        """Store a tracked transaction, alerting on it unless send_alerts is False"""
+        tx_id = self.db.insert_transaction(tx_data)
+        if tx_id:
+            tx_data['id'] = tx_id
+            tx_data['persisted_at'] = time.time()
+            print(f"🐋 New transaction: {tx_data['value']} ETH")
             
-            from_addr = tx['from'].lower() if tx['from'] else None
-            to_addr = tx['to'].lower() if tx['to'] else None
+            # Check and send alerts to relevant users
+            if send_alerts:
+                self.check_and_send_alerts(tx_data, tx_data['from'], tx_data['to'])
+        self.seen_transactions.set(hash_key(tx_data['hash']), True)
+        return tx_data
+    
+    def process_transaction(self, tx_hash, block_timestamp=None, block_seen_at=None, send_alerts=True):
+        """Process a single transaction"""
+        seen_key = hash_key(tx_hash)
+        if self.seen_transactions.get(seen_key):
+            DUPLICATES_SKIPPED.inc(kind='transaction')
+            return None
+        
+        try:
+            tx = self.rpc('eth_getTransactionByHash', ['0x' + seen_key.hex()])
             
-            # Get all tracked wallets
-            tracked_wallets = self.db.get_all_tracked_wallets()
+            # Get all tracked wallets (refreshed once per block by monitor_block)
+            if self.tracked_wallets_version is None:
+                self.refresh_tracked_wallets()
+            tracked_wallets = self.tracked_wallets
             
             # Check if transaction involves any tracked wallet
-            if from_addr not in tracked_wallets and to_addr not in tracked_wallets:
+            to_addr = tx['to'].lower() if tx['to'] else None
+            if tx['from'].lower() not in tracked_wallets and to_addr not in tracked_wallets:
+                self.seen_transactions.set(seen_key, True)
                 return None
             
-            value_eth = self.wei_to_eth(tx['value'])
-            gas_price_gwei = self.w3.from_wei(tx['gasPrice'], 'gwei')
-            
-            # Calculate USD value
-            value_usd = float(value_eth) * self.eth_price_usd if self.eth_price_usd else None
-            
-            tx_data = {
-                'hash': tx_hash.hex(),
-                'from': tx['from'],
-                'to': tx['to'],
-                'value': str(value_eth),
-                'value_usd': value_usd,
-                'gasPrice': str(gas_price_gwei),
-                'blockNumber': tx['blockNumber'],
-                'timestamp': int(time.time()),
-                'type': self.get_transaction_type(tx),
-                'isLarge': False  # Will be determined per user
-            }
-            
-            # Store in database
-            tx_id = self.db.insert_transaction(tx_data)
-            
-            if tx_id:
-                print(f"🐋 New transaction: {value_eth} ETH")
-                
-                # Check and send alerts to relevant users
-                self.check_and_send_alerts(tx_data, from_addr, to_addr)
-            
-            return tx_data
+            return self.store_transaction(self.to_tx_data(tx, block_timestamp, block_seen_at), send_alerts)
             
         except Exception as e:
             print(f"❌ Error processing transaction: {e}")
@@ -143,71 +345,221 @@ class WhaleMonitor:
     
     def monitor_block(self, block_number):
         """Monitor a single block for whale transactions"""
+        start = time.perf_counter()
         try:
-            block = self.w3.eth.get_block(block_number, full_transactions=True)
+            # Raw JSON-RPC: only the tracked transactions are ever converted
+            block = self.rpc('eth_getBlockByNumber', [hex(block_number), True])
+            if block is None:
+                raise RuntimeError("block not found")
+            block_hash = block['hash']
+            if self.is_block_processed(block_number, block_hash):
+                DUPLICATES_SKIPPED.inc(kind='block')
+                BLOCKS_PROCESSED.inc(status='duplicate')
+                return []
+            
+            block_seen_at = time.time()
+            block_timestamp = int(block['timestamp'], 16)
+            self.refresh_tracked_wallets()
+            
+            # Record gas price and the block's fee distribution
+            if block.get('baseFeePerGas'):
+                gas_price_gwei = int(block['baseFeePerGas'], 16) // 10**9
+                self.db.insert_gas_price(gas_price_gwei, int(time.time()), block_fee_stats(block))
             
-            # Record gas price
-            if block['baseFeePerGas']:
-                gas_price_gwei = self.w3.from_wei(block['baseFeePerGas'], 'gwei')
-                self.db.insert_gas_price(int(gas_price_gwei), int(time.time()))
+            # Token transfers are fetched in one eth_getLogs batch per loop,
+            # only for blocks whose bloom says they might match
+            logs_bloom = bytes.fromhex(block.get('logsBloom', '0x')[2:])
+            if self.token_tracker and self.token_tracker.block_may_match(logs_bloom):
+                self.token_candidates[block_number] = (block_timestamp, block_seen_at)
+                TOKEN_BLOOM_HITS.inc()
             
-            # Process transactions
+            # Match the whole block against the tracked wallets at once
+            transactions = block['transactions']
             whale_txs = []
-            for tx in block['transactions']:
-                tx_data = self.process_transaction(tx['hash'])
-                if tx_data:
-                    whale_txs.append(tx_data)
+            for index in self.block_matcher.match(transactions):
+                tx = transactions[index]
+                if self.seen_transactions.get(hash_key(tx['hash'])):
+                    DUPLICATES_SKIPPED.inc(kind='transaction')
+                    continue
+                tx_data = self.to_tx_data(tx, block_timestamp, block_seen_at)
+                whale_txs.append(self.store_transaction(tx_data, send_alerts=False))
             
+            # Alert on all of the block's newly stored whale transactions at once
+            self.send_block_alerts([tx_data for tx_data in whale_txs if tx_data.get('id')])
+            
+            self.db.mark_block_processed(block_number, block_hash)
+            self.processed_blocks.set(block_number, block_hash)
+            
+            TRANSACTIONS_SEEN.inc(len(transactions))
+            WHALE_TRANSACTIONS.inc(len(whale_txs))
+            BLOCKS_PROCESSED.inc(status='ok')
             return whale_txs
             
         except Exception as e:
             print(f"❌ Error monitoring block {block_number}: {e}")
+            BLOCKS_PROCESSED.inc(status='error')
             return []
+        finally:
+            BLOCK_LATENCY.observe(time.perf_counter() - start)
+    
+    def is_block_processed(self, block_number, block_hash):
+        """Check whether this exact block (number and hash) was already processed"""
+        processed_hash = self.processed_blocks.get(block_number)
+        if processed_hash is None:
+            processed_hash = self.db.get_processed_block_hash(block_number)
+            if processed_hash is not None:
+                self.processed_blocks.set(block_number, processed_hash)
+        return processed_hash == block_hash
+    
+    def process_token_transfers(self):
+        """Fetch, store and alert on tracked token transfers in candidate blocks"""
+        if not self.token_candidates:
+            return []
+        candidates, self.token_candidates = self.token_candidates, {}
+        try:
+            transfers = self.token_tracker.get_transfers(min(candidates), max(candidates))
+        except Exception as e:
+            print(f"❌ Error fetching token transfers: {e}")
+            return []
+        
+        stored = []
+        for transfer in transfers:
+            if transfer['blockNumber'] not in candidates:
+                continue
+            block_timestamp, block_seen_at = candidates[transfer['blockNumber']]
+            value_eth, value_usd = self.token_tracker.value_in(transfer, self.eth_price_usd)
+            tx_data = {
+                'hash': transfer['hash'],
+                'log_index': transfer['log_index'],
+                'from': transfer['from'],
+                'to': transfer['to'],
+                'value': transfer['value'],
+                'value_eth': value_eth,
+                'value_usd': value_usd,
+                'gasPrice': '0',
+                'blockNumber': transfer['blockNumber'],
+                'timestamp': int(time.time()),
+                'type': 'Token Transfer',
+                'isLarge': False,
+                'token_address': transfer['token_address'],
+                'token_symbol': transfer['token_symbol'],
+                'block_timestamp': block_timestamp,
+                'block_seen_at': block_seen_at
+            }
+            tx_id = self.db.insert_transaction(tx_data)
+            if tx_id:
+                tx_data['id'] = tx_id
+                tx_data['persisted_at'] = time.time()
+                stored.append(tx_data)
+                print(f"🪙 New token transfer: {transfer['value']} {transfer['token_symbol']}")
+        
+        TOKEN_TRANSFERS.inc(len(stored))
+        self.send_block_alerts(stored)
+        return stored
+    
+    def record_progress(self, head):
+        """Update head, last processed block and chain lag gauges"""
+        CHAIN_HEAD.set(head)
+        LAST_BLOCK.set(self.last_block)
+        CHAIN_LAG.set(max(head - self.last_block, 0))
+    
+    def log_provider_stats(self):
+        """Print per-provider latency and health when using several providers"""
+        # Unwrap the instrumenting/caching layers
+        provider = self.w3.provider
+        while not isinstance(provider, MultiProvider):
+            provider = getattr(provider, 'provider', None)
+            if provider is None:
+                return
+        for stats in provider.stats():
+            status = '✅' if stats['healthy'] else '⛔'
+            print(f"{status} RPC {stats['provider']}: p50 {stats['p50_ms']} ms, "
+                  f"p95 {stats['p95_ms']} ms, error rate {stats['error_rate']:.1%}")
+    
+    def publish_snapshot(self):
+        """Write the public feed snapshot that API workers serve from"""
+        if self.feed_snapshot is None:
+            return
+        try:
+            self.feed_snapshot.publish(self.db, self.last_block)
+        except Exception as e:
+            print(f"❌ Error publishing feed snapshot: {e}")
     
     def start_monitoring(self):
         """Start monitoring blockchain in real-time"""
         print("🚀 Starting whale monitor...")
         
-        # Get current block
-        self.last_block = self.w3.eth.block_number
-        print(f"📦 Starting from block: {self.last_block}")
-        
-        # Update ETH price every 5 minutes
-        last_price_update = time.time()
-        
-        while True:
-            try:
-                current_block = self.w3.eth.block_number
-                
-                # Process new blocks
-                if current_block > self.last_block:
-                    for block_num in range(self.last_block + 1, current_block + 1):
-                        print(f"🔍 Scanning block {block_num}...")
-                        self.monitor_block(block_num)
+        try:
+            # Get current block
+            self.last_block = self.w3.eth.block_number
+            print(f"📦 Starting from block: {self.last_block}")
+            self.record_progress(self.last_block)
+            self.publish_snapshot()
+            
+            # Update ETH price every 5 minutes
+            last_price_update = time.time()
+            
+            while True:
+                try:
+                    current_block = self.w3.eth.block_number
+                    self.record_progress(current_block)
                     
-                    self.last_block = current_block
-                
-                # Update ETH price every 5 minutes
-                if time.time() - last_price_update > 300:
-                    self.update_eth_price()
-                    last_price_update = time.time()
-                
-                # Wait before checking again
-                time.sleep(12)  # Ethereum block time ~12 seconds
+                    # Process new blocks
+                    if current_block > self.last_block:
+                        for block_num in range(self.last_block + 1, current_block + 1):
+                            print(f"🔍 Scanning block {block_num}...")
+                            self.monitor_block(block_num)
+                            self.last_block = block_num
+                            self.record_progress(current_block)
+                            self.publish_snapshot()
+                        if self.process_token_transfers():
+                            self.publish_snapshot()
+                    
+                    # Update ETH price every 5 minutes
+                    if time.time() - last_price_update > 300:
+                        self.update_eth_price()
+                        self.log_provider_stats()
+                        last_price_update = time.time()
+                    
+                    # Wait before checking again (Ethereum block time ~12 seconds)
+                    time.sleep(self.poll_interval)
                 
-            except KeyboardInterrupt:
-                print("\n⏹️  Stopping monitor...")
-                break
-            except Exception as e:
-                print(f"❌ Error in monitoring loop: {e}")
-                time.sleep(5)
+                except KeyboardInterrupt:
+                    print("\n⏹️  Stopping monitor...")
+                    break
+                except Exception as e:
+                    print(f"❌ Error in monitoring loop: {e}")
+                    time.sleep(5)
+        finally:
+            self.close()
+    
+    def close(self):
+        """Close the RPC capture, so its gzip stream is complete"""
+        if self.recorder is not None:
+            self.recorder.close()
 
 if __name__ == "__main__":
-    import config
     
-    if not config.RPC_URL:
-        print("❌ Error: RPC_URL not configured in .env file")
+    # Stop on SIGTERM the way Ctrl-C does, so start_monitoring cleans up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    if not config.RPC_URLS and not config.RPC_REPLAY_PATH:
+        print("❌ Error: RPC_URLS (or RPC_URL/INFURA_URL/ALCHEMY_URL) not configured in .env file")
         exit(1)
     
-    monitor = WhaleMonitor(config.RPC_URL)
+    if config.MONITOR_METRICS_PORT:
+        metrics.start_http_server(config.MONITOR_METRICS_PORT, config.MONITOR_METRICS_HOST)
+        print(f"📊 Metrics on {config.MONITOR_METRICS_HOST}:{config.MONITOR_METRICS_PORT}/metrics")
+    
+    if config.RPC_REPLAY_PATH:
+        speed = config.RPC_REPLAY_SPEED
+        print(f"⏯️  Replaying {config.RPC_REPLAY_PATH} at {f'{speed:g}x' if speed else 'max'} speed")
+        monitor = WhaleMonitor(None, provider=ReplayProvider(config.RPC_REPLAY_PATH, speed))
+        monitor.poll_interval = config.MONITOR_POLL_INTERVAL / speed if speed else 0
+    else:
+        monitor = WhaleMonitor(config.RPC_URLS)
+        if len(config.RPC_URLS) > 1:
+            print(f"🔀 Using {len(config.RPC_URLS)} RPC providers with hedging and failover")
+    if config.MEMPOOL_ENABLED:
+        MempoolWatcher(monitor).start()
     monitor.start_monitoring()
\ No newline at end of file
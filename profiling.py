@@ -0,0 +1,352 @@
+"""Opt-in request profiling for the API.
+
+When ``PROFILE_REQUESTS`` is enabled every request records how long it
+spent in the database, resolving labels and serializing the response.
+The breakdown is returned in a ``Server-Timing`` header, and requests or
+SQL statements slower than the configured thresholds are logged. Phases
+don't overlap: time in a nested phase is only counted there. A streamed
+body is produced after the headers are sent, so a streamed request's
+breakdown is only complete in its slow-request log line.
+
+A sampling profiler can also be run for a single request (``X-Profile: 1``)
+or for N seconds across the process (``POST /api/admin/profile``). Both
+produce folded stacks (``frame;frame;frame count``) that flamegraph.pl and
+speedscope read directly.
+
+Under the gevent worker ``threading`` is monkey-patched, so the sampler
+runs on one of gevent's original OS threads instead of a greenlet. A
+single request is sampled through its greenlet: the frame it is suspended
+in, or its thread's current frame while it runs. Process-wide sampling
+sees whichever greenlet is running, i.e. where CPU time goes.
+"""
+import _thread
+import contextvars
+import hmac
+import inspect
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+from flask import g, has_request_context, request
+import config
+
+_NULL_PHASE = nullcontext()
+
+
+def _gevent_patched():
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def _os_threading():
+    """start_new_thread, allocate_lock, get_ident and sleep for real OS threads, even under gevent"""
+    names = ['start_new_thread', 'allocate_lock', 'get_ident']
+    if _gevent_patched():
+        from gevent import monkey
+        return (*monkey.get_original('_thread', names), monkey.get_original('time', 'sleep'))
+    return (*(getattr(_thread, name) for name in names), time.sleep)
+
+
+def current_target():
+    """The OS thread id and (under gevent) greenlet of the caller, to sample"""
+    get_ident = _os_threading()[2]
+    greenlet = None
+    if _gevent_patched():
+        import gevent
+        greenlet = gevent.getcurrent()
+    return get_ident(), greenlet
+
+
+# The innermost phase being timed, so nested phases aren't counted twice and
+# work done after the view returned (a streamed body) finds its profile
+_ACTIVE_PHASE = contextvars.ContextVar('profiling_phase', default=None)
+
+
+def _current_profile():
+    if has_request_context():
+        return g.get('profile')
+    active = _ACTIVE_PHASE.get()
+    return active.profile if active is not None else None
+
+
+class RequestProfile:
+    """Accumulated phase timings for one request"""
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+    
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+    
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+    
+    def server_timing(self, total):
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ', '.join(parts)
+
+
+class _Phase:
+    """Time spent under a name, less the time of phases nested inside it"""
+    
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+    
+    def __enter__(self):
+        self.nested = 0.0
+        self._token = _ACTIVE_PHASE.set(self)
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _ACTIVE_PHASE.reset(self._token)
+        self.profile.add(self.name, elapsed - self.nested)
+        parent = _ACTIVE_PHASE.get()
+        if parent is not None:
+            parent.nested += elapsed
+        return False
+
+
+def phase(name):
+    """Attribute the time spent in a ``with`` block to a named phase"""
+    profile = _current_profile()
+    if profile is None:
+        return _NULL_PHASE
+    return _Phase(profile, name)
+
+
+def timed_iter(iterable, name):
+    """Attribute the time spent producing each item to a named phase.
+    
+    The profile is looked up now, so a generator that is consumed after the
+    view returns (a streamed response) is still timed.
+    """
+    profile = _current_profile()
+    if profile is None:
+        return iterable
+    return _timed_iter(iter(iterable), profile, name)
+
+
+def _timed_iter(iterator, profile, name):
+    try:
+        while True:
+            with _Phase(profile, name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def _record_query(sql, seconds):
+    profile = _current_profile()
+    if profile is not None:
+        profile.queries += 1
+    if seconds * 1000 >= config.SLOW_QUERY_MS:
+        statement = ' '.join(sql.split())
+        print(f"🐢 Slow query ({seconds * 1000:.1f} ms): {statement[:500]}")
+
+
+class TimedCursorMixin:
+    """Times each statement a cursor runs for the slow-query log"""
+    
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+    
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+
+class ProfiledCursor(TimedCursorMixin, sqlite3.Cursor):
+    pass
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _timed_db_method(func):
+    if inspect.isgeneratorfunction(inspect.unwrap(func)):
+        # Queries run as the generator is consumed, not when it is created
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            return timed_iter(func(*args, **kwargs), 'db')
+        return generator_wrapper
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile()
+        if profile is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add('db', time.perf_counter() - start)
+    return wrapper
+
+
+class StackSampler:
+    """Sample Python stacks from a background thread into folded form"""
+    
+    def __init__(self, thread_id=None, greenlet=None, interval=0.005):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._start_thread, allocate_lock, self._get_ident, self._sleep = _os_threading()
+        self._stopping = False
+        self._running = allocate_lock()
+    
+    def start(self):
+        self._running.acquire()
+        self._start_thread(self._run, ())
+        return self
+    
+    def stop(self):
+        if not self._stopping:
+            self._stopping = True
+            # Held by the sampler thread until it exits
+            self._running.acquire()
+            self._running.release()
+        return self
+    
+    def _run(self):
+        try:
+            self._sample()
+        finally:
+            self._running.release()
+    
+    def _sample(self):
+        own_id = self._get_ident()
+        while not self._stopping:
+            self._sleep(self.interval)
+            frames = sys._current_frames()
+            if self.greenlet is not None:
+                # gr_frame is only None while the greenlet runs (or is done)
+                frame = self.greenlet.gr_frame
+                if frame is None and not self.greenlet.dead:
+                    frame = frames.get(self.thread_id)
+                frames = {self.thread_id: frame} if frame is not None else {}
+            elif self.thread_id is not None:
+                frames = {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+    
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+    
+    def folded(self):
+        """Folded stacks, one ``stack count`` line per unique stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def sample_process(seconds, interval=0.005):
+    """Sample every thread for a number of seconds"""
+    sampler = StackSampler(interval=interval).start()
+    time.sleep(seconds)
+    return sampler.stop()
+
+
+def is_admin_request():
+    """Check the admin token header against ADMIN_TOKEN"""
+    token = request.headers.get('X-Admin-Token')
+    return bool(config.ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode())
+
+
+def _write_profile(folded):
+    os.makedirs(config.PROFILE_OUTPUT_DIR, exist_ok=True)
+    endpoint = (request.endpoint or 'unmatched').replace('/', '_')
+    path = os.path.join(config.PROFILE_OUTPUT_DIR, f"{int(time.time() * 1000)}-{endpoint}.folded")
+    with open(path, 'w') as f:
+        f.write(folded)
+    return path
+
+
+def _log_slow_request(profile, method, path):
+    total = profile.elapsed
+    if total * 1000 >= config.SLOW_REQUEST_MS:
+        breakdown = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in profile.phases.items())
+        print(f"🐢 Slow request {method} {path} "
+              f"({total * 1000:.1f} ms, {profile.queries} queries; {breakdown})")
+
+
+def install(app, db_class):
+    """Enable request profiling on a Flask app and a Database class"""
+    db_class.connection_factory = ProfiledConnection
+    # The Postgres backend borrows pooled connections instead; it is only
+    # imported when DATABASE_URL points at Postgres
+    postgres_db = sys.modules.get('postgres_db')
+    if postgres_db is not None:
+        connection = postgres_db.PooledConnection
+        connection.cursor_factory = type('ProfiledPooledCursor', (TimedCursorMixin, connection.cursor_factory), {})
+    for name, attr in list(vars(db_class).items()):
+        if not name.startswith('_') and inspect.isfunction(attr):
+            setattr(db_class, name, _timed_db_method(attr))
+    
+    @app.before_request
+    def start_profile():
+        g.profile = RequestProfile()
+        if request.headers.get('X-Profile') == '1' and is_admin_request():
+            thread_id, greenlet = current_target()
+            g.sampler = StackSampler(thread_id=thread_id, greenlet=greenlet).start()
+    
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            response.headers['X-Profile-File'] = _write_profile(sampler.stop().folded())
+        
+        response.headers['Server-Timing'] = profile.server_timing(profile.elapsed)
+        if response.is_streamed:
+            # The body is produced after this, so its phases are only
+            # complete (for the slow-request log) once it has been sent
+            method, path = request.method, request.full_path
+            response.call_on_close(lambda: _log_slow_request(profile, method, path))
+        else:
+            _log_slow_request(profile, request.method, request.full_path)
+        return response
@@ -0,0 +1,216 @@
+"""Web3 provider wrappers used by the monitor"""
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from web3 import Web3
+from web3.providers.base import BaseProvider
+import config
+import metrics
+
+RPC_LATENCY = metrics.histogram(
+    'rpc_request_duration_seconds', 'Latency of JSON-RPC requests', ['method'])
+RPC_ERRORS = metrics.counter(
+    'rpc_errors_total', 'JSON-RPC requests that raised or returned an error', ['method'])
+
+
+class InstrumentedProvider(BaseProvider):
+    """Delegate to another provider, recording per-method latency and errors"""
+    
+    def __init__(self, provider):
+        super().__init__()
+        self.provider = provider
+    
+    def is_connected(self, show_traceback=False):
+        return self.provider.is_connected(show_traceback)
+    
+    def make_request(self, method, params):
+        start = time.perf_counter()
+        try:
+            response = self.provider.make_request(method, params)
+        except Exception:
+            RPC_ERRORS.inc(method=method)
+            raise
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - start, method=method)
+        if 'error' in response:
+            RPC_ERRORS.inc(method=method)
+        return response
+
+
+# Filters live on the node that created them, so these stay on one provider
+FILTER_METHODS = frozenset((
+    'eth_newFilter', 'eth_newBlockFilter', 'eth_newPendingTransactionFilter',
+    'eth_getFilterChanges', 'eth_getFilterLogs', 'eth_uninstallFilter'
+))
+
+PROVIDER_LATENCY = metrics.histogram(
+    'rpc_provider_request_duration_seconds', 'Latency of JSON-RPC requests per provider', ['provider'])
+PROVIDER_ERRORS = metrics.counter(
+    'rpc_provider_errors_total', 'JSON-RPC requests that raised, per provider', ['provider'])
+PROVIDER_HEALTHY = metrics.gauge(
+    'rpc_provider_healthy', 'Whether a provider is in rotation (0 while cooling down)', ['provider'])
+RPC_HEDGES = metrics.counter('rpc_hedged_requests_total', 'Requests duplicated to a second provider', ['winner'])
+RPC_FAILOVERS = metrics.counter('rpc_failovers_total', 'Requests retried on another provider after an error')
+
+
+def provider_name(url):
+    """Host of a provider URL (paths often hold API keys)"""
+    return urlparse(url).netloc or url
+
+
+class ProviderState:
+    """Recent latencies and failures of one provider"""
+    
+    def __init__(self, provider, name, window=None):
+        self.provider = provider
+        self.name = name
+        self.latencies = deque(maxlen=window or config.RPC_LATENCY_WINDOW)
+        self.error_rate = 0.0  # moving average of failures
+        self.failures = 0  # consecutive
+        self.down_until = 0.0
+        PROVIDER_HEALTHY.set(1, provider=name)
+    
+    def record(self, seconds, ok):
+        self.error_rate = self.error_rate * 0.9 + (0.0 if ok else 0.1)
+        if ok:
+            self.latencies.append(seconds)
+            self.failures = 0
+            PROVIDER_HEALTHY.set(1, provider=self.name)
+            return
+        self.failures += 1
+        if self.failures >= config.RPC_MAX_FAILURES:
+            self.down_until = time.monotonic() + config.RPC_COOLDOWN
+            PROVIDER_HEALTHY.set(0, provider=self.name)
+    
+    def percentile(self, q):
+        return metrics.percentile(sorted(self.latencies), q)
+    
+    def hedge_delay(self):
+        """How long to wait for this provider before hedging: its p95"""
+        if len(self.latencies) < config.RPC_HEDGE_MIN_SAMPLES:
+            return config.RPC_HEDGE_DELAY
+        return self.percentile(95)
+    
+    def score(self, now):
+        """Lower is better: median latency inflated by the recent error rate"""
+        if now < self.down_until:
+            return float('inf')
+        median = self.percentile(50) if self.latencies else 0.0
+        return median * (1 + 10 * self.error_rate)
+    
+    def stats(self):
+        return {
+            'provider': self.name,
+            'samples': len(self.latencies),
+            'p50_ms': round(self.percentile(50) * 1000, 2) if self.latencies else None,
+            'p95_ms': round(self.percentile(95) * 1000, 2) if self.latencies else None,
+            'p99_ms': round(self.percentile(99) * 1000, 2) if self.latencies else None,
+            'error_rate': round(self.error_rate, 3),
+            'healthy': time.monotonic() >= self.down_until
+        }
+
+
+class MultiProvider(BaseProvider):
+    """Spread requests over several providers with hedging and failover.
+    
+    Each request goes to the provider with the best health score. If it
+    hasn't answered within that provider's p95 latency, the request is
+    also sent to the next best one and the first answer wins. A provider
+    that raises is failed over to the next; after RPC_MAX_FAILURES
+    consecutive failures it is ranked last for RPC_COOLDOWN seconds.
+    JSON-RPC error responses are returned as they are.
+    """
+    
+    def __init__(self, providers, names=None):
+        super().__init__()
+        names = names or [f"provider{i}" for i in range(len(providers))]
+        self.states = [ProviderState(provider, name) for provider, name in zip(providers, names)]
+        # Hedged requests that lose keep running, so leave room for them
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(providers), thread_name_prefix='rpc')
+        self._filter_state = None
+    
+    def is_connected(self, show_traceback=False):
+        return any(state.provider.is_connected(show_traceback) for state in self.states)
+    
+    def ranked(self):
+        """Provider states, healthiest first"""
+        now = time.monotonic()
+        return sorted(self.states, key=lambda state: state.score(now))
+    
+    def stats(self):
+        """Per-provider latency percentiles and health"""
+        return [state.stats() for state in self.states]
+    
+    def _call(self, state, method, params):
+        start = time.perf_counter()
+        try:
+            response = state.provider.make_request(method, params)
+        except Exception:
+            state.record(time.perf_counter() - start, ok=False)
+            PROVIDER_ERRORS.inc(provider=state.name)
+            raise
+        elapsed = time.perf_counter() - start
+        state.record(elapsed, ok=True)
+        PROVIDER_LATENCY.observe(elapsed, provider=state.name)
+        return response
+    
+    def make_request(self, method, params):
+        if method in FILTER_METHODS:
+            if self._filter_state is None or method.startswith('eth_new'):
+                self._filter_state = self.ranked()[0]
+            return self._call(self._filter_state, method, params)
+        
+        candidates = self.ranked()
+        primary = candidates[0]
+        in_flight = {}
+        
+        def launch():
+            state = candidates.pop(0)
+            in_flight[self.executor.submit(self._call, state, method, params)] = state
+        
+        launch()
+        hedged = False
+        empty = error = None
+        while in_flight:
+            # Only hedge to a provider in rotation; cooling-down ones are for failover
+            can_hedge = not hedged and candidates and candidates[0].down_until <= time.monotonic()
+            timeout = primary.hedge_delay() if can_hedge else None
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # The primary is slower than usual: race the next provider
+                hedged = True
+                launch()
+                continue
+            
+            for future in done:
+                state = in_flight.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    if candidates and not in_flight:
+                        RPC_FAILOVERS.inc()
+                        launch()
+                    continue
+                # A lagging node may not have the block or transaction yet
+                if response.get('result') is None and 'error' not in response and in_flight:
+                    empty = response
+                    continue
+                if hedged:
+                    RPC_HEDGES.inc(winner='hedge' if state is not primary else 'primary')
+                return response
+        
+        if empty is not None:
+            return empty
+        raise error
+
+
+def build_provider(urls):
+    """HTTP provider for one URL, or a MultiProvider over several"""
+    if isinstance(urls, str):
+        urls = [urls]
+    providers = [Web3.HTTPProvider(url) for url in urls]
+    if len(providers) == 1:
+        return providers[0]
+    return MultiProvider(providers, names=[provider_name(url) for url in urls])
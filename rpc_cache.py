@@ -0,0 +1,185 @@
+"""On-disk cache of finalized JSON-RPC responses.
+
+``CachingProvider`` sits in front of the real provider and answers block,
+transaction, receipt and log lookups from a local SQLite file once their
+block is at least ``RPC_CACHE_CONFIRMATIONS`` deep. Deeper blocks don't
+change, so backfills, rescans and replays of a range only reach the
+provider the first time.
+
+Results are stored content-addressed: each distinct result is kept once,
+as zlib-compressed compact JSON under its SHA-256. Request keys point to a
+digest and carry the block number the result belongs to. That index is
+what eviction uses: past ``RPC_CACHE_MAX_BYTES`` the oldest blocks are
+dropped first.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from web3.providers.base import BaseProvider
+import config
+import metrics
+
+RPC_CACHE_REQUESTS = metrics.counter('rpc_cache_requests_total', 'Cacheable JSON-RPC requests', ['result'])
+RPC_CACHE_BYTES = metrics.gauge('rpc_cache_bytes', 'Compressed size of cached RPC results')
+
+# Seconds a head block number is trusted when deciding what is final
+HEAD_TTL = 12
+
+
+def _block_number(value):
+    """Block number from a hex quantity; None for tags such as 'latest'"""
+    if isinstance(value, str) and value.startswith('0x'):
+        return int(value, 16)
+    return None
+
+
+CACHEABLE_METHODS = frozenset((
+    'eth_getBlockByNumber', 'eth_getBlockByHash', 'eth_getBlockReceipts',
+    'eth_getTransactionByHash', 'eth_getTransactionReceipt', 'eth_getLogs'
+))
+
+
+def result_block(method, params, result):
+    """Block a cacheable request's result belongs to, or None if it isn't cacheable"""
+    if not result:
+        # Empty log lists are final too, but null means "not found yet"
+        if method == 'eth_getLogs' and result == []:
+            return _block_number(params[0].get('toBlock'))
+        return None
+    if method in ('eth_getBlockByNumber', 'eth_getBlockReceipts') and not params[0].startswith('0x'):
+        # Tags like 'latest' name a different block over time
+        return None
+    if method in ('eth_getBlockByNumber', 'eth_getBlockByHash'):
+        return _block_number(result.get('number'))
+    if method == 'eth_getBlockReceipts':
+        return _block_number(result[0]['blockNumber'])
+    if method in ('eth_getTransactionByHash', 'eth_getTransactionReceipt'):
+        # Pending transactions have no block yet
+        return _block_number(result.get('blockNumber'))
+    if method == 'eth_getLogs' and 'blockHash' not in params[0]:
+        return _block_number(params[0].get('toBlock'))
+    return None
+
+
+class CachingProvider(BaseProvider):
+    """Serve finalized blocks, transactions, receipts and logs from disk"""
+    
+    def __init__(self, provider, path=None, max_bytes=None, confirmations=None):
+        super().__init__()
+        self.provider = provider
+        self.path = path or config.RPC_CACHE_PATH
+        self.max_bytes = max_bytes or config.RPC_CACHE_MAX_BYTES
+        self.confirmations = config.RPC_CACHE_CONFIRMATIONS if confirmations is None else confirmations
+        self.head = None
+        self.head_at = 0.0
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # A lost write only costs a refetch
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS objects (
+                digest BLOB PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                request_key BLOB PRIMARY KEY,
+                digest BLOB NOT NULL,
+                block_number INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_block ON entries(block_number)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries(digest)')
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        RPC_CACHE_BYTES.set(self.size)
+    
+    def is_connected(self, show_traceback=False):
+        return self.provider.is_connected(show_traceback)
+    
+    @staticmethod
+    def request_key(method, params):
+        return hashlib.sha256(json.dumps([method, params], separators=(',', ':')).encode()).digest()
+    
+    def make_request(self, method, params):
+        if method not in CACHEABLE_METHODS:
+            response = self.provider.make_request(method, params)
+            if method == 'eth_blockNumber' and 'result' in response:
+                self.head, self.head_at = int(response['result'], 16), time.monotonic()
+            return response
+        
+        key = self.request_key(method, params)
+        with self._lock:
+            row = self.conn.execute('''
+                SELECT o.data FROM entries e JOIN objects o ON o.digest = e.digest
+                WHERE e.request_key = ?
+            ''', (key,)).fetchone()
+        if row is not None:
+            RPC_CACHE_REQUESTS.inc(result='hit')
+            return {'jsonrpc': '2.0', 'id': 0, 'result': json.loads(zlib.decompress(row[0]))}
+        
+        RPC_CACHE_REQUESTS.inc(result='miss')
+        response = self.provider.make_request(method, params)
+        block_number = result_block(method, params, response.get('result'))
+        if block_number is not None and block_number <= self.final_block():
+            self.store(key, block_number, response['result'])
+        return response
+    
+    def final_block(self):
+        """Highest block at least ``confirmations`` deep (-1 until the head is known)"""
+        if self.head is None or time.monotonic() - self.head_at > HEAD_TTL:
+            response = self.provider.make_request('eth_blockNumber', [])
+            if 'result' not in response:
+                return -1
+            self.head, self.head_at = int(response['result'], 16), time.monotonic()
+        return self.head - self.confirmations
+    
+    def store(self, key, block_number, result):
+        data = zlib.compress(json.dumps(result, separators=(',', ':')).encode())
+        digest = hashlib.sha256(data).digest()
+        with self._lock:
+            added = self.conn.execute('INSERT OR IGNORE INTO objects (digest, data, size) VALUES (?, ?, ?)',
+                                      (digest, data, len(data))).rowcount
+            self.conn.execute('INSERT OR REPLACE INTO entries (request_key, digest, block_number) VALUES (?, ?, ?)',
+                              (key, digest, block_number))
+            if added:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+            RPC_CACHE_BYTES.set(self.size)
+    
+    def _evict(self):
+        """Drop the oldest blocks until the cache is back under 90% of its cap"""
+        target = self.size - int(self.max_bytes * 0.9)
+        freed = 0
+        cutoff = None
+        for block_number, size in self.conn.execute('''
+            SELECT e.block_number, SUM(o.size) FROM entries e JOIN objects o ON o.digest = e.digest
+            GROUP BY e.block_number ORDER BY e.block_number
+        '''):
+            cutoff = block_number
+            freed += size
+            if freed >= target:
+                break
+        if cutoff is None:
+            return
+        
+        self.conn.execute('BEGIN')
+        self.conn.execute('DELETE FROM entries WHERE block_number <= ?', (cutoff,))
+        self.conn.execute('DELETE FROM objects WHERE digest NOT IN (SELECT digest FROM entries)')
+        self.conn.execute('COMMIT')
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        print(f"🧹 RPC cache evicted blocks up to {cutoff} ({self.size / 1e6:.1f} MB left)")
+    
+    def close(self):
+        self.conn.close()
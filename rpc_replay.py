@@ -0,0 +1,149 @@
+"""Capture and replay of JSON-RPC traffic.
+
+``RecordingProvider`` wraps the monitor's provider and appends every
+request, its response (or exception), its latency and its time offset to
+a gzip-compressed NDJSON file:
+
+    {"t": 12.031, "d": 0.084, "m": "eth_getBlockByNumber", "p": ["0x12a", true], "r": {...}}
+    {"t": 12.118, "d": 5.0, "m": "eth_getTransactionByHash", "p": ["0x..."], "e": "Read timed out"}
+
+Each run appends a new gzip member, so a capture can grow across restarts.
+
+``ReplayProvider`` serves a capture offline. At ``speed`` 1 (or N) the
+capture's clock runs in real time (or N times faster). Each request gets
+the latest recorded response to the same request whose time has come, and
+the recorded latency (divided by N) is reproduced. With ``speed=None``
+there is no waiting: repeated requests get their recorded responses in
+order, so the chain head advances one recorded poll per call.
+"""
+import gzip
+import json
+import threading
+import time
+from bisect import bisect_right
+from web3.providers.base import BaseProvider
+import metrics
+
+RPC_RECORDED = metrics.counter('rpc_recorded_requests_total', 'JSON-RPC requests written to a capture')
+
+
+def request_key(method, params):
+    return json.dumps([method, params], separators=(',', ':'), default=str)
+
+
+class RecordingProvider(BaseProvider):
+    """Delegate to another provider, appending all traffic to a capture file"""
+    
+    def __init__(self, provider, path, flush_interval=1.0):
+        super().__init__()
+        self.provider = provider
+        self.path = path
+        self.flush_interval = flush_interval
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+        self.started = time.monotonic()
+        self.flushed_at = self.started
+        self._lock = threading.Lock()
+    
+    def is_connected(self, show_traceback=False):
+        return self.provider.is_connected(show_traceback)
+    
+    def make_request(self, method, params):
+        start = time.monotonic()
+        record = {'t': round(start - self.started, 6), 'm': method, 'p': params}
+        try:
+            response = self.provider.make_request(method, params)
+            record['r'] = response
+            return response
+        except Exception as e:
+            record['e'] = str(e)
+            raise
+        finally:
+            record['d'] = round(time.monotonic() - start, 6)
+            self.write(record)
+    
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            self.file.write(line)
+            if time.monotonic() - self.flushed_at > self.flush_interval:
+                self.file.flush()
+                self.flushed_at = time.monotonic()
+        RPC_RECORDED.inc()
+    
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def load_capture(path):
+    """Recorded requests from a capture file, in order"""
+    records = []
+    offset = 0.0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # cut off mid-record
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                # Every run starts at t=0; lay runs out one after another
+                if records and record['t'] + offset < records[-1]['t']:
+                    offset = records[-1]['t']
+                record['t'] += offset
+                records.append(record)
+        except EOFError:
+            # The recording process was killed before closing the capture;
+            # everything flushed until then is still usable
+            print(f"⚠️ {path} ends in a truncated gzip member; replaying the {len(records)} records before it")
+    return records
+
+
+class ReplayProvider(BaseProvider):
+    """Serve a capture from RecordingProvider at 1x, Nx or maximum speed"""
+    
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.speed = speed or None
+        self.timeline = {}  # request key -> ([t], [record])
+        for record in load_capture(path):
+            times, records = self.timeline.setdefault(request_key(record['m'], record['p']), ([], []))
+            times.append(record['t'])
+            records.append(record)
+        self.cursors = {}
+        self.started = None
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def is_connected(self, show_traceback=False):
+        return True
+    
+    def capture_time(self):
+        """Capture clock: seconds since the first replayed request, scaled by speed"""
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+        return (time.monotonic() - self.started) * self.speed
+    
+    def make_request(self, method, params):
+        key = request_key(method, params)
+        entry = self.timeline.get(key)
+        if entry is None:
+            self.misses += 1
+            return {'jsonrpc': '2.0', 'id': 0,
+                    'error': {'code': -32000, 'message': f"{method} not in capture"}}
+        times, records = entry
+        
+        if self.speed is None:
+            with self._lock:
+                index = self.cursors.get(key, 0)
+                self.cursors[key] = min(index + 1, len(records) - 1)
+            record = records[index]
+        else:
+            record = records[max(bisect_right(times, self.capture_time()) - 1, 0)]
+            time.sleep(record['d'] / self.speed)
+        
+        if 'e' in record:
+            raise ConnectionError(record['e'])
+        return record['r']
@@ -0,0 +1,140 @@
+"""In-memory prefix search over addresses and labels.
+
+Every searchable string is a key in one sorted list: each entry's
+lowercased address, plus each lowercased token of its label. A parallel
+list maps keys back to entries. A prefix query is the key range found with
+two bisects, so it doesn't depend on how many entries there are. Entries
+added later are inserted in place, or merged with one sort when there are
+many of them. A lock makes updates and searches safe from several threads.
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+# Sorts after every character a key can contain
+_PREFIX_END = '\uffff'
+# Keys checked per result wanted (entries repeat across their tokens)
+_SCAN_FACTOR = 50
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class SearchEntry:
+    __slots__ = ('address', 'label', 'source', 'keys', 'text')
+    
+    def __init__(self, address, label=None, source='address'):
+        self.address = address
+        self.label = label
+        self.source = source
+        # The address and each distinct label token
+        self.keys = (address,) + tuple(set(tokenize(label))) if label else (address,)
+        # Keys as one string, so ' ' + prefix finds a key starting with prefix
+        self.text = ' ' + ' '.join(self.keys)
+    
+    def to_dict(self):
+        return {'address': self.address, 'label': self.label, 'source': self.source}
+
+
+class SearchIndex:
+    """Prefix index over address -> (label, source) entries"""
+    
+    def __init__(self):
+        self._keys = []
+        self._entries = []  # entry for the key at the same position
+        self.by_address = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.by_address)
+    
+    def add(self, address, label=None, source='address'):
+        """Add or relabel one entry"""
+        self.add_many([(address, label, source)])
+    
+    def add_many(self, items):
+        """Add or relabel (address, label, source) entries"""
+        items = list(items)
+        with self._lock:
+            self._add_many(items)
+    
+    def _add_many(self, items):
+        pairs = []
+        for address, label, source in items:
+            address = address.lower()
+            entry = self.by_address.get(address)
+            if entry is not None:
+                # Addresses seen in transactions don't override a known label
+                if not label or label == entry.label:
+                    continue
+                self._remove(entry)
+            entry = SearchEntry(address, label, source)
+            self.by_address[address] = entry
+            pairs.extend((key, entry) for key in entry.keys)
+        
+        if len(pairs) > len(self._keys) // 8:
+            pairs.extend(zip(self._keys, self._entries))
+            pairs.sort(key=lambda pair: pair[0])
+            self._keys = [key for key, _ in pairs]
+            self._entries = [entry for _, entry in pairs]
+            return
+        for key, entry in pairs:
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, entry)
+    
+    def remove_many(self, addresses):
+        """Remove entries by address, in one pass over the keys"""
+        with self._lock:
+            removed = {self.by_address.pop(address.lower(), None) for address in addresses}
+            removed.discard(None)
+            if not removed:
+                return
+            pairs = [(key, entry) for key, entry in zip(self._keys, self._entries) if entry not in removed]
+            self._keys = [key for key, _ in pairs]
+            self._entries = [entry for _, entry in pairs]
+    
+    def _remove(self, entry):
+        for key in entry.keys:
+            position = bisect_left(self._keys, key)
+            while self._entries[position] is not entry:
+                position += 1
+            del self._keys[position]
+            del self._entries[position]
+        del self.by_address[entry.address]
+    
+    def _range(self, prefix):
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + _PREFIX_END)
+    
+    def search(self, query, limit=10):
+        """Entries whose address starts with the query, or whose label has a
+        token starting with every query token, in key order"""
+        query = query.strip().lower()
+        tokens = [query] if query.startswith('0x') else tokenize(query)
+        if not tokens:
+            return []
+        
+        with self._lock:
+            return self._search(tokens, limit)
+    
+    def _search(self, tokens, limit):
+        # Walk the narrowest token's range and check the others per entry
+        ranges = [self._range(token) for token in tokens]
+        narrowest = min(range(len(tokens)), key=lambda i: ranges[i][1] - ranges[i][0])
+        start, end = ranges[narrowest]
+        others = [' ' + token for i, token in enumerate(tokens) if i != narrowest]
+        
+        matches = []
+        seen = set()
+        for position in range(start, min(end, start + limit * _SCAN_FACTOR)):
+            entry = self._entries[position]
+            if entry.address in seen or not all(token in entry.text for token in others):
+                continue
+            seen.add(entry.address)
+            matches.append(entry)
+            if len(matches) == limit:
+                break
+        return matches
+
@@ -0,0 +1,59 @@
+"""Fast JSON encoding for large lists of database rows.
+
+Rows stay cursor tuples until they are encoded: each batch is zipped
+against a precomputed key layout and encoded in one call, by orjson when
+it is installed and the stdlib otherwise. Long lists are streamed batch
+by batch, so neither every row's dict nor the whole body is held at once.
+"""
+import csv
+import io
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Encode to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), default=str).encode()
+
+
+def iter_json_array(batches, keys, transform=None):
+    """Encode batches of row tuples as one JSON array of objects, piece by piece"""
+    yield b'['
+    first = True
+    for rows in batches:
+        if transform is not None:
+            rows = [transform(row) for row in rows]
+        if not rows:
+            continue
+        if not first:
+            yield b','
+        # Strip the batch's own brackets so batches join into one array
+        yield dumps([dict(zip(keys, row)) for row in rows])[1:-1]
+        first = False
+    yield b']'
+
+
+def iter_ndjson(batches, keys):
+    """Encode batches of row tuples as newline-delimited JSON, one chunk per batch"""
+    for rows in batches:
+        yield b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in rows)
+
+
+def iter_csv(batches, keys):
+    """Encode batches of row tuples as CSV with a header row, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(keys)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
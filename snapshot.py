@@ -0,0 +1,183 @@
+"""Memory-mapped snapshot of the public feed, shared by API workers.
+
+After each block the monitor writes the latest SNAPSHOT_ROWS transactions,
+already encoded as the JSON objects ``/api/transactions`` returns, and the
+``/api/stats`` body to one file at SNAPSHOT_PATH. It writes a new file and
+renames it over the old one, so a reader only ever sees whole snapshots.
+Each API worker maps the file read-only. A feed request is answered by
+copying a slice of the mapping, with no decoding, encoding or database
+query. The worker maps the file again when ``stat`` shows it was replaced.
+
+Layout (little-endian)::
+
+    header   HEADER: magic, format, sequence, written_at, block_number,
+             row_count, capacity, stats_size
+    offsets  uint32 x (row_count + 1): where each row starts in the rows
+             section, then its end
+    rows     each row's JSON object followed by a comma
+    stats    the /api/stats JSON object
+
+The first n rows as a JSON array are ``[`` + rows[:offsets[n] - 1] + ``]``.
+``capacity`` is how many rows were asked for. A snapshot with fewer rows
+holds every stored transaction, so it can answer any limit.
+"""
+import mmap
+import os
+import struct
+import time
+from database import TRANSACTION_COLUMNS
+import config
+import metrics
+import serialization
+
+MAGIC = b'WFSS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH2xQdqIII4x')
+
+# Transaction rows as returned by the API: the table's columns plus labels
+TRANSACTION_JSON_KEYS = TRANSACTION_COLUMNS + ('from_label', 'to_label')
+FROM_ADDRESS = TRANSACTION_COLUMNS.index('from_address')
+TO_ADDRESS = TRANSACTION_COLUMNS.index('to_address')
+
+SNAPSHOT_READS = metrics.counter(
+    'feed_snapshot_reads_total', 'Public feed requests by where they were served from', ['source'])
+SNAPSHOT_PUBLISH = metrics.histogram('feed_snapshot_publish_seconds', 'Time to build and write a feed snapshot')
+
+
+def with_labels(row, wallet_map=None):
+    """Append from/to labels to a transaction row tuple, preferring the user's wallet names"""
+    from_addr = row[FROM_ADDRESS]
+    to_addr = row[TO_ADDRESS]
+    from_label = to_label = None
+    if wallet_map:
+        from_label = wallet_map.get(from_addr.lower())
+        to_label = wallet_map.get(to_addr.lower()) if to_addr else None
+    return row + (
+        from_label or config.get_whale_label(from_addr),
+        (to_label or config.get_whale_label(to_addr)) if to_addr else None
+    )
+
+
+def public_stats(db):
+    """The /api/stats numbers, from the database"""
+    transactions = db.get_recent_transactions(100)
+    
+    total_volume = sum(float(tx['value']) for tx in transactions if not tx['token_symbol'])
+    large_txs = sum(1 for tx in transactions if tx['is_large'])
+    
+    gas_history = db.get_gas_history(10)
+    avg_gas = sum(g['gas_price'] for g in gas_history) / len(gas_history) if gas_history else 0
+    
+    return {
+        'totalVolume': round(total_volume, 2),
+        'avgGasPrice': int(avg_gas),
+        'largeTransactions': large_txs,
+        'activeWhales': len(config.WHALE_LABELS)
+    }
+
+
+def encode_snapshot(sequence, rows, stats, capacity, block_number=None, written_at=None):
+    """Snapshot file contents for row tuples (newest first) and a stats dict"""
+    encoded = [serialization.dumps(dict(zip(TRANSACTION_JSON_KEYS, with_labels(row)))) + b',' for row in rows]
+    offsets = [0]
+    for row in encoded:
+        offsets.append(offsets[-1] + len(row))
+    stats = serialization.dumps(stats)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, sequence, written_at or time.time(),
+                         -1 if block_number is None else block_number, len(encoded), capacity, len(stats))
+    return b''.join([header, struct.pack(f'<{len(offsets)}I', *offsets), *encoded, stats])
+
+
+class Snapshot:
+    """One mapped snapshot file"""
+    
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        (magic, version, self.sequence, self.written_at, block_number,
+         self.row_count, self.capacity, stats_size) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"not a version {FORMAT_VERSION} feed snapshot")
+        self.block_number = None if block_number < 0 else block_number
+        rows_start = HEADER.size + 4 * (self.row_count + 1)
+        self.offsets = self.buffer[HEADER.size:rows_start].cast('I')
+        self._rows = self.buffer[rows_start:rows_start + self.offsets[-1]]
+        self._stats = self.buffer[rows_start + self.offsets[-1]:][:stats_size]
+    
+    @property
+    def age(self):
+        return time.time() - self.written_at
+    
+    def covers(self, limit):
+        """Whether the latest ``limit`` transactions are all in the snapshot"""
+        return limit > 0 and (limit <= self.row_count or self.row_count < self.capacity)
+    
+    def transactions(self, limit):
+        """The latest ``limit`` transactions as a JSON array"""
+        count = min(limit, self.row_count)
+        if not count:
+            return b'[]'
+        # WSGI servers want bytes, so this is the one copy out of the mapping
+        return b''.join((b'[', self._rows[:self.offsets[count] - 1], b']'))
+    
+    def stats(self):
+        """The /api/stats body"""
+        return bytes(self._stats)
+
+
+class SnapshotReader:
+    """Maps the snapshot file, and maps it again when it has been replaced"""
+    
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = config.SNAPSHOT_MAX_AGE if max_age is None else max_age
+        self._snapshot = None
+        self._file_id = None
+    
+    def current(self):
+        """The latest snapshot, or None when there is no usable one"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            self._file_id = file_id
+            # The previous mapping is closed once nothing refers to it
+            self._snapshot = self._load()
+        snapshot = self._snapshot
+        if snapshot is not None and self.max_age and snapshot.age > self.max_age:
+            return None
+        return snapshot
+    
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return Snapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ Ignoring feed snapshot {self.path}: {e}")
+            return None
+
+
+class SnapshotWriter:
+    """Builds snapshots from the database and swaps them in atomically"""
+    
+    def __init__(self, path, rows=None):
+        self.path = path
+        self.rows = rows or config.SNAPSHOT_ROWS
+        # Carry the sequence on across restarts, so it only ever increases
+        existing = SnapshotReader(path, max_age=0).current()
+        self.sequence = existing.sequence if existing else 0
+    
+    def publish(self, db, block_number=None):
+        """Write a snapshot of the latest transactions and stats"""
+        started = time.perf_counter()
+        rows = [row for batch in db.iter_recent_transactions(self.rows) for row in batch]
+        data = encode_snapshot(self.sequence + 1, rows, public_stats(db), self.rows, block_number)
+        
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+        self.sequence += 1
+        SNAPSHOT_PUBLISH.observe(time.perf_counter() - started)
+        return self.sequence
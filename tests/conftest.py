@@ -0,0 +1,97 @@
+"""Shared test setup: import the app modules from the repo against throwaway storage."""
+import itertools
+import os
+import sys
+import tempfile
+from urllib.parse import urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config reads these at import time, so they must be set before any app module loads
+TEST_DIR = tempfile.mkdtemp(prefix='whale-monitor-tests-')
+os.environ['DATABASE_URL'] = os.path.join(TEST_DIR, 'app.db')
+os.environ['SNAPSHOT_PATH'] = ''
+os.environ['JWT_SECRET'] = 'test-secret-' + 'x' * 32
+
+_emails = itertools.count()
+_databases = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def postgres_server():
+    """URL of a Postgres server for backend tests: TEST_POSTGRES_URL, or a throwaway pgserver instance"""
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip('pgserver', reason='set TEST_POSTGRES_URL or install pgserver')
+    pytest.importorskip('psycopg_pool')
+    server = pgserver.get_server(os.path.join(TEST_DIR, 'pgdata'), cleanup_mode='delete')
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def database(request, tmp_path):
+    """An empty Database on each storage backend"""
+    from database import Database
+    if request.param == 'sqlite':
+        yield Database(str(tmp_path / 'test.db'))
+        return
+    
+    import psycopg
+    from postgres_db import PostgresDatabase
+    server_url = request.getfixturevalue('postgres_server')
+    name = f'test_{os.getpid()}_{next(_databases)}'
+    with psycopg.connect(server_url, autocommit=True) as conn:
+        conn.execute(f'CREATE DATABASE {name}')
+    db = PostgresDatabase(urlsplit(server_url)._replace(path=f'/{name}').geturl(), max_size=4)
+    try:
+        yield db
+    finally:
+        db.close()
+        with psycopg.connect(server_url, autocommit=True) as conn:
+            conn.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+@pytest.fixture
+def api():
+    """The Flask app module, with its per-worker caches emptied"""
+    import app
+    app.user_contexts.clear()
+    app.wallet_search_indexes.clear()
+    return app
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
+
+
+@pytest.fixture
+def user(api):
+    """A fresh user, with auth headers for the JWT routes"""
+    from flask_jwt_extended import create_access_token
+    created = api.db.create_user(f'user{next(_emails)}@example.com', 'password123')
+    with api.app.app_context():
+        token = create_access_token(identity=str(created['id']))
+    return dict(created, headers={'Authorization': f'Bearer {token}'})
+
+
+@pytest.fixture
+def count_connections(api, monkeypatch):
+    """Count database connections (one per Database method call) made by the app"""
+    counter = {'connections': 0}
+    connect = type(api.db)._connect
+    
+    def counting_connect(self):
+        counter['connections'] += 1
+        return connect(self)
+    
+    monkeypatch.setattr(type(api.db), '_connect', counting_connect)
+    return counter
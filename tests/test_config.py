@@ -0,0 +1,33 @@
+"""Settings read from the environment."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+RPC_VARIABLES = ('RPC_URLS', 'RPC_URL', 'INFURA_URL', 'ALCHEMY_URL')
+
+
+def rpc_settings(**env):
+    environment = {k: v for k, v in os.environ.items() if k not in RPC_VARIABLES}
+    environment.update(env)
+    result = subprocess.run(
+        [sys.executable, '-c', 'import json, config; print(json.dumps([config.RPC_URLS, config.RPC_URL]))'],
+        cwd=ROOT, env=environment, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize('env, expected', [
+    ({'RPC_URLS': 'https://a, https://b', 'RPC_URL': 'https://c'}, [['https://a', 'https://b'], 'https://a']),
+    ({'RPC_URL': 'https://node'}, [['https://node'], 'https://node']),
+    ({'RPC_URL': 'https://node', 'INFURA_URL': 'https://infura'}, [['https://node', 'https://infura'], 'https://node']),
+    ({'INFURA_URL': 'https://infura', 'ALCHEMY_URL': 'https://alchemy'},
+     [['https://infura', 'https://alchemy'], 'https://infura']),
+    ({}, [[], None]),
+])
+def test_rpc_urls(env, expected):
+    assert rpc_settings(**env) == expected
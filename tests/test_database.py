@@ -0,0 +1,89 @@
+"""Storage behaviour shared by the SQLite and Postgres backends."""
+import json
+
+from database import TRANSACTION_COLUMNS
+from events import format_sse
+
+WHALE = '0x' + '11' * 20
+OTHER = '0x' + '22' * 20
+
+
+def make_tx(n, sender=WHALE, receiver=OTHER, **fields):
+    return dict({
+        'hash': '0x' + f'{n:064x}',
+        'from': sender,
+        'to': receiver,
+        'value': float(n),
+        'gasPrice': 30,
+        'blockNumber': 100 + n,
+        'timestamp': 1700000000 + n * 12,
+        'isLarge': n % 2 == 0
+    }, **fields)
+
+
+def test_duplicate_transactions_are_ignored(database):
+    first = database.insert_transaction(make_tx(1))
+    
+    assert first is not None
+    assert database.insert_transaction(make_tx(1)) is None
+    assert database.insert_transaction(make_tx(1, log_index=0)) is not None
+    assert database.get_latest_transaction_id() >= first
+
+
+def test_recent_transactions_newest_first(database):
+    for n in range(1, 6):
+        database.insert_transaction(make_tx(n))
+    
+    recent = database.get_recent_transactions(3)
+    assert [tx['block_number'] for tx in recent] == [105, 104, 103]
+    assert recent[0]['from_address'] == WHALE
+    
+    batches = list(database.iter_recent_transactions(5, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0][TRANSACTION_COLUMNS.index('block_number')] == 105
+
+
+def test_transactions_since_encode_as_sse(database):
+    """The transaction hub pushes these rows as-is (Postgres returns datetimes)"""
+    database.insert_transaction(make_tx(1))
+    database.insert_transaction(make_tx(2))
+    
+    rows = database.get_transactions_since(0)
+    message = format_sse(rows[-1], event_id=rows[-1]['id'])
+    
+    data = json.loads(message.split('data: ', 1)[1])
+    assert data['tx_hash'] == make_tx(2)['hash']
+    assert data['created_at']
+
+
+def test_user_wallets_and_their_transactions(database):
+    user = database.create_user('whale-watcher@example.com', 'password123')
+    version = database.get_tracked_wallets_version()
+    
+    statuses = database.add_user_wallets(user['id'], [(WHALE, 'Whale', 10.0), (WHALE, 'Again', 10.0)])
+    assert statuses == ['added', 'duplicate']
+    assert database.get_tracked_wallets_version() == version
+    database.bump_tracked_wallets_version()
+    assert database.get_tracked_wallets_version() == version + 1
+    assert database.get_all_tracked_wallets() == [WHALE]
+    assert [u['email'] for u in database.get_users_tracking_wallet(WHALE)] == ['whale-watcher@example.com']
+    
+    database.insert_transaction(make_tx(1))
+    database.insert_transaction(make_tx(2, sender=OTHER, receiver=None))
+    database.insert_transaction(make_tx(3, sender=OTHER, receiver=WHALE))
+    
+    exported = [row for batch in database.iter_user_transactions(user['id'], batch_size=1) for row in batch]
+    assert [row[TRANSACTION_COLUMNS.index('block_number')] for row in exported] == [101, 103]
+    
+    since = make_tx(2)['timestamp']
+    exported = [row for batch in database.iter_user_transactions(user['id'], since=since) for row in batch]
+    assert [row[TRANSACTION_COLUMNS.index('block_number')] for row in exported] == [103]
+
+
+def test_processed_blocks(database):
+    assert database.get_processed_block_hash(100) is None
+    
+    database.mark_block_processed(100, '0xaa')
+    database.mark_block_processed(100, '0xbb')
+    
+    assert database.get_processed_block_hash(100) == '0xbb'
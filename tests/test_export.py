@@ -0,0 +1,24 @@
+"""API-key authenticated transaction export."""
+WALLET = '0x' + '33' * 20
+
+
+def test_export_requires_the_api_key_header(client, user):
+    assert client.get('/api/export/transactions', headers={'X-API-Key': user['api_key']}).status_code == 200
+    assert client.get(f"/api/export/transactions?api_key={user['api_key']}").status_code == 401
+    assert client.get('/api/export/transactions', headers={'X-API-Key': 'wrong'}).status_code == 401
+
+
+def test_export_streams_the_users_transactions(api, client, user):
+    api.db.add_user_wallet(user['id'], WALLET, 'Mine')
+    for n in range(1, 4):
+        api.db.insert_transaction({
+            'hash': '0x' + f'{0xe000 + n:064x}', 'from': WALLET, 'to': None, 'value': n,
+            'gasPrice': 1, 'blockNumber': n, 'timestamp': 1700000000 + n
+        })
+    
+    response = client.get('/api/export/transactions?format=csv&since=1700000002',
+                          headers={'X-API-Key': user['api_key']})
+    
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('id,tx_hash')
+    assert len(lines) == 3
@@ -0,0 +1,109 @@
+"""Provisional alerts for pending transactions, against a local node stand-in."""
+import sqlite3
+import threading
+
+import pytest
+
+from benchmark import FakeProvider, NullEmailService, SyntheticChain, seed_watchlist
+from database import Database
+from mempool import MempoolWatcher
+from monitor import WhaleMonitor
+
+
+class BlockingEmailService(NullEmailService):
+    """Holds provisional emails until released, so a block can arrive mid-send"""
+    
+    def __init__(self):
+        super().__init__()
+        self.sending = threading.Event()
+        self.release = threading.Event()
+    
+    def send_alert_email(self, **kwargs):
+        if kwargs.get('pending'):
+            self.sending.set()
+            assert self.release.wait(5)
+        return super().send_alert_email(**kwargs)
+
+
+@pytest.fixture
+def node(tmp_path):
+    """A synthetic chain, a fake node serving it and a monitor watching its whales"""
+    chain = SyntheticChain(txs_per_block=40, hit_rate=0.25, watchlist_size=8, seed=7, start_block=10)
+    db_path = str(tmp_path / 'monitor.db')
+    db = Database(db_path)
+    seed_watchlist(db, chain.watchlist, threshold=0)
+    provider = FakeProvider(chain)
+    
+    def monitor(email_service=None):
+        return WhaleMonitor(None, provider=provider, db=db, email_service=email_service or NullEmailService(),
+                            eth_price_usd=2000.0)
+    return chain, provider, db_path, monitor
+
+
+def pending_copy(tx):
+    return dict(tx, blockHash=None, blockNumber=None, transactionIndex=None)
+
+
+def logged_alerts(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT transaction_id FROM email_alerts').fetchall()
+
+
+def test_alerted_while_pending_does_not_alert_again_when_mined(node):
+    chain, provider, db_path, make_monitor = node
+    monitor = make_monitor()
+    block = chain.block(chain.start_block)
+    chain.head = chain.start_block
+    
+    provider.pending = [pending_copy(tx) for tx in block['transactions']]
+    hits = MempoolWatcher(monitor, full_transactions=True).poll()
+    provisional = monitor.email_service.sent
+    assert hits and provisional
+    assert all(alert[3] for alert in monitor.email_service.alerts)
+    
+    monitor.monitor_block(chain.start_block)
+    
+    assert monitor.email_service.sent == provisional
+    alerts = logged_alerts(db_path)
+    assert len(alerts) == provisional
+    assert all(transaction_id is not None for transaction_id, in alerts)
+
+
+def test_block_mined_while_a_provisional_email_is_sending(node):
+    chain, provider, db_path, make_monitor = node
+    email_service = BlockingEmailService()
+    monitor = make_monitor(email_service)
+    block = chain.block(chain.start_block)
+    chain.head = chain.start_block
+    whale = next(tx for tx in block['transactions']
+                 if tx['from'] in chain.watchlist or tx['to'] in chain.watchlist)
+    
+    provider.pending = [pending_copy(whale)]
+    watcher = MempoolWatcher(monitor, full_transactions=True)
+    poller = threading.Thread(target=watcher.poll)
+    poller.start()
+    assert email_service.sending.wait(5)
+    
+    # The block loop reconciles the alert while its email is still going out
+    monitor.monitor_block(chain.start_block)
+    email_service.release.set()
+    poller.join(5)
+    
+    whale_emails = [alert for alert in email_service.alerts if alert[0] == whale['hash'].removeprefix('0x')]
+    assert len(whale_emails) == 1
+    assert monitor.mined_while_sending == {}
+    # Logged once, against the stored record
+    whale_id = next(tx['id'] for tx in monitor.db.get_transactions_since(0) if tx['tx_hash'] == whale['hash'])
+    assert logged_alerts(db_path).count((whale_id,)) == 1
+
+
+def test_pending_hash_already_mined_is_skipped(node):
+    chain, provider, db_path, make_monitor = node
+    monitor = make_monitor()
+    whale = next(tx for tx in chain.block(chain.start_block)['transactions']
+                 if tx['from'] in chain.watchlist or tx['to'] in chain.watchlist)
+    
+    # Hash-only filters fetch each transaction; this one is in a block by then
+    provider.pending = [whale]
+    assert MempoolWatcher(monitor, full_transactions=False).poll() == []
+    assert monitor.email_service.sent == 0
@@ -0,0 +1,33 @@
+"""Prometheus metrics endpoints."""
+import urllib.request
+
+import metrics
+
+
+def test_api_metrics_require_the_admin_token(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, 'ADMIN_TOKEN', 'metrics-admin')
+    
+    assert client.get('/api/metrics').status_code == 403
+    assert client.get('/api/metrics', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    
+    response = client.get('/api/metrics', headers={'X-Admin-Token': 'metrics-admin'})
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+
+
+def test_api_metrics_are_off_without_an_admin_token(api, client, monkeypatch):
+    monkeypatch.setattr(api.config, 'ADMIN_TOKEN', None)
+    
+    assert client.get('/api/metrics', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_monitor_metrics_server_listens_on_loopback():
+    server = metrics.start_http_server(0)
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
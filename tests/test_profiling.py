@@ -0,0 +1,19 @@
+"""Slow-query logging from request profiling, on both storage backends."""
+import config
+import profiling
+
+
+def test_slow_queries_are_logged(database, monkeypatch, capsys):
+    monkeypatch.setattr(config, 'SLOW_QUERY_MS', 0)
+    monkeypatch.setattr(type(database), 'connection_factory', profiling.ProfiledConnection)
+    if hasattr(database, 'pool'):
+        import postgres_db
+        connection = postgres_db.PooledConnection
+        monkeypatch.setattr(connection, 'cursor_factory',
+                            type('ProfiledPooledCursor', (profiling.TimedCursorMixin, connection.cursor_factory), {}))
+    
+    database.get_processed_block_hash(1)
+    
+    logged = capsys.readouterr().out
+    assert 'Slow query' in logged
+    assert 'FROM processed_blocks WHERE block_number' in logged
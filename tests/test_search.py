@@ -0,0 +1,77 @@
+"""Prefix search index and the /api/search address index."""
+import threading
+import time
+
+import pytest
+
+from search_index import SearchIndex
+
+
+def tx(n, sender, receiver):
+    return {'hash': '0x' + f'{0x5000 + n:064x}', 'from': sender, 'to': receiver, 'value': 1,
+            'gasPrice': 1, 'blockNumber': n, 'timestamp': 1700000000 + n}
+
+
+def address(n):
+    return '0x5ea' + f'{n:037x}'
+
+
+@pytest.fixture
+def search_app(api, monkeypatch):
+    """The app with an empty address index"""
+    monkeypatch.setattr(api, 'address_index', SearchIndex())
+    monkeypatch.setattr(api, 'recent_addresses', type(api.recent_addresses)())
+    monkeypatch.setattr(api, 'address_index_state', {'last_id': None, 'refreshed_at': None, 'refreshing': False})
+    return api
+
+
+def test_remove_many_drops_entries_and_their_keys():
+    index = SearchIndex()
+    index.add_many([('0xaa01', 'Alpha Fund', 'whale'), ('0xaa02', None, 'address'), ('0xbb03', None, 'address')])
+    
+    index.remove_many(['0xAA01', '0xbb03', '0xdead'])
+    
+    assert [entry.address for entry in index.search('0xaa')] == ['0xaa02']
+    assert index.search('alpha') == []
+    assert len(index) == 1
+
+
+def test_address_index_keeps_the_most_recently_seen(search_app, monkeypatch):
+    monkeypatch.setattr(search_app.config, 'SEARCH_MAX_ADDRESSES', 3)
+    start = search_app.db.get_latest_transaction_id()
+    search_app.address_index_state['last_id'] = start
+    search_app.db.insert_transaction(tx(1, address(1), address(2)))
+    search_app.update_address_index()
+    
+    search_app.db.insert_transaction(tx(2, address(3), address(1)))
+    search_app.db.insert_transaction(tx(3, address(4), None))
+    search_app.update_address_index()
+    
+    # address(2) was seen least recently
+    assert list(search_app.recent_addresses) == [address(3), address(1), address(4)]
+    assert {entry.address for entry in search_app.address_index.search('0x5ea', 10)} == \
+        {address(1), address(3), address(4)}
+
+
+def test_search_does_not_wait_for_the_index_build(search_app, client, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+    
+    def slow_update():
+        builds.append(1)
+        started.set()
+        release.wait(5)
+        with search_app.address_index_lock:
+            search_app.address_index_state['refreshing'] = False
+    
+    monkeypatch.setattr(search_app, 'update_address_index', slow_update)
+    try:
+        begin = time.perf_counter()
+        assert client.get('/api/search?q=0x5ea').status_code == 200
+        assert started.wait(5)
+        assert client.get('/api/search?q=0x5ea').status_code == 200
+        assert time.perf_counter() - begin < 2
+        assert builds == [1]
+    finally:
+        release.set()
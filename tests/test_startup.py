@@ -0,0 +1,73 @@
+"""API worker startup: no DDL in workers, lazy heavy imports, time to first response."""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT, TEST_DIR
+from database import Database
+
+# Generous enough for a loaded CI box; a worker that runs migrations or imports
+# the SMTP/HTTP stacks eagerly still fits, so the probe checks those directly.
+FIRST_RESPONSE_BUDGET = 5.0
+
+WORKER_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import database
+def no_ddl(self):
+    raise AssertionError("worker ran init_db")
+database.Database.init_db = no_ddl
+import app
+response = app.app.test_client().get('/api/health')
+print(json.dumps({
+    'status': response.status_code,
+    'first_response': time.perf_counter() - start,
+    'heavy_modules': [m for m in ('smtplib', 'email.mime.text', 'requests') if m in sys.modules]
+}))
+'''
+
+
+def start_worker(db_path):
+    env = dict(os.environ, DATABASE_URL=db_path, INIT_SCHEMA='false')
+    result = subprocess.run([sys.executable, '-c', WORKER_PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_worker_starts_without_ddl_and_responds_quickly():
+    db_path = os.path.join(TEST_DIR, 'startup.db')
+    Database(db_path)  # the deploy step / gunicorn master
+    
+    probe = start_worker(db_path)
+    
+    assert probe['status'] == 200
+    assert probe['heavy_modules'] == []
+    assert probe['first_response'] < FIRST_RESPONSE_BUDGET
+
+
+def test_gunicorn_master_initializes_schema_once():
+    import config
+    db_path = os.path.join(TEST_DIR, 'master.db')
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', os.path.join(ROOT, 'gunicorn.conf.py'))
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    
+    class Server:
+        class log:
+            @staticmethod
+            def info(message):
+                pass
+    
+    previous = config.DATABASE_URL, config.INIT_SCHEMA
+    config.DATABASE_URL = db_path
+    try:
+        gunicorn_conf.on_starting(Server())
+        assert config.INIT_SCHEMA is False
+    finally:
+        config.DATABASE_URL, config.INIT_SCHEMA = previous
+    
+    # The forked workers find the schema in place
+    assert start_worker(db_path)['status'] == 200
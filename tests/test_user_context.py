@@ -0,0 +1,31 @@
+"""Per-worker user context cache for the JWT routes."""
+WALLET = '0x' + 'ab' * 20
+
+
+def test_repeated_dashboard_loads_hit_the_cache(client, user, count_connections):
+    assert client.get('/api/auth/me', headers=user['headers']).status_code == 200
+    first = count_connections['connections']
+    
+    assert client.get('/api/auth/me', headers=user['headers']).status_code == 200
+    assert count_connections['connections'] == first
+    
+    # Only the transaction query itself; the wallet map comes from the cache
+    client.get('/api/user/transactions', headers=user['headers'])
+    assert count_connections['connections'] == first + 1
+
+
+def test_wallet_changes_invalidate_the_users_context(api, client, user):
+    other = api.db.create_user('bystander@example.com', 'password123')
+    api.get_user_context(other['id'])
+    assert api.get_user_context(user['id'])['wallet_map'] == {}
+    
+    response = client.post('/api/user/wallets', headers=user['headers'],
+                           json={'wallet_address': WALLET, 'wallet_name': 'Treasury'})
+    assert response.status_code == 201
+    
+    assert api.get_user_context(user['id'])['wallet_map'] == {WALLET: 'Treasury'}
+    # Other users' entries stay cached
+    assert api.user_contexts.get(other['id']) is not None
+    
+    search = client.get('/api/search?q=treas', headers=user['headers']).get_json()
+    assert [m['address'] for m in search] == [WALLET]
@@ -0,0 +1,64 @@
+"""Wallet address validation and the bulk import endpoint."""
+import json
+
+import pytest
+
+UNDERSCORED = '0x' + '1_' * 19 + '11'
+
+
+@pytest.mark.parametrize('address', [
+    UNDERSCORED,
+    '0x' + ' 1' * 20,
+    '0x+' + '1' * 39,
+    '0x' + 'g' * 40,
+    '0x' + 'a' * 39,
+    None,
+])
+def test_invalid_addresses_are_rejected(api, address):
+    assert not api.is_valid_address(address)
+
+
+def test_adding_an_invalid_address_returns_400(client, user):
+    response = client.post('/api/user/wallets', headers=user['headers'],
+                           json={'wallet_address': UNDERSCORED, 'wallet_name': 'Bad'})
+    assert response.status_code == 400
+
+
+def test_import_reports_bad_rows_and_adds_the_rest(api, client, user, monkeypatch):
+    monkeypatch.setattr(api.config, 'IMPORT_CHUNK_SIZE', 2)
+    good = ['0x' + f'{i:040x}' for i in range(1, 4)]
+    lines = [{'address': good[0]}, {'address': UNDERSCORED}, {'address': good[1]},
+             {'address': good[0]}, {'address': good[2], 'threshold': 'lots'}]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    version = api.db.get_tracked_wallets_version()
+    api.get_user_context(user['id'])
+    
+    response = client.post('/api/user/wallets/import?format=ndjson', headers=user['headers'], data=body)
+    
+    assert response.status_code == 200
+    report = response.get_json()
+    assert [r['status'] for r in report['results']] == ['added', 'invalid', 'added', 'duplicate', 'invalid']
+    assert (report['added'], report['duplicate'], report['invalid']) == (2, 1, 2)
+    assert api.db.get_tracked_wallets_version() == version + 1
+    assert set(api.get_user_context(user['id'])['wallet_map']) == set(good[:2])
+
+
+def test_import_bumps_the_version_when_a_later_chunk_fails(api, client, user, monkeypatch):
+    monkeypatch.setattr(api.config, 'IMPORT_CHUNK_SIZE', 1)
+    add_user_wallets = api.db.add_user_wallets
+    calls = []
+    
+    def failing_second_chunk(user_id, wallets):
+        calls.append(wallets)
+        if len(calls) == 2:
+            raise RuntimeError('database went away')
+        return add_user_wallets(user_id, wallets)
+    
+    monkeypatch.setattr(api.db, 'add_user_wallets', failing_second_chunk)
+    version = api.db.get_tracked_wallets_version()
+    body = '0x' + 'a' * 40 + '\n' + '0x' + 'b' * 40 + '\n'
+    
+    response = client.post('/api/user/wallets/import?format=csv', headers=user['headers'], data=body)
+    
+    assert response.status_code == 500
+    assert api.db.get_tracked_wallets_version() == version + 1
@@ -0,0 +1,175 @@
+"""Webhook delivery against a local HTTP stand-in."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import config
+import webhook_service
+from alert_rules import AlertRule
+from database import Database
+from webhook_service import UnsafeWebhookURL, WebhookService, check_webhook_url, sign
+
+SECRET = 'whsec-test'
+TX = {'id': None, 'hash': '0x' + 'ab' * 32, 'from': '0x' + '11' * 20, 'to': '0x' + '22' * 20,
+      'value': '500', 'type': 'Transfer', 'blockNumber': 1}
+
+
+class Endpoint:
+    """Loopback HTTP server answering POSTs with scripted status codes"""
+    
+    def __init__(self, statuses=(200,)):
+        self.statuses = list(statuses)
+        self.requests = []
+        endpoint = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                endpoint.requests.append((dict(self.headers), body))
+                status = endpoint.statuses.pop(0) if len(endpoint.statuses) > 1 else endpoint.statuses[0]
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def endpoint():
+    endpoints = []
+    
+    def start(statuses=(200,)):
+        endpoints.append(Endpoint(statuses))
+        return endpoints[-1]
+    yield start
+    for started in endpoints:
+        started.close()
+
+
+@pytest.fixture
+def local_endpoints(monkeypatch):
+    """Allow the plain-http loopback stand-in"""
+    monkeypatch.setattr(config, 'WEBHOOK_ALLOW_HTTP', True)
+    monkeypatch.setattr(config, 'WEBHOOK_ALLOW_PRIVATE', True)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting"""
+    slept = []
+    monkeypatch.setattr(webhook_service.time, 'sleep', slept.append)
+    return slept
+
+
+def rule_for(url, user_id=1, wallet_id=1):
+    return AlertRule(user_id, 'user@example.com', wallet_id, 'Whale', TX['from'], 0,
+                     webhook_url=url, webhook_secret=SECRET)
+
+
+def deliver(service, rule):
+    try:
+        return service.deliver(rule, TX, 'out').result(timeout=10)
+    finally:
+        service.close()
+
+
+def test_payload_is_signed(local_endpoints, endpoint):
+    server = endpoint()
+    
+    assert deliver(WebhookService(retries=0), rule_for(server.url))
+    
+    (headers, body), = server.requests
+    assert headers['X-Whale-Signature'] == f"sha256={sign(SECRET, headers['X-Whale-Timestamp'], body)}"
+    assert b'"event":"transaction.alert"' in body
+
+
+def test_retries_with_exponential_backoff(local_endpoints, endpoint, sleeps):
+    server = endpoint([503, 429, 200])
+    
+    assert deliver(WebhookService(retries=3, backoff=0.5), rule_for(server.url))
+    
+    assert len(server.requests) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_dead_letters_after_the_last_attempt(local_endpoints, endpoint, sleeps, tmp_path):
+    db = Database(str(tmp_path / 'webhooks.db'))
+    user = db.create_user('hooked@example.com', 'password123')
+    server = endpoint([503])
+    
+    assert not deliver(WebhookService(db=db, retries=2, backoff=0.1), rule_for(server.url, user_id=user['id']))
+    
+    assert len(server.requests) == 3
+    assert sleeps == [0.1, 0.2]
+    letter, = db.get_webhook_dead_letters(user['id'])
+    assert (letter['attempts'], letter['last_error'], letter['url']) == (3, 'HTTP 503', server.url)
+
+
+def test_client_errors_are_not_retried(local_endpoints, endpoint, sleeps):
+    server = endpoint([404])
+    
+    assert not deliver(WebhookService(retries=3), rule_for(server.url))
+    assert len(server.requests) == 1
+
+
+@pytest.mark.parametrize('url', [
+    'https://127.0.0.1/hook',
+    'https://localhost/hook',
+    'https://10.1.2.3/hook',
+    'https://192.168.0.10/hook',
+    'https://169.254.169.254/latest/meta-data',
+    'https://[::1]/hook',
+    'https://[::ffff:127.0.0.1]/hook',
+    'https://0.0.0.0/hook',
+    'http://93.184.216.34/hook',
+    'ftp://93.184.216.34/hook',
+])
+def test_unsafe_urls_are_refused(url):
+    with pytest.raises(UnsafeWebhookURL):
+        check_webhook_url(url)
+
+
+def test_public_https_url_is_accepted():
+    check_webhook_url('https://93.184.216.34/hook')
+
+
+def test_loopback_delivery_is_refused_and_dead_lettered(monkeypatch, endpoint, tmp_path):
+    monkeypatch.setattr(config, 'WEBHOOK_ALLOW_HTTP', True)
+    db = Database(str(tmp_path / 'webhooks.db'))
+    user = db.create_user('ssrf@example.com', 'password123')
+    server = endpoint()
+    
+    assert not deliver(WebhookService(db=db, retries=3), rule_for(server.url, user_id=user['id']))
+    
+    assert server.requests == []
+    letter, = db.get_webhook_dead_letters(user['id'])
+    assert letter['attempts'] == 1 and letter['last_error'].startswith('refused')
+
+
+def test_connection_to_a_rebound_address_is_refused(monkeypatch, endpoint):
+    """The name passed the check, then resolved to loopback when connecting"""
+    monkeypatch.setattr(config, 'WEBHOOK_ALLOW_HTTP', True)
+    monkeypatch.setattr(webhook_service, 'check_webhook_url', lambda url: None)
+    server = endpoint()
+    
+    assert not deliver(WebhookService(retries=0), rule_for(server.url))
+    assert server.requests == []
+
+
+def test_saving_an_internal_webhook_url_is_rejected(api, client, user):
+    wallet_id = api.db.add_user_wallet(user['id'], '0x' + '44' * 20, 'Hooked')
+    
+    response = client.put(f'/api/user/wallets/{wallet_id}/webhook', headers=user['headers'],
+                          json={'url': 'http://127.0.0.1:8080/x'})
+    
+    assert response.status_code == 400
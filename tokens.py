@@ -0,0 +1,120 @@
+"""ERC-20 Transfer tracking via server-side log filtering.
+
+Rather than decoding contract calls, tracked token transfers are fetched
+with ``eth_getLogs`` filtered by the Transfer topic and the tracked
+addresses in the indexed from/to topics. Each block's ``logsBloom`` is
+checked first so blocks that can't contain a match never hit the node.
+"""
+from decimal import Decimal
+from web3 import Web3
+import config
+
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+
+def bloom_mask(item):
+    """Bit mask of the three bloom bits an item (address or topic bytes) sets"""
+    digest = Web3.keccak(item)
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) & 2047)
+    return mask
+
+
+def address_topic(address):
+    """32-byte indexed topic for an address"""
+    return '0x' + '0' * 24 + address[2:].lower()
+
+
+def topic_address(topic):
+    """Address stored in an indexed topic"""
+    topic = topic.hex() if isinstance(topic, bytes) else topic
+    return '0x' + topic[-40:].lower()
+
+
+def format_units(amount, decimals):
+    """Format an integer token amount as a decimal string without floats"""
+    whole, fraction = divmod(amount, 10 ** decimals)
+    if not fraction:
+        return str(whole)
+    return f"{whole}.{str(fraction).rjust(decimals, '0').rstrip('0')}"
+
+
+class TokenTransferTracker:
+    """Find tracked-address transfers of known tokens"""
+    
+    def __init__(self, w3, tokens=None, address_chunk=None):
+        self.w3 = w3
+        self.tokens = {address.lower(): token for address, token in (tokens or config.TRACKED_TOKENS).items()}
+        self.address_chunk = address_chunk or config.LOGS_ADDRESS_CHUNK
+        self.token_addresses = [Web3.to_checksum_address(a) for a in self.tokens]
+        self._transfer_mask = bloom_mask(bytes.fromhex(TRANSFER_TOPIC[2:]))
+        self._token_masks = [bloom_mask(bytes.fromhex(a[2:])) for a in self.tokens]
+        self._tracked = []
+        self._tracked_masks = []
+    
+    def set_tracked(self, addresses):
+        """Precompute bloom masks for the tracked addresses as indexed topics"""
+        self._tracked = sorted(addresses)
+        self._tracked_masks = [bloom_mask(bytes.fromhex(address_topic(a)[2:])) for a in self._tracked]
+    
+    def block_may_match(self, logs_bloom):
+        """Check a block's logsBloom for a tracked-token Transfer touching a tracked address"""
+        if not self._tracked or not self.tokens:
+            return False
+        bloom = int.from_bytes(bytes(logs_bloom), 'big')
+        if bloom & self._transfer_mask != self._transfer_mask:
+            return False
+        if not any(bloom & mask == mask for mask in self._token_masks):
+            return False
+        return any(bloom & mask == mask for mask in self._tracked_masks)
+    
+    def get_transfers(self, from_block, to_block):
+        """Fetch tracked transfers in a block range, batching addresses per request"""
+        logs = {}
+        for start in range(0, len(self._tracked), self.address_chunk):
+            topics = [address_topic(a) for a in self._tracked[start:start + self.address_chunk]]
+            # Tracked address as sender, then as recipient
+            for topic_filter in ([TRANSFER_TOPIC, topics], [TRANSFER_TOPIC, None, topics]):
+                for log in self.w3.eth.get_logs({
+                    'fromBlock': from_block,
+                    'toBlock': to_block,
+                    'address': self.token_addresses,
+                    'topics': topic_filter
+                }):
+                    logs[(log['transactionHash'], log['logIndex'])] = log
+        
+        transfers = [self.decode(log) for log in logs.values()]
+        return sorted((t for t in transfers if t), key=lambda t: (t['blockNumber'], t['log_index']))
+    
+    def decode(self, log):
+        """Decode a Transfer log into token, from, to and amount"""
+        token = self.tokens.get(log['address'].lower())
+        if token is None or len(log['topics']) != 3:
+            return None
+        data = log['data']
+        amount = int.from_bytes(bytes(data), 'big') if isinstance(data, bytes) else int(data, 16)
+        tx_hash = log['transactionHash']
+        return {
+            'hash': '0x' + bytes(tx_hash).hex() if isinstance(tx_hash, bytes) else tx_hash,
+            'log_index': log['logIndex'],
+            'blockNumber': log['blockNumber'],
+            'token_address': log['address'].lower(),
+            'token_symbol': token['symbol'],
+            'from': topic_address(log['topics'][1]),
+            'to': topic_address(log['topics'][2]),
+            'amount': amount,
+            'value': format_units(amount, token['decimals'])
+        }
+    
+    def value_in(self, transfer, eth_price_usd):
+        """ETH and USD value of a transfer, None where unknown"""
+        token = self.tokens[transfer['token_address']]
+        value = Decimal(transfer['value'])
+        if token.get('pegged') == 'ETH':
+            value_eth = float(value)
+            return value_eth, value_eth * eth_price_usd if eth_price_usd else None
+        if token.get('pegged') == 'USD':
+            value_usd = float(value)
+            return (value_usd / eth_price_usd if eth_price_usd else None), value_usd
+        return None, None
@@ -0,0 +1,237 @@
+"""Webhook alert channel.
+
+Alerts are POSTed as JSON to each wallet's webhook URL through one shared
+keep-alive ``requests.Session``. A thread pool of ``WEBHOOK_CONCURRENCY``
+workers bounds how many deliveries are in flight, and the connection pool
+is sized to match. Every body is signed with the wallet's secret:
+
+    X-Whale-Timestamp: <unix seconds>
+    X-Whale-Signature: sha256=<hex HMAC-SHA256 of "<timestamp>.<body>">
+
+Alerts for transactions still in the mempool have the event
+``transaction.pending``; mined ones ``transaction.alert``.
+
+Connection errors, timeouts, 429 and 5xx responses are retried with
+exponential backoff; deliveries that still fail are kept in the
+``webhook_dead_letters`` table.
+
+Webhook URLs are user input, so ``check_webhook_url`` is applied when one
+is saved and before every delivery: it must be https (unless
+WEBHOOK_ALLOW_HTTP) and its host must resolve only to global addresses,
+not loopback, private, link-local or reserved ones (unless
+WEBHOOK_ALLOW_PRIVATE). Redirects are never followed. The host could
+resolve differently by the time the request connects (DNS rebinding), so
+the session's connections also check the address each socket actually
+connected to before sending anything over it.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import config
+import metrics
+
+WEBHOOK_LATENCY = metrics.histogram('webhook_request_duration_seconds', 'Latency of one webhook POST attempt')
+WEBHOOKS_SENT = metrics.counter('webhooks_total', 'Webhook deliveries by final outcome', ['status'])
+WEBHOOK_RETRIES = metrics.counter('webhook_retries_total', 'Webhook attempts that were retried')
+WEBHOOK_BLOCK_TO_DELIVERED = metrics.histogram(
+    'webhook_block_to_delivered_seconds', 'Time from seeing a block to its webhook being accepted',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class UnsafeWebhookURL(ValueError):
+    """A webhook URL the monitor must not send requests to"""
+
+
+def check_webhook_url(url):
+    """Raise UnsafeWebhookURL unless url is https and its host resolves only
+    to public addresses (socket.gaierror if it doesn't resolve)"""
+    parts = urlsplit(url)
+    schemes = ('https', 'http') if config.WEBHOOK_ALLOW_HTTP else ('https',)
+    if parts.scheme not in schemes:
+        raise UnsafeWebhookURL(f"url must be {' or '.join(schemes)}")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise UnsafeWebhookURL("url has an invalid port")
+    if not parts.hostname:
+        raise UnsafeWebhookURL("url has no host")
+    if config.WEBHOOK_ALLOW_PRIVATE:
+        return
+    
+    for *_, sockaddr in socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM):
+        check_address(parts.hostname, sockaddr[0])
+
+
+def check_address(host, ip):
+    """Raise UnsafeWebhookURL if a host's IP address is not a public one"""
+    address = ipaddress.ip_address(ip.split('%', 1)[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    if not address.is_global or address.is_multicast:
+        raise UnsafeWebhookURL(f"{host} resolves to a non-public address ({address})")
+
+
+class _PublicOnlyConnectionMixin:
+    """Refuse a connection whose peer isn't public, after DNS resolved for it"""
+    
+    def _new_conn(self):
+        sock = super()._new_conn()
+        if not config.WEBHOOK_ALLOW_PRIVATE:
+            try:
+                check_address(self.host, sock.getpeername()[0])
+            except UnsafeWebhookURL:
+                sock.close()
+                raise
+        return sock
+
+
+class _PublicOnlyHTTPConnection(_PublicOnlyConnectionMixin, HTTPConnection):
+    pass
+
+
+class _PublicOnlyHTTPSConnection(_PublicOnlyConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _PublicOnlyHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicOnlyHTTPConnection
+
+
+class _PublicOnlyHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicOnlyHTTPSConnection
+
+
+class PublicOnlyAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections only reach public addresses"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicOnlyHTTPConnectionPool,
+            'https': _PublicOnlyHTTPSConnectionPool
+        }
+
+
+def sign(secret, timestamp, body):
+    """Hex HMAC-SHA256 of "<timestamp>.<body>" keyed with the wallet secret"""
+    return hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def build_payload(rule, tx_data, direction):
+    """JSON-ready alert body for one rule and transaction"""
+    return {
+        'event': 'transaction.pending' if tx_data.get('pending') else 'transaction.alert',
+        'wallet': {
+            'id': rule.wallet_id,
+            'name': rule.wallet_name,
+            'address': rule.address
+        },
+        'direction': direction,
+        'transaction': {
+            'hash': tx_data['hash'],
+            'from': tx_data['from'],
+            'to': tx_data['to'],
+            'value': tx_data['value'],
+            'value_usd': tx_data.get('value_usd'),
+            'asset': tx_data.get('token_symbol') or 'ETH',
+            'type': tx_data.get('type'),
+            'block_number': tx_data.get('blockNumber'),
+            'block_timestamp': tx_data.get('block_timestamp')
+        }
+    }
+
+
+class WebhookService:
+    """Deliver signed alerts concurrently with retries and a dead-letter log"""
+    
+    def __init__(self, db=None, concurrency=None, timeout=None, retries=None, backoff=None):
+        self.db = db
+        self.concurrency = concurrency or config.WEBHOOK_CONCURRENCY
+        self.timeout = timeout or config.WEBHOOK_TIMEOUT
+        self.retries = config.WEBHOOK_RETRIES if retries is None else retries
+        self.backoff = config.WEBHOOK_BACKOFF if backoff is None else backoff
+        
+        self.session = requests.Session()
+        adapter = PublicOnlyAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='webhook')
+    
+    def deliver(self, rule, tx_data, direction):
+        """Queue an alert for the rule's webhook; returns a Future of True/False"""
+        body = json.dumps(build_payload(rule, tx_data, direction), separators=(',', ':')).encode()
+        return self.executor.submit(self._deliver, rule, tx_data, body)
+    
+    def _post(self, url, secret, body):
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'whale-monitor-webhooks',
+            'X-Whale-Timestamp': timestamp
+        }
+        if secret:
+            headers['X-Whale-Signature'] = f"sha256={sign(secret, timestamp, body)}"
+        
+        start = time.perf_counter()
+        try:
+            return self.session.post(url, data=body, headers=headers, timeout=self.timeout,
+                                     allow_redirects=False)
+        finally:
+            WEBHOOK_LATENCY.observe(time.perf_counter() - start)
+    
+    def _deliver(self, rule, tx_data, body):
+        error = None
+        attempts = 0
+        while attempts <= self.retries:
+            if attempts:
+                WEBHOOK_RETRIES.inc()
+                time.sleep(self.backoff * 2 ** (attempts - 1))
+            attempts += 1
+            
+            try:
+                # Checked on every attempt, as DNS may have changed since it was saved;
+                # the connection itself is checked too (see PublicOnlyAdapter)
+                check_webhook_url(rule.webhook_url)
+                response = self._post(rule.webhook_url, rule.webhook_secret, body)
+            except UnsafeWebhookURL as e:
+                error = f"refused: {e}"
+                break
+            except (requests.RequestException, OSError) as e:
+                error = str(e)
+                continue
+            
+            if response.status_code < 300:
+                WEBHOOKS_SENT.inc(status='delivered')
+                if tx_data.get('block_seen_at'):
+                    WEBHOOK_BLOCK_TO_DELIVERED.observe(time.time() - tx_data['block_seen_at'])
+                return True
+            
+            error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUSES:
+                break
+        
+        WEBHOOKS_SENT.inc(status='dead_letter')
+        print(f"❌ Webhook to {rule.webhook_url} failed after {attempts} attempts: {error}")
+        if self.db is not None:
+            try:
+                self.db.log_webhook_dead_letter(rule.user_id, rule.wallet_id, tx_data.get('id'),
+                                                rule.webhook_url, body.decode(), attempts, error)
+            except Exception as e:
+                print(f"❌ Failed to log webhook dead letter: {e}")
+        return False
+    
+    def close(self, wait=True):
+        """Finish queued deliveries (when wait) and close pooled connections"""
+        self.executor.shutdown(wait=wait)
+        self.session.close()